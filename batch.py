@@ -0,0 +1,82 @@
+"""
+Bounded-concurrency runner for batch lookups.
+
+Results are yielded in completion order as soon as each item finishes, and
+only a handful of finished results are buffered at any time.
+"""
+
+import asyncio
+import json
+from typing import AsyncIterator, Awaitable, Callable, Iterable, List, TypeVar
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+_DONE = object()
+
+
+class _Failed:
+    def __init__(self, error: Exception):
+        self.error = error
+
+
+async def run_bounded(
+    items: Iterable[T], fn: Callable[[T], Awaitable[R]], concurrency: int
+) -> AsyncIterator[R]:
+    """
+    Runs fn over items with at most `concurrency` calls in flight.
+
+    fn must handle its own errors; an exception escaping it aborts the batch.
+    If the consumer stops iterating (e.g. the client disconnects), the
+    remaining work is cancelled.
+    """
+    concurrency = max(1, concurrency)
+    iterator = iter(items)
+    results: "asyncio.Queue[object]" = asyncio.Queue(maxsize=concurrency)
+
+    async def worker():
+        try:
+            for item in iterator:
+                await results.put(await fn(item))
+        except Exception as e:
+            await results.put(_Failed(e))
+            return
+        await results.put(_DONE)
+
+    workers: List[asyncio.Task] = [asyncio.ensure_future(worker()) for _ in range(concurrency)]
+    try:
+        remaining = len(workers)
+        while remaining:
+            result = await results.get()
+            if result is _DONE:
+                remaining -= 1
+            elif isinstance(result, _Failed):
+                raise result.error
+            else:
+                yield result  # type: ignore
+    finally:
+        for task in workers:
+            task.cancel()
+
+
+def parse_document_list(raw: str, is_json: bool) -> List[str]:
+    """
+    Reads the documents of a batch request.
+
+    Args:
+        raw: Request body or uploaded file contents.
+        is_json: Whether raw is JSON ({"documents": [...]} or a bare list)
+            instead of plain text with one document per line.
+
+    Raises:
+        ValueError: If the JSON is malformed or not a list of strings.
+    """
+    if not is_json:
+        return [line.strip() for line in raw.splitlines() if line.strip()]
+
+    data = json.loads(raw)
+    if isinstance(data, dict):
+        data = data.get("documents")
+    if not isinstance(data, list) or not all(isinstance(doc, str) for doc in data):
+        raise ValueError('Expected a list of documents or {"documents": [...]}')
+    return [doc.strip() for doc in data if doc.strip()]
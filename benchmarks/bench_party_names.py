@@ -0,0 +1,92 @@
+"""
+Micro-benchmark: party-name extraction over result-list row text, taken
+from the captured eSAJ list pages in benchmarks/fixtures.
+
+Compares the previous per-label loop (one re.split per label and line) with
+the precompiled single-pass extractor. Run from the repository root:
+
+    python benchmarks/bench_party_names.py [rows] [repeat]
+"""
+
+import os
+import re
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from esaj_http import list_snapshot  # noqa: E402
+from html_tree import parse_html  # noqa: E402
+from party_names import extractor  # noqa: E402
+from standin import fixture, paginated_page  # noqa: E402
+
+LEGACY_PREFIXES = [
+    "Reqte:",
+    "Reqdo:",
+    "Autor:",
+    "Réu:",
+    "Exectdo:",
+    "Exequente:",
+    "Agravante:",
+    "Agravado:",
+    "Averiguado:",
+    "Indiciado:",
+    "Requerente:",
+    "Requerido:",
+    "Impetrante:",
+    "Impetrado:",
+    "Interessado:",
+    "Embargante:",
+    "Embargado:",
+    "Apelante:",
+    "Apelado:",
+]
+
+
+def captured_row_texts():
+    """Text of every result row in the captured cpopg list pages (benchmarks/fixtures)."""
+    pages = [
+        fixture("esaj_list.html").substitute(system="cpopg"),
+        paginated_page("cpopg", {}, 1),
+    ]
+    return [row["text"] for html in pages for row in list_snapshot(parse_html(html))["rows"]]
+
+
+def legacy_extract_names(text):
+    found_names = set()
+    for line in text.split("\n"):
+        line = line.strip()
+        for prefix in LEGACY_PREFIXES:
+            if prefix.lower() in line.lower():
+                parts = re.split(f"{prefix}", line, flags=re.IGNORECASE)
+                if len(parts) > 1:
+                    name_part = parts[1].strip()
+                    if name_part:
+                        name_part = name_part.split("Advogado:")[0].strip()
+                        found_names.add(name_part)
+    return found_names
+
+
+def main(rows=1000, repeat=5):
+    captured = captured_row_texts()
+    texts = [captured[i % len(captured)] for i in range(rows)]
+
+    def legacy():
+        for text in texts:
+            legacy_extract_names(text)
+
+    def single_pass():
+        for text in texts:
+            extractor.parties(text)
+
+    results = {}
+    for name, fn in (("legacy", legacy), ("single_pass", single_pass)):
+        best = min(timeit.repeat(fn, number=1, repeat=repeat))
+        results[name] = best
+        print(f"{name:>12}: {best * 1000:8.2f} ms / {rows} rows ({best / rows * 1e6:.1f} us/row)")
+    print(f"{'speedup':>12}: {results['legacy'] / results['single_pass']:.1f}x")
+
+
+if __name__ == "__main__":
+    args = [int(arg) for arg in sys.argv[1:3]]
+    main(*args)
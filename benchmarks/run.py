@@ -0,0 +1,412 @@
+"""
+Offline benchmark of the API against the local stand-in sites.
+
+Starts benchmarks/standin.py, points ESAJ_BASE_URL/PORTAL_BASE_URL at it and
+serves the app locally, so runs need no network and are comparable across
+machines and commits. For each endpoint and concurrency level it reports
+p50/p95/p99 latency, requests per second and peak RSS (with --engine browser,
+also that of the Playwright driver and Chromium, separately), and saves the
+run as JSON under benchmarks/results/.
+
+    python benchmarks/run.py --concurrency 1,4,16 --requests 100
+    python benchmarks/run.py --compare benchmarks/results/<earlier run>.json
+
+Documents cycle through the stand-in scenarios (no results, single result,
+list, paginated) and are all distinct, so neither the cache nor singleflight
+shortens a run. --engine browser needs a Playwright browser; without one
+its requests are recorded as errors.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import asynccontextmanager
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BENCH_DIR)
+RESULTS_DIR = os.path.join(BENCH_DIR, "results")
+ENDPOINTS = ("search", "search-person", "batch")
+
+sys.path.insert(0, ROOT_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+from standin import SCENARIOS, start_standin  # noqa: E402
+
+
+def documents(count: int, offset: int = 0) -> List[str]:
+    """Distinct 11-digit documents whose last digit cycles through the scenarios."""
+    digits = sorted(SCENARIOS)
+    return [f"{offset + i:010d}{digits[i % len(digits)]}" for i in range(count)]
+
+
+def percentile(values: List[float], pct: float) -> Optional[float]:
+    """Nearest-rank percentile."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, -(-len(ordered) * pct // 100))
+    return ordered[int(rank) - 1]
+
+
+def _rss_mb() -> float:
+    try:
+        with open("/proc/self/statm") as statm:
+            pages = int(statm.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except (OSError, ValueError):
+        # No /proc: fall back to the peak so far (bytes on macOS, KiB elsewhere)
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 2**20 if sys.platform == "darwin" else peak / 2**10
+
+
+def _browser_rss_mb() -> float:
+    """Resident memory of the Playwright drivers started by this process and their browsers."""
+    # Imported here: config reads the environment main() sets up
+    from browser_watchdog import DRIVER_NAMES, read_processes, tree_rss
+
+    processes = read_processes()
+    own_pid = os.getpid()
+    drivers = [
+        process.pid
+        for process in processes.values()
+        if process.ppid == own_pid and process.name.startswith(DRIVER_NAMES)
+    ]
+    return tree_rss(processes, drivers) / 2**20
+
+
+class RssSampler:
+    """
+    Tracks the peak resident memory of this process while a scenario runs and,
+    with browsers=True, separately that of the Playwright driver and Chromium.
+    """
+
+    def __init__(self, interval: float = 0.05, browsers: bool = False):
+        self.interval = interval
+        self.browsers = browsers
+        self.peak = 0.0
+        self.browser_peak: Optional[float] = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def _sample(self):
+        self.peak = max(self.peak, _rss_mb())
+        if self.browsers:
+            # Reads all of /proc: keep it off the event loop that serves the requests
+            browser_rss = await asyncio.to_thread(_browser_rss_mb)
+            self.browser_peak = max(self.browser_peak or 0.0, browser_rss)
+
+    async def _run(self):
+        while True:
+            await self._sample()
+            await asyncio.sleep(self.interval)
+
+    async def __aenter__(self):
+        await self._sample()
+        self._task = asyncio.create_task(self._run())
+        return self
+
+    async def __aexit__(self, *exc):
+        self._task.cancel()
+        await self._sample()
+
+
+def summarize(
+    endpoint: str,
+    concurrency: int,
+    latencies: List[float],
+    errors: List[str],
+    elapsed: float,
+    rss: RssSampler,
+) -> Dict[str, Any]:
+    def ms(value: Optional[float]) -> Optional[float]:
+        return round(value * 1000, 2) if value is not None else None
+
+    total = len(latencies) + len(errors)
+    return {
+        "endpoint": endpoint,
+        "concurrency": concurrency,
+        "requests": total,
+        "errors": len(errors),
+        "error_sample": sorted(set(errors))[:3],
+        "p50_ms": ms(percentile(latencies, 50)),
+        "p95_ms": ms(percentile(latencies, 95)),
+        "p99_ms": ms(percentile(latencies, 99)),
+        "mean_ms": ms(sum(latencies) / len(latencies)) if latencies else None,
+        "rps": round(total / elapsed, 2) if elapsed else None,
+        "rss_peak_mb": round(rss.peak, 1),
+        "browser_rss_peak_mb": round(rss.browser_peak, 1) if rss.browser_peak is not None else None,
+    }
+
+
+async def bench_requests(client, endpoint: str, docs: List[str], concurrency: int, engine: str):
+    """Sends one request per document, at most `concurrency` at a time."""
+    path = "/search" if endpoint == "search" else "/search-person"
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: List[float] = []
+    errors: List[str] = []
+
+    async def one(document: str):
+        async with semaphore:
+            body = {"document": document, "no_cache": True, "engine": engine}
+            started = time.perf_counter()
+            try:
+                response = await client.post(path, json=body)
+            except Exception as e:
+                errors.append(type(e).__name__)
+                return
+            if response.status_code == 200:
+                latencies.append(time.perf_counter() - started)
+            else:
+                errors.append(f"HTTP {response.status_code}: {response.text[:120]}")
+
+    started = time.perf_counter()
+    async with RssSampler(browsers=engine == "browser") as rss:
+        await asyncio.gather(*(one(document) for document in docs))
+    return summarize(endpoint, concurrency, latencies, errors, time.perf_counter() - started, rss)
+
+
+async def bench_batch(client, docs: List[str], concurrency: int, engine: str):
+    """One /search/batch call; each document's latency is when its line arrives."""
+    params = {"concurrency": concurrency, "no_cache": "true", "engine": engine}
+    latencies: List[float] = []
+    errors: List[str] = []
+    started = time.perf_counter()
+    async with RssSampler(browsers=engine == "browser") as rss:
+        async with client.stream(
+            "POST", "/search/batch", params=params, json={"documents": docs}
+        ) as response:
+            if response.status_code != 200:
+                await response.aread()
+                errors = [f"HTTP {response.status_code}"] * len(docs)
+            else:
+                async for line in response.aiter_lines():
+                    if not line.strip():
+                        continue
+                    item = json.loads(line)
+                    if item.get("status") == "failed":
+                        errors.append(item.get("error", "failed")[:120])
+                    else:
+                        latencies.append(time.perf_counter() - started)
+    return summarize("batch", concurrency, latencies, errors, time.perf_counter() - started, rss)
+
+
+@asynccontextmanager
+async def api_client(app, timeout: float) -> AsyncIterator[Tuple[Any, str]]:
+    """
+    Serves the app with uvicorn on a free local port, so requests and batch
+    lines go over real sockets. Without uvicorn, falls back to httpx's ASGI
+    transport, which buffers streamed responses: batch lines then all arrive
+    when the batch ends.
+    """
+    import httpx
+
+    try:
+        import uvicorn
+    except ImportError:
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(
+            transport=transport, base_url="http://bench", timeout=timeout
+        ) as client:
+            yield client, "in-process"
+        return
+
+    # The benchmark starts what it needs itself; the lifespan would require a browser
+    server = uvicorn.Server(
+        uvicorn.Config(app, host="127.0.0.1", port=0, lifespan="off", log_level="warning")
+    )
+    task = asyncio.create_task(server.serve())
+    while not server.started:
+        if task.done():
+            task.result()
+        await asyncio.sleep(0.01)
+    port = server.servers[0].sockets[0].getsockname()[1]
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=None)
+    try:
+        async with httpx.AsyncClient(
+            base_url=f"http://127.0.0.1:{port}", timeout=timeout, limits=limits
+        ) as client:
+            yield client, "uvicorn"
+    finally:
+        server.should_exit = True
+        await task
+
+
+async def run(args) -> Dict[str, Any]:
+    from browser_pool import pool
+    from esaj_http import http_engine
+    from log_writer import log_writer
+    from main import app
+    from portal_http import portal_engine
+
+    browser = None
+    if args.engine == "browser":
+        try:
+            await pool.start()
+            browser = True
+        except Exception as e:
+            browser = False
+            print(f"No browser available ({e.__class__.__name__}); browser requests will fail")
+
+    results = []
+    offset = 0
+    try:
+        async with api_client(app, args.timeout) as (client, server):
+            print(f"API served {server}")
+            print(HEADER)
+            for endpoint in args.endpoints:
+                for concurrency in args.concurrency:
+                    docs = documents(args.requests, offset)
+                    offset += args.requests
+                    if endpoint == "batch":
+                        result = await bench_batch(client, docs, concurrency, args.engine)
+                    else:
+                        result = await bench_requests(
+                            client, endpoint, docs, concurrency, args.engine
+                        )
+                    results.append(result)
+                    print(format_row(result))
+    finally:
+        await http_engine.close()
+        await portal_engine.close()
+        if browser:
+            await pool.stop()
+        await asyncio.to_thread(log_writer.stop)
+    return {"server": server, "browser_available": browser, "results": results}
+
+
+def git_commit() -> Optional[str]:
+    try:
+        output = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=ROOT_DIR,
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return output.stdout.strip()
+
+
+HEADER = (
+    f"{'endpoint':<14}{'conc':>5}{'reqs':>6}{'errs':>6}"
+    f"{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'req/s':>9}{'RSS MB':>9}{'browser MB':>12}"
+)
+
+
+def _cell(value: Any, width: int) -> str:
+    return f"{'-' if value is None else value:>{width}}"
+
+
+def format_row(result: Dict[str, Any]) -> str:
+    return (
+        f"{result['endpoint']:<14}{result['concurrency']:>5}{result['requests']:>6}"
+        f"{result['errors']:>6}{_cell(result['p50_ms'], 10)}{_cell(result['p95_ms'], 10)}"
+        f"{_cell(result['p99_ms'], 10)}{_cell(result['rps'], 9)}"
+        f"{_cell(result['rss_peak_mb'], 9)}{_cell(result.get('browser_rss_peak_mb'), 12)}"
+    )
+
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any]) -> str:
+    """Side-by-side p50/p95/p99 and req/s of two saved runs, with the change in %."""
+
+    def delta(old: Optional[float], new: Optional[float]) -> str:
+        if not old or new is None:
+            return "-"
+        return f"{(new - old) / old * 100:+.1f}%"
+
+    old = {(r["endpoint"], r["concurrency"]): r for r in baseline["results"]}
+    lines = [
+        f"baseline {baseline.get('commit')} ({baseline.get('started_at')})"
+        f" vs {current.get('commit')} ({current.get('started_at')})",
+        f"{'endpoint':<14}{'conc':>5}{'p50':>10}{'p95':>10}{'p99':>10}{'req/s':>10}",
+    ]
+    for result in current["results"]:
+        before = old.get((result["endpoint"], result["concurrency"]))
+        if before is None:
+            continue
+        lines.append(
+            f"{result['endpoint']:<14}{result['concurrency']:>5}"
+            + "".join(
+                f"{delta(before[key], result[key]):>10}"
+                for key in ("p50_ms", "p95_ms", "p99_ms", "rps")
+            )
+        )
+    return "\n".join(lines)
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Benchmark the API against local fixtures.")
+    parser.add_argument(
+        "--endpoints",
+        default=",".join(ENDPOINTS),
+        help=f"comma-separated subset of {', '.join(ENDPOINTS)}",
+    )
+    parser.add_argument("--concurrency", default="1,4,16", help="comma-separated levels")
+    parser.add_argument("--requests", type=int, default=40, help="requests per level")
+    parser.add_argument("--engine", choices=("http", "browser"), default="http")
+    parser.add_argument("--latency", type=float, default=20.0, help="stand-in ms per response")
+    parser.add_argument("--timeout", type=float, default=120.0, help="client timeout, seconds")
+    parser.add_argument("--output", default=RESULTS_DIR, help="directory for the JSON result")
+    parser.add_argument("--compare", metavar="RUN.json", help="earlier run to compare against")
+    args = parser.parse_args(argv)
+    args.endpoints = [e for e in args.endpoints.split(",") if e]
+    args.concurrency = [int(c) for c in args.concurrency.split(",") if c]
+    unknown = set(args.endpoints) - set(ENDPOINTS)
+    if unknown:
+        parser.error(f"unknown endpoints: {', '.join(sorted(unknown))}")
+
+    server, base_url = start_standin(latency=args.latency / 1000)
+    os.environ["ESAJ_BASE_URL"] = base_url
+    os.environ["PORTAL_BASE_URL"] = base_url
+    os.environ.setdefault("CACHE_PERSISTENT", "false")
+    os.environ.setdefault("WATCHLIST_ENABLED", "false")
+    # Measure the app, not the politeness caps meant for the real sites
+    os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
+    output = os.path.abspath(args.output)
+    baseline = os.path.abspath(args.compare) if args.compare else None
+    # The app writes requests.db to the working directory: keep it out of the repo
+    os.chdir(tempfile.mkdtemp(prefix="bench-"))
+
+    started_at = datetime.now().isoformat(timespec="seconds")
+    print(f"Stand-in at {base_url}, {args.latency:g} ms per response")
+    try:
+        outcome = asyncio.run(run(args))
+    finally:
+        server.shutdown()
+
+    report = {
+        "started_at": started_at,
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "settings": {
+            "engine": args.engine,
+            "latency_ms": args.latency,
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+        },
+        "rss_max_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        **outcome,
+    }
+    os.makedirs(output, exist_ok=True)
+    path = os.path.join(output, f"bench-{started_at.replace(':', '')}.json")
+    with open(path, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Saved {path}")
+
+    if baseline:
+        with open(baseline) as f:
+            print(compare(json.load(f), report))
+
+
+if __name__ == "__main__":
+    main()
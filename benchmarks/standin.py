@@ -0,0 +1,175 @@
+"""
+Local stand-in for the eSAJ (cpopg/cposg) and Portal da Transparência sites.
+
+Serves the captured pages in benchmarks/fixtures so the scrapers can be
+benchmarked offline. The last digit of the searched document picks the
+scenario:
+
+    0  no results
+    1  single result (search.do answers with the process detail page)
+    2  one list page with 3 processes
+    3  paginated list, PAGINATED_TOTAL processes over several pages
+    other digits: same as 2
+
+    python benchmarks/standin.py --port 8081 --latency 50
+"""
+
+import argparse
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from string import Template
+from typing import Dict, Optional, Tuple
+from urllib.parse import parse_qs, quote, urlencode, urlsplit
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+SCENARIOS = {"0": "no_results", "1": "single", "2": "list", "3": "paginated"}
+PAGINATED_TOTAL = 25
+PAGE_SIZE = 10
+
+# Search field and submit button of open.do in each system
+OPEN_FORMS = {
+    "cpopg": ("dadosConsulta.valorConsulta", "botaoConsultarProcessos"),
+    "cposg": ("dePesquisa", "pbConsultar"),
+}
+
+
+def fixture(name: str) -> Template:
+    with open(os.path.join(FIXTURES_DIR, name), encoding="utf-8") as f:
+        return Template(f.read())
+
+
+def scenario(document: str) -> str:
+    digits = "".join(filter(str.isdigit, document))
+    return SCENARIOS.get(digits[-1:], "list")
+
+
+def paginated_page(system: str, query: Dict[str, str], page: int) -> str:
+    row = fixture("esaj_list_row.html")
+    first = (page - 1) * PAGE_SIZE
+    rows = [
+        row.substitute(system=system, code=f"{n:03d}", number=f"1500{n:03d}-00.2023.8.26.0050")
+        for n in range(first + 1, min(first + PAGE_SIZE, PAGINATED_TOTAL) + 1)
+    ]
+    base = {k: v for k, v in query.items() if k != "paginaConsulta"}
+    last_page = -(-PAGINATED_TOTAL // PAGE_SIZE)
+    pages = [
+        f'    <a href="search.do?{urlencode({**base, "paginaConsulta": n})}">{n}</a>'
+        for n in range(1, last_page + 1)
+        if n != page
+    ]
+    return fixture("esaj_list_page.html").substitute(
+        total=PAGINATED_TOTAL, rows="\n".join(rows), pages="\n".join(pages)
+    )
+
+
+def portal_results(term: str) -> str:
+    items = ""
+    if scenario(term) != "no_results":
+        items = (
+            '  <li><div class="busca-portal-block-searchs__item">'
+            f'<a href="/busca/pessoa-fisica/{quote(term)}-fulano-de-tal">'
+            "Pessoa Física: ***.104.236-** - FULANO DE TAL</a></div></li>"
+        )
+    return fixture("portal_results.html").substitute(items=items)
+
+
+def route(path: str, query: Dict[str, str]) -> Tuple[int, Optional[str]]:
+    """Page served for a request, as (status, html)."""
+    parts = path.strip("/").split("/")
+    if parts[0] in OPEN_FORMS and len(parts) == 2:
+        system, page = parts
+        if page == "open.do":
+            field, button = OPEN_FORMS[system]
+            return 200, fixture("esaj_open.html").substitute(
+                system=system, field=field, button=button
+            )
+        if page == "show.do":
+            return 200, fixture("esaj_detail.html").substitute()
+        if page == "search.do":
+            document = query.get("dadosConsulta.valorConsulta") or query.get("dePesquisa", "")
+            kind = scenario(document)
+            if kind == "no_results":
+                return 200, fixture("esaj_no_results.html").substitute()
+            if kind == "single":
+                return 200, fixture("esaj_detail.html").substitute()
+            if kind == "paginated":
+                page_number = int(query.get("paginaConsulta") or 1)
+                return 200, paginated_page(system, query, page_number)
+            return 200, fixture("esaj_list.html").substitute(system=system)
+    if path.rstrip("/") == "/busca":
+        return 200, fixture("portal_search.html").substitute()
+    if path == "/busca/resultado":
+        return 200, portal_results(query.get("termo", ""))
+    if path.startswith("/busca/pessoa-fisica/"):
+        return 200, fixture("portal_person.html").substitute()
+    return 404, None
+
+
+class StandinHandler(BaseHTTPRequestHandler):
+    latency = 0.0
+
+    def do_GET(self):
+        if self.latency:
+            time.sleep(self.latency)
+        url = urlsplit(self.path)
+        query = {k: v[0] for k, v in parse_qs(url.query, keep_blank_values=True).items()}
+        status, html = route(url.path, query)
+        body = (html or "Not Found").encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        if url.path.endswith("/open.do"):
+            self.send_header("Set-Cookie", "JSESSIONID=standin; Path=/")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StandinServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # The default backlog of 5 drops connections under load, adding 1s SYN retries
+    request_queue_size = 128
+
+
+def start_standin(
+    host: str = "127.0.0.1", port: int = 0, latency: float = 0.0
+) -> Tuple[StandinServer, str]:
+    """
+    Serves the fixtures from a background thread.
+
+    Args:
+        port: 0 picks a free port.
+        latency: Seconds added to every response, to mimic the real sites.
+
+    Returns:
+        (server, base_url); call server.shutdown() when done.
+    """
+    handler = type("Handler", (StandinHandler,), {"latency": latency})
+    server = StandinServer((host, port), handler)
+    threading.Thread(target=server.serve_forever, name="standin", daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the eSAJ/Portal fixtures locally.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--latency", type=float, default=0.0, help="milliseconds per response")
+    args = parser.parse_args()
+
+    server, base_url = start_standin(args.host, args.port, args.latency / 1000)
+    print(f"Serving fixtures at {base_url}")
+    print(f"  ESAJ_BASE_URL={base_url} PORTAL_BASE_URL={base_url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,262 @@
+"""
+Long-lived Chromium pool shared by every scraping request.
+
+A single browser is launched when the app starts and each request gets its
+own isolated context/page from it. The number of pages open at once is capped;
+callers beyond the cap wait in line until a slot frees up or the acquire
+timeout expires.
+
+Long-lived Chromium grows, so the browser is recycled after BROWSER_MAX_USES
+contexts, or when the memory watchdog (browser_watchdog.py) asks: new
+contexts go to a freshly launched browser while the retired one drains its
+in-flight pages and is then closed.
+"""
+
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, List, Optional, Set
+
+from playwright.async_api import Browser, BrowserContext, Page, Playwright, async_playwright
+
+import config
+import metrics
+from resource_blocking import ResourceBlocker, resource_blocker
+
+logger = logging.getLogger(__name__)
+
+# Use a standard User-Agent to avoid blocking
+USER_AGENT = (
+    "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) "
+    "AppleWebKit/537.36 (KHTML, like Gecko) "
+    "Chrome/120.0.0.0 Safari/537.36"
+)
+
+
+class PoolSaturatedError(Exception):
+    """Raised when no browser slot frees up within the acquire timeout."""
+
+
+class PooledBrowser:
+    """One launched browser, with the contexts it served and has open."""
+
+    def __init__(self, browser: Browser, number: int):
+        self.browser = browser
+        self.number = number
+        self.uses = 0
+        self.in_flight = 0
+        self.retired: Optional[str] = None  # why it stopped taking new contexts
+        self.closing = False
+        self.pids: Set[int] = set()  # root process(es), filled in by the watchdog
+
+
+class BrowserPool:
+    """
+    Hands out isolated browser contexts from one shared Chromium instance.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = config.BROWSER_MAX_CONCURRENCY,
+        acquire_timeout: float = config.BROWSER_ACQUIRE_TIMEOUT,
+        headless: bool = config.BROWSER_HEADLESS,
+        blocker: Optional[ResourceBlocker] = None,
+        max_uses: int = config.BROWSER_MAX_USES,
+    ):
+        self.max_concurrency = max_concurrency
+        self.acquire_timeout = acquire_timeout
+        self.headless = headless
+        self.blocker = blocker
+        self.max_uses = max_uses
+        self._playwright: Optional[Playwright] = None
+        self._current: Optional[PooledBrowser] = None
+        self._draining: List[PooledBrowser] = []
+        self._closing: Set[asyncio.Task] = set()
+        self._launches = 0
+        self.recycles: Dict[str, int] = {}
+        # asyncio primitives are created lazily so they bind to the running loop
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._launch_lock: Optional[asyncio.Lock] = None
+        self._in_use = 0
+        self._waiting = 0
+        self._rejected = 0
+
+    def _primitives(self):
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._launch_lock = asyncio.Lock()
+        return self._semaphore, self._launch_lock
+
+    async def start(self):
+        """Launches the browser. Called from the app lifespan."""
+        await self._get_browser()
+
+    async def stop(self):
+        """Closes the browsers and stops Playwright."""
+        browsers = [self._current] if self._current is not None else []
+        browsers += self._draining
+        self._current = None
+        self._draining = []
+        for pooled in browsers:
+            if not pooled.closing:
+                await self._close(pooled)
+        if self._closing:
+            await asyncio.gather(*self._closing, return_exceptions=True)
+        if self._playwright is not None:
+            await self._playwright.stop()
+            self._playwright = None
+        self._semaphore = None
+        self._launch_lock = None
+
+    async def _launch(self) -> Browser:
+        if self._playwright is None:
+            self._playwright = await async_playwright().start()
+        return await self._playwright.chromium.launch(headless=self.headless)
+
+    async def _get_browser(self) -> PooledBrowser:
+        _, launch_lock = self._primitives()
+        async with launch_lock:
+            current = self._current
+            if current is not None and current.browser.is_connected():
+                return current
+            if current is not None:
+                logger.warning("Browser disconnected. Relaunching.")
+                self.retire(current, "crashed")
+            self._launches += 1
+            self._current = PooledBrowser(await self._launch(), self._launches)
+            logger.info(
+                f"Launched pooled Chromium #{self._launches} "
+                f"(max concurrency {self.max_concurrency})"
+            )
+            return self._current
+
+    @property
+    def current(self) -> Optional[PooledBrowser]:
+        return self._current
+
+    @property
+    def browsers(self) -> List[PooledBrowser]:
+        """The current browser and those still draining."""
+        return ([self._current] if self._current is not None else []) + self._draining
+
+    def retire(self, pooled: PooledBrowser, reason: str):
+        """
+        Stops giving out contexts from pooled; it is closed once its
+        in-flight pages are done. The next context launches a new browser.
+        """
+        if pooled.retired is not None:
+            return
+        pooled.retired = reason
+        self.recycles[reason] = self.recycles.get(reason, 0) + 1
+        metrics.BROWSER_RECYCLES.inc(reason=reason)
+        if pooled is self._current:
+            self._current = None
+        self._draining.append(pooled)
+        logger.info(
+            f"Retiring pooled Chromium #{pooled.number} ({reason}) after {pooled.uses} contexts"
+        )
+        self._close_if_drained(pooled)
+
+    def recycle(self, reason: str) -> bool:
+        """Retires the current browser, if any. Returns whether one was retired."""
+        if self._current is None:
+            return False
+        self.retire(self._current, reason)
+        return True
+
+    def _close_if_drained(self, pooled: PooledBrowser):
+        if pooled.retired is None or pooled.in_flight or pooled.closing:
+            return
+        pooled.closing = True
+        task = asyncio.ensure_future(self._close(pooled))
+        self._closing.add(task)
+        task.add_done_callback(self._closing.discard)
+
+    async def _close(self, pooled: PooledBrowser):
+        pooled.closing = True
+        try:
+            await pooled.browser.close()
+        except Exception as e:
+            logger.warning(f"Error closing browser: {e}")
+        if pooled in self._draining:
+            self._draining.remove(pooled)
+
+    @asynccontextmanager
+    async def _slot(self) -> AsyncIterator[None]:
+        semaphore, _ = self._primitives()
+        self._waiting += 1
+        try:
+            await asyncio.wait_for(semaphore.acquire(), timeout=self.acquire_timeout)
+        except asyncio.TimeoutError:
+            self._rejected += 1
+            metrics.count_timeout("browser_acquire")
+            raise PoolSaturatedError(
+                f"No browser slot available after {self.acquire_timeout:.0f}s "
+                f"({self.max_concurrency} in use)"
+            )
+        finally:
+            self._waiting -= 1
+        self._in_use += 1
+        try:
+            yield
+        finally:
+            self._in_use -= 1
+            semaphore.release()
+
+    @asynccontextmanager
+    async def context(self, **kwargs: Any) -> AsyncIterator[BrowserContext]:
+        """
+        Yields a fresh browser context, closed on exit. Holds one pool slot.
+        """
+        kwargs.setdefault("user_agent", USER_AGENT)
+        started = time.perf_counter()
+        async with self._slot():
+            pooled = await self._get_browser()
+            pooled.uses += 1
+            pooled.in_flight += 1
+            if self.max_uses and pooled.uses >= self.max_uses:
+                # This is its last context; later ones go to a new browser
+                self.retire(pooled, "uses")
+            try:
+                context = await pooled.browser.new_context(**kwargs)
+                # Waiting for a slot plus (re)launching the browser and opening the context
+                metrics.observe_stage("browser_acquire", time.perf_counter() - started)
+                try:
+                    if self.blocker is not None:
+                        await self.blocker.install(context)
+                    yield context
+                finally:
+                    try:
+                        await context.close()
+                    except Exception as e:
+                        logger.warning(f"Error closing browser context: {e}")
+            finally:
+                pooled.in_flight -= 1
+                self._close_if_drained(pooled)
+
+    @asynccontextmanager
+    async def page(self, **kwargs: Any) -> AsyncIterator[Page]:
+        """
+        Yields a page in its own fresh context. Holds one pool slot.
+        """
+        async with self.context(**kwargs) as context:
+            yield await context.new_page()
+
+    def stats(self) -> Dict[str, Any]:
+        current = self._current
+        return {
+            "running": current is not None and current.browser.is_connected(),
+            "max_concurrency": self.max_concurrency,
+            "in_use": self._in_use,
+            "waiting": self._waiting,
+            "rejected": self._rejected,
+            "launches": self._launches,
+            "current_uses": current.uses if current is not None else 0,
+            "draining": len(self._draining),
+            "recycles": dict(self.recycles),
+        }
+
+
+# Shared instance used by the scraper and started/stopped by the app lifespan
+pool = BrowserPool(blocker=resource_blocker)
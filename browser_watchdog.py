@@ -0,0 +1,228 @@
+"""
+Memory watchdog for the pooled Chromium.
+
+Every BROWSER_WATCHDOG_INTERVAL seconds it reads this process's browser
+processes from /proc (Linux only; elsewhere it stays off) and:
+
+- records their resident memory, in total and for the current browser, and
+  the peak;
+- recycles the current browser above BROWSER_MAX_RSS_MB: the pool drains its
+  pages and closes it while a new browser takes the next contexts;
+- kills Chromium processes it saw earlier that are still alive but no longer
+  under this process, i.e. left behind by a crashed browser or driver.
+
+Only the Playwright driver's tree is followed, so the browsers of job worker
+processes, which run their own pool and watchdog, are not counted here.
+"""
+
+import asyncio
+import logging
+import os
+import signal
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Set
+
+import config
+import metrics
+from browser_pool import BrowserPool, pool
+
+logger = logging.getLogger(__name__)
+
+MB = 1024 * 1024
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+# Process names (/proc/<pid>/stat) followed from this process down to the browsers
+DRIVER_NAMES = ("node",)
+BROWSER_NAMES = ("chrom", "headless_shell")
+
+
+class ProcessInfo(NamedTuple):
+    pid: int
+    ppid: int
+    name: str
+    rss: int  # bytes
+    started: int  # clock ticks after boot; tells a reused pid apart
+
+
+def read_processes(proc_dir: str = "/proc") -> Dict[int, ProcessInfo]:
+    """Every process in proc_dir, by pid. Empty where there is no /proc."""
+    try:
+        entries = os.listdir(proc_dir)
+    except OSError:
+        return {}
+    processes = {}
+    for entry in entries:
+        if not entry.isdigit():
+            continue
+        try:
+            with open(os.path.join(proc_dir, entry, "stat")) as f:
+                stat = f.read()
+            with open(os.path.join(proc_dir, entry, "statm")) as f:
+                resident = int(f.read().split()[1])
+        except (OSError, IndexError, ValueError):
+            continue  # exited meanwhile
+        # The name is in parentheses and may contain spaces; ppid and starttime follow
+        name = stat[stat.index("(") + 1 : stat.rindex(")")]
+        fields = stat[stat.rindex(")") + 2 :].split()
+        pid = int(entry)
+        processes[pid] = ProcessInfo(
+            pid, int(fields[1]), name, resident * PAGE_SIZE, int(fields[19])
+        )
+    return processes
+
+
+def is_browser(process: ProcessInfo) -> bool:
+    return any(name in process.name for name in BROWSER_NAMES)
+
+
+def _children(processes: Dict[int, ProcessInfo]) -> Dict[int, List[ProcessInfo]]:
+    children: Dict[int, List[ProcessInfo]] = {}
+    for process in processes.values():
+        children.setdefault(process.ppid, []).append(process)
+    return children
+
+
+def browser_processes(processes: Dict[int, ProcessInfo], root: int) -> Dict[int, ProcessInfo]:
+    """The browser processes under root, reached through drivers and browsers only."""
+    children = _children(processes)
+    found: Dict[int, ProcessInfo] = {}
+    stack = [root]
+    while stack:
+        for child in children.get(stack.pop(), []):
+            if is_browser(child):
+                found[child.pid] = child
+            elif not child.name.startswith(DRIVER_NAMES):
+                continue
+            stack.append(child.pid)
+    return found
+
+
+def tree_rss(processes: Dict[int, ProcessInfo], roots: Iterable[int]) -> int:
+    """Resident memory of roots and their descendants among processes."""
+    children = _children(processes)
+    total = 0
+    stack = [pid for pid in roots if pid in processes]
+    while stack:
+        process = processes[stack.pop()]
+        total += process.rss
+        stack.extend(child.pid for child in children.get(process.pid, []))
+    return total
+
+
+class BrowserWatchdog:
+    """
+    Tracks the pooled browsers' memory, recycles oversized ones and kills
+    orphaned Chromium processes.
+    """
+
+    def __init__(
+        self,
+        browser_pool: BrowserPool,
+        interval: float = config.BROWSER_WATCHDOG_INTERVAL,
+        max_rss_mb: float = config.BROWSER_MAX_RSS_MB,
+        proc_dir: str = "/proc",
+    ):
+        self.pool = browser_pool
+        self.interval = interval
+        self.max_rss_mb = max_rss_mb
+        self.proc_dir = proc_dir
+        self._task: Optional[asyncio.Task] = None
+        self._seen: Dict[int, int] = {}  # browser pid -> start time
+        self.rss = 0
+        self.current_rss = 0
+        self.peak_rss = 0
+        self.checks = 0
+        self.orphans_killed = 0
+        self.last_error: Optional[str] = None
+
+    def _kill(self, process: ProcessInfo):
+        try:
+            os.kill(process.pid, signal.SIGKILL)
+        except (ProcessLookupError, PermissionError) as e:
+            logger.warning(f"Could not kill orphaned {process.name} {process.pid}: {e}")
+            return
+        self.orphans_killed += 1
+        metrics.BROWSER_ORPHANS_KILLED.inc()
+        logger.warning(f"Killed orphaned {process.name} process {process.pid}")
+
+    def inspect(self, processes: Dict[int, ProcessInfo], own_pid: Optional[int] = None):
+        """One check over a process table (see read_processes)."""
+        browsers = browser_processes(processes, own_pid or os.getpid())
+        self.checks += 1
+        self.rss = sum(process.rss for process in browsers.values())
+        self.peak_rss = max(self.peak_rss, self.rss)
+        metrics.BROWSER_RSS.set(self.rss)
+
+        # Root processes not known yet belong to the browser launched since the last check
+        current = self.pool.current
+        known: Set[int] = {pid for pooled in self.pool.browsers for pid in pooled.pids}
+        if current is not None:
+            current.pids.update(
+                pid
+                for pid, process in browsers.items()
+                if process.ppid not in browsers and pid not in known
+            )
+        self.current_rss = tree_rss(browsers, current.pids) if current is not None else 0
+        if (
+            self.max_rss_mb > 0
+            and current is not None
+            and current.uses > 0
+            and self.current_rss > self.max_rss_mb * MB
+        ):
+            logger.warning(
+                f"Pooled Chromium #{current.number} uses {self.current_rss / MB:.0f} MB "
+                f"(limit {self.max_rss_mb:.0f} MB)"
+            )
+            self.pool.retire(current, "memory")
+
+        for pid, started in list(self._seen.items()):
+            process = processes.get(pid)
+            if process is None or process.started != started:
+                del self._seen[pid]  # exited
+            elif pid not in browsers:
+                del self._seen[pid]
+                self._kill(process)
+        self._seen.update({pid: process.started for pid, process in browsers.items()})
+
+    async def check(self):
+        processes = await asyncio.to_thread(read_processes, self.proc_dir)
+        self.inspect(processes)
+
+    async def _loop(self):
+        while True:
+            try:
+                await self.check()
+                self.last_error = None
+            except Exception as e:
+                self.last_error = str(e)
+                logger.error(f"Browser watchdog check failed: {e}")
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        """Schedules periodic checks. Does nothing when disabled or without /proc."""
+        if self.interval > 0 and os.path.isdir(self.proc_dir) and self._task is None:
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "running": self._task is not None,
+            "rss_mb": round(self.rss / MB, 1),
+            "peak_rss_mb": round(self.peak_rss / MB, 1),
+            "current_browser_rss_mb": round(self.current_rss / MB, 1),
+            "max_rss_mb": self.max_rss_mb,
+            "orphans_killed": self.orphans_killed,
+            "checks": self.checks,
+            "last_error": self.last_error,
+        }
+
+
+# Shared instance started/stopped with the browser pool
+browser_watchdog = BrowserWatchdog(pool)
@@ -0,0 +1,184 @@
+"""
+TTL + LRU cache for scraper results, keyed by the normalized document.
+
+Entries are classified as positive (records found), empty (nothing found) or
+error (failed or partial search), each with its own TTL. An optional SQLite
+tier in requests.db lets entries survive restarts; writes to it prune expired
+rows, and the oldest beyond CACHE_PERSISTENT_MAX_ENTRIES, every
+CACHE_PRUNE_INTERVAL seconds.
+"""
+
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional
+
+import config
+from database import (
+    delete_cached_result,
+    get_cached_result,
+    prune_cached_results,
+    save_cached_result,
+)
+
+logger = logging.getLogger(__name__)
+
+POSITIVE = "positive"
+EMPTY = "empty"
+ERROR = "error"
+
+
+@dataclass
+class CacheEntry:
+    kind: str
+    value: Dict[str, Any]
+    stored_at: float  # epoch seconds
+
+    @property
+    def age(self) -> float:
+        return time.time() - self.stored_at
+
+    @property
+    def cached_at(self) -> str:
+        return datetime.fromtimestamp(self.stored_at, tz=timezone.utc).isoformat()
+
+
+def classify(result: Dict[str, Any]) -> str:
+    """Decides which TTL bucket a scraper result belongs to."""
+    if result.get("error") or result.get("errors"):
+        return ERROR
+    if result.get("count", 0) > 0 or result.get("found"):
+        return POSITIVE
+    return EMPTY
+
+
+class ResultCache:
+    """
+    In-memory LRU with per-kind TTLs and an optional persistent tier.
+    """
+
+    def __init__(
+        self,
+        namespace: str,
+        max_entries: int = config.CACHE_MAX_ENTRIES,
+        ttl_positive: float = config.CACHE_TTL_POSITIVE,
+        ttl_empty: float = config.CACHE_TTL_EMPTY,
+        ttl_error: float = config.CACHE_TTL_ERROR,
+        persistent: bool = config.CACHE_PERSISTENT,
+        persistent_max_entries: int = config.CACHE_PERSISTENT_MAX_ENTRIES,
+        prune_interval: float = config.CACHE_PRUNE_INTERVAL,
+    ):
+        self.namespace = namespace
+        self.max_entries = max_entries
+        self.ttls = {POSITIVE: ttl_positive, EMPTY: ttl_empty, ERROR: ttl_error}
+        self.persistent = persistent
+        self.persistent_max_entries = persistent_max_entries
+        self.prune_interval = prune_interval
+        self._last_prune = float("-inf")
+        self._entries: "OrderedDict[str, CacheEntry]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.pruned = 0
+
+    def _fresh(self, entry: CacheEntry, max_age: Optional[float]) -> bool:
+        age = entry.age
+        if age > self.ttls.get(entry.kind, 0):
+            return False
+        return max_age is None or age <= max_age
+
+    def _remember(self, key: str, entry: CacheEntry):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    async def get(self, key: str, max_age: Optional[float] = None) -> Optional[CacheEntry]:
+        """
+        Returns a fresh entry for key, or None.
+
+        Args:
+            key: Normalized document.
+            max_age: Caller's own freshness limit in seconds, on top of the TTL.
+        """
+        entry = self._entries.get(key)
+        if entry is not None:
+            if self._fresh(entry, max_age):
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry
+            if entry.age > self.ttls.get(entry.kind, 0):
+                del self._entries[key]
+
+        if self.persistent:
+            stored = await asyncio.to_thread(get_cached_result, self.namespace, key)
+            if stored is not None:
+                kind, value, stored_at = stored
+                entry = CacheEntry(kind=kind, value=value, stored_at=stored_at)
+                if entry.age > self.ttls.get(kind, 0):
+                    await asyncio.to_thread(delete_cached_result, self.namespace, key)
+                elif self._fresh(entry, max_age):
+                    self._remember(key, entry)
+                    self.hits += 1
+                    return entry
+
+        self.misses += 1
+        return None
+
+    async def set(self, key: str, value: Dict[str, Any]) -> CacheEntry:
+        entry = CacheEntry(kind=classify(value), value=value, stored_at=time.time())
+        if self.ttls.get(entry.kind, 0) <= 0:
+            return entry
+        self._remember(key, entry)
+        if self.persistent:
+            try:
+                await asyncio.to_thread(
+                    save_cached_result,
+                    self.namespace,
+                    key,
+                    entry.kind,
+                    value,
+                    entry.stored_at,
+                )
+            except Exception as e:
+                logger.warning(f"Could not persist cache entry for {key}: {e}")
+            await self.prune()
+        return entry
+
+    async def prune(self, force: bool = False):
+        """
+        Deletes expired and excess rows of the persistent tier, at most once per
+        prune_interval unless forced. Rows are otherwise only dropped when an
+        expired key is read again.
+        """
+        now = time.time()
+        if not force and now - self._last_prune < self.prune_interval:
+            return
+        self._last_prune = now
+        try:
+            self.pruned += await asyncio.to_thread(
+                prune_cached_results, self.namespace, self.ttls, self.persistent_max_entries, now
+            )
+        except Exception as e:
+            logger.warning(f"Could not prune the {self.namespace} cache table: {e}")
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "pruned": self.pruned,
+        }
+
+
+search_cache = ResultCache("search")
+person_cache = ResultCache("person", ttl_positive=config.PERSON_CACHE_TTL)
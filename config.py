@@ -0,0 +1,179 @@
+"""
+Runtime settings, read from environment variables with sensible defaults.
+"""
+
+import os
+from typing import List
+
+
+def _env_int(name: str, default: int) -> int:
+    value = os.getenv(name)
+    return int(value) if value else default
+
+
+def _env_float(name: str, default: float) -> float:
+    value = os.getenv(name)
+    return float(value) if value else default
+
+
+def _env_bool(name: str, default: bool) -> bool:
+    value = os.getenv(name)
+    if not value:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+def _env_list(name: str, default: str) -> List[str]:
+    value = os.getenv(name, default)
+    return [item.strip() for item in value.split(",") if item.strip()]
+
+
+# Browser pool
+BROWSER_HEADLESS = _env_bool("BROWSER_HEADLESS", True)
+BROWSER_MAX_CONCURRENCY = _env_int("BROWSER_MAX_CONCURRENCY", 8)  # pages open at once
+BROWSER_ACQUIRE_TIMEOUT = _env_float("BROWSER_ACQUIRE_TIMEOUT", 30.0)  # seconds
+BROWSER_MAX_USES = _env_int("BROWSER_MAX_USES", 500)  # contexts before a relaunch; 0 = never
+BROWSER_MAX_RSS_MB = _env_float("BROWSER_MAX_RSS_MB", 1536.0)  # relaunch above this; 0 = never
+BROWSER_WATCHDOG_INTERVAL = _env_float("BROWSER_WATCHDOG_INTERVAL", 10.0)  # seconds; 0 = off
+
+# Result cache (seconds / entries)
+CACHE_MAX_ENTRIES = _env_int("CACHE_MAX_ENTRIES", 1024)
+CACHE_TTL_POSITIVE = _env_float("CACHE_TTL_POSITIVE", 3600.0)  # records found
+CACHE_TTL_EMPTY = _env_float("CACHE_TTL_EMPTY", 900.0)  # no records
+CACHE_TTL_ERROR = _env_float("CACHE_TTL_ERROR", 30.0)  # failed or partial searches
+CACHE_PERSISTENT = _env_bool("CACHE_PERSISTENT", False)  # keep a SQLite tier in requests.db
+# Rows kept per namespace in the SQLite tier; expired and excess rows are pruned
+CACHE_PERSISTENT_MAX_ENTRIES = _env_int("CACHE_PERSISTENT_MAX_ENTRIES", 100000)
+CACHE_PRUNE_INTERVAL = _env_float("CACHE_PRUNE_INTERVAL", 300.0)  # seconds between prunes
+PERSON_CACHE_TTL = _env_float("PERSON_CACHE_TTL", 7 * 86400.0)  # Portal names/locations found
+
+# Site base URLs; point them at a stand-in server (benchmarks/standin.py) to run offline
+ESAJ_BASE_URL = os.getenv("ESAJ_BASE_URL", "https://esaj.tjsp.jus.br").rstrip("/")
+PORTAL_BASE_URL = os.getenv("PORTAL_BASE_URL", "https://portaldatransparencia.gov.br").rstrip("/")
+
+# eSAJ search engine: "http" (plain GET to search.do, falls back to the browser when the
+# markup is unexpected) or "browser" (always drive Playwright)
+SEARCH_ENGINE = os.getenv("SEARCH_ENGINE", "http")
+# Portal da Transparência engine: "http" (plain GETs, falls back to the browser when the
+# markup is unexpected) or "browser"
+PORTAL_ENGINE = os.getenv("PORTAL_ENGINE", "http")
+HTTP_TIMEOUT = _env_float("HTTP_TIMEOUT", 30.0)  # seconds
+HTTP_MAX_CONNECTIONS = _env_int("HTTP_MAX_CONNECTIONS", 20)
+
+# Batch search
+BATCH_CONCURRENCY = _env_int("BATCH_CONCURRENCY", 4)  # default documents in flight per batch
+BATCH_MAX_CONCURRENCY = _env_int("BATCH_MAX_CONCURRENCY", 16)  # cap on the per-request value
+BATCH_MAX_DOCUMENTS = _env_int("BATCH_MAX_DOCUMENTS", 10000)
+
+
+# Request interception: abort non-essential resources on every pooled page
+BLOCK_RESOURCES = _env_bool("BLOCK_RESOURCES", True)
+BLOCKED_RESOURCE_TYPES = _env_list("BLOCKED_RESOURCE_TYPES", "image,media,font,stylesheet")
+BLOCKED_DOMAINS = _env_list(
+    "BLOCKED_DOMAINS",
+    "google-analytics.com,googletagmanager.com,doubleclick.net,googlesyndication.com,"
+    "facebook.net,facebook.com,hotjar.com,clarity.ms,newrelic.com,nr-data.net,"
+    "scorecardresearch.com,vlibras.gov.br",
+)
+# URL fragments (e.g. a host or path) that are never blocked
+BLOCK_ALLOWLIST = _env_list("BLOCK_ALLOWLIST", "")
+
+# Result pagination: extra list pages fetched per degree search
+PAGINATION_MAX_PAGES = _env_int("PAGINATION_MAX_PAGES", 10)  # including the first page
+PAGINATION_CONCURRENCY = _env_int("PAGINATION_CONCURRENCY", 4)
+
+# Detail enrichment of multi-result searches (enrich=true)
+ENRICH_CONCURRENCY = _env_int("ENRICH_CONCURRENCY", 4)  # detail pages fetched at once
+ENRICH_TIME_BUDGET = _env_float("ENRICH_TIME_BUDGET", 20.0)  # seconds per request
+
+# Process detail store (process_details table), shared by every document search
+PROCESS_DETAILS_MAX_AGE = _env_float("PROCESS_DETAILS_MAX_AGE", 86400.0)  # seconds
+
+# Extra party labels for name extraction, as "Label" or "Label=Role" (e.g.
+# "Vítima,Assistente=Assistente de Acusação"); added to party_names.DEFAULT_ROLES
+PARTY_ROLES = _env_list("PARTY_ROLES", "")
+
+# SQLite (requests.db)
+DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./requests.db")
+SQLITE_WAL = _env_bool("SQLITE_WAL", True)  # journal_mode=WAL + synchronous=NORMAL
+SQLITE_BUSY_TIMEOUT = _env_float("SQLITE_BUSY_TIMEOUT", 5.0)  # seconds to wait on a lock
+
+# Request log write-behind queue
+LOG_BATCH_SIZE = _env_int("LOG_BATCH_SIZE", 200)  # rows per INSERT
+LOG_FLUSH_INTERVAL = _env_float("LOG_FLUSH_INTERVAL", 1.0)  # max seconds a row waits
+LOG_QUEUE_MAX = _env_int("LOG_QUEUE_MAX", 10000)  # rows beyond this are dropped
+
+# /status: days of per-day request totals to report
+STATUS_HISTORY_DAYS = _env_int("STATUS_HISTORY_DAYS", 7)
+
+# Request log retention: rows older than RETENTION_DAYS move to gzip JSONL archives
+RETENTION_DAYS = _env_float("RETENTION_DAYS", 0.0)  # 0 keeps everything in SQLite
+RETENTION_INTERVAL = _env_float("RETENTION_INTERVAL", 3600.0)  # seconds between runs
+RETENTION_BATCH_SIZE = _env_int("RETENTION_BATCH_SIZE", 5000)  # rows moved per transaction
+RETENTION_VACUUM_PAGES = _env_int("RETENTION_VACUUM_PAGES", 10000)  # pages freed per run
+# Finished jobs are deleted this many days after they were submitted; 0 keeps them
+JOB_RETENTION_DAYS = _env_float("JOB_RETENTION_DAYS", 7.0)
+ARCHIVE_DIR = os.getenv("ARCHIVE_DIR", "./archive")
+
+# Watchlist: registered documents re-checked in the background
+WATCHLIST_ENABLED = _env_bool("WATCHLIST_ENABLED", True)
+WATCHLIST_INTERVAL = _env_float("WATCHLIST_INTERVAL", 86400.0)  # default seconds between checks
+WATCHLIST_JITTER = _env_float("WATCHLIST_JITTER", 0.1)  # +/- fraction of the interval
+WATCHLIST_CONCURRENCY = _env_int("WATCHLIST_CONCURRENCY", 2)  # documents checked at once
+WATCHLIST_POLL_INTERVAL = _env_float("WATCHLIST_POLL_INTERVAL", 60.0)  # seconds between scans
+WATCHLIST_DETAIL_BUDGET = _env_float("WATCHLIST_DETAIL_BUDGET", 60.0)  # seconds per document
+# Movements of an unchanged listed process are re-read at most this often (seconds)
+WATCHLIST_MOVEMENT_INTERVAL = _env_float("WATCHLIST_MOVEMENT_INTERVAL", 86400.0)
+# Stored process details a check may reuse instead of fetching (seconds; capped at half
+# the watch's interval so new movements are not hidden by the process store)
+WATCHLIST_DETAIL_MAX_AGE = _env_float("WATCHLIST_DETAIL_MAX_AGE", 600.0)
+
+# Asynchronous jobs (POST /jobs), run by worker processes with their own browser pool
+JOB_WORKERS = _env_int("JOB_WORKERS", 2)  # processes; 0 runs jobs inside the API process
+JOB_CONCURRENCY = _env_int("JOB_CONCURRENCY", 2)  # jobs in flight per worker
+JOB_POLL_INTERVAL = _env_float("JOB_POLL_INTERVAL", 0.5)  # seconds between polls when idle
+JOB_WEBHOOK_TIMEOUT = _env_float("JOB_WEBHOOK_TIMEOUT", 10.0)  # seconds per delivery attempt
+JOB_WEBHOOK_RETRIES = _env_int("JOB_WEBHOOK_RETRIES", 3)  # delivery attempts
+# Webhook hosts accepted as they are (e.g. internal receivers); any other host
+# must resolve only to public addresses
+JOB_WEBHOOK_ALLOWED_HOSTS = [host.lower() for host in _env_list("JOB_WEBHOOK_ALLOWED_HOSTS", "")]
+
+# Upstream rate limiting: token bucket + adaptive (AIMD) concurrency per scraped host.
+# Rates, bursts and max concurrencies are totals, split evenly between the processes
+# that scrape: the API and its job workers by default. Raise UPSTREAM_PROCESSES when
+# running more API processes (e.g. uvicorn --workers)
+RATE_LIMIT_ENABLED = _env_bool("RATE_LIMIT_ENABLED", True)
+UPSTREAM_PROCESSES = _env_int("UPSTREAM_PROCESSES", 1 + JOB_WORKERS)
+ESAJ_RATE = _env_float("ESAJ_RATE", 5.0)  # requests/s to eSAJ; 0 = no rate cap
+ESAJ_BURST = _env_int("ESAJ_BURST", 10)
+ESAJ_MAX_CONCURRENCY = _env_int("ESAJ_MAX_CONCURRENCY", 16)
+PORTAL_RATE = _env_float("PORTAL_RATE", 2.0)  # requests/s to the Portal da Transparência
+PORTAL_BURST = _env_int("PORTAL_BURST", 4)
+PORTAL_MAX_CONCURRENCY = _env_int("PORTAL_MAX_CONCURRENCY", 4)
+UPSTREAM_INITIAL_CONCURRENCY = _env_int("UPSTREAM_INITIAL_CONCURRENCY", 4)
+UPSTREAM_MIN_CONCURRENCY = _env_int("UPSTREAM_MIN_CONCURRENCY", 1)
+UPSTREAM_LATENCY_TARGET = _env_float("UPSTREAM_LATENCY_TARGET", 10.0)  # slower: stop growing
+UPSTREAM_BACKOFF = _env_float("UPSTREAM_BACKOFF", 0.5)  # limit multiplier on throttling
+UPSTREAM_COOLDOWN = _env_float("UPSTREAM_COOLDOWN", 5.0)  # min seconds between cuts
+UPSTREAM_MAX_PAUSE = _env_float("UPSTREAM_MAX_PAUSE", 60.0)  # cap on honoured Retry-After
+
+# Resilience of degree searches: retries, hedged attempts and a per-host circuit breaker
+RETRY_ATTEMPTS = _env_int("RETRY_ATTEMPTS", 2)  # tries per degree search, the first included
+RETRY_BACKOFF = _env_float("RETRY_BACKOFF", 1.0)  # seconds before the first retry, then doubled
+HEDGE_ENABLED = _env_bool("HEDGE_ENABLED", True)
+HEDGE_PERCENTILE = _env_float("HEDGE_PERCENTILE", 95.0)  # hedge attempts slower than this
+HEDGE_MIN_SAMPLES = _env_int("HEDGE_MIN_SAMPLES", 20)  # successful runs needed before hedging
+HEDGE_WINDOW = _env_int("HEDGE_WINDOW", 200)  # recent runs the percentile is learned from
+HEDGE_MIN_DELAY = _env_float("HEDGE_MIN_DELAY", 1.0)  # never hedge sooner than this (seconds)
+CIRCUIT_FAILURE_THRESHOLD = _env_int("CIRCUIT_FAILURE_THRESHOLD", 5)  # consecutive failures
+CIRCUIT_RESET_TIMEOUT = _env_float("CIRCUIT_RESET_TIMEOUT", 30.0)  # seconds open before a probe
+
+# Degree search result wait: races the known outcomes (list, detail page, "no results")
+RESULT_WAIT_TIMEOUT = _env_float("RESULT_WAIT_TIMEOUT", 20.0)  # seconds before giving up
+
+# Debug artifacts (HTML snapshots) of result pages that showed no known outcome
+DEBUG_ARTIFACTS_DIR = os.getenv("DEBUG_ARTIFACTS_DIR", "./debug")
+DEBUG_ARTIFACT_SAMPLE_RATE = _env_float("DEBUG_ARTIFACT_SAMPLE_RATE", 1.0)  # fraction captured
+DEBUG_ARTIFACT_MIN_INTERVAL = _env_float("DEBUG_ARTIFACT_MIN_INTERVAL", 60.0)  # seconds apart
+DEBUG_ARTIFACT_MAX_FILES = _env_int("DEBUG_ARTIFACT_MAX_FILES", 50)  # oldest removed beyond this
+DEBUG_ARTIFACT_SCREENSHOT = _env_bool("DEBUG_ARTIFACT_SCREENSHOT", False)  # also save a PNG
@@ -0,0 +1,28 @@
+import os
+import tempfile
+
+import pytest
+
+# Set before config is imported, so nothing in the test run (e.g. a log row the
+# writer thread flushes after its test) ever reaches the repo's requests.db
+os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp()}/requests.db"
+
+import config  # noqa: E402
+import database  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def tmp_db(tmp_path_factory, monkeypatch):
+    """Points the engine and SessionLocal at a fresh SQLite file per test."""
+    url = f"sqlite:///{tmp_path_factory.mktemp('db') / 'requests.db'}"
+    test_engine = database.create_db_engine(url)
+    default_engine = database.engine
+    # Job worker processes read the URL from the environment
+    monkeypatch.setenv("DATABASE_URL", url)
+    monkeypatch.setattr(config, "DATABASE_URL", url)
+    monkeypatch.setattr(database, "engine", test_engine)
+    database.SessionLocal.configure(bind=test_engine)
+    database.init_db()
+    yield test_engine
+    database.SessionLocal.configure(bind=default_engine)
+    test_engine.dispose()
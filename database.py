@@ -1,10 +1,37 @@
-from sqlalchemy import create_engine, Column, Integer, String, DateTime, Text
-from sqlalchemy.orm import declarative_base, sessionmaker
-from datetime import datetime
-from typing import List, Optional, Any
+from sqlalchemy import (
+    create_engine,
+    event,
+    func,
+    insert,
+    or_,
+    select,
+    tuple_,
+    update,
+    Float,
+    ForeignKey,
+    Index,
+    Integer,
+    String,
+    DateTime,
+    Text,
+)
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Mapped, declarative_base, mapped_column, sessionmaker
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Any, Sequence, Tuple, cast
+import base64
 import json
+import sqlite3
 
-DATABASE_URL = "sqlite:///./requests.db"
+import config
+
+DATABASE_URL = config.DATABASE_URL
+
+# PRAGMA user_version once request_processes/request_names have been backfilled
+CHILDREN_BACKFILLED = 1
+BACKFILL_BATCH_SIZE = 1000  # requests rows per backfill transaction
 
 Base = declarative_base()
 
@@ -12,21 +39,346 @@ Base = declarative_base()
 class RequestLog(Base):  # type: ignore
     __tablename__ = "requests"
 
-    id = Column(Integer, primary_key=True, index=True)
-    timestamp = Column(DateTime, default=datetime.utcnow)
-    document = Column(String, index=True)
-    status = Column(String)
-    records_count = Column(Integer, default=0)
-    details = Column(Text, default="[]")  # JSON string of process numbers
-    names = Column(Text, default="[]")  # JSON string of party names
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
+    timestamp: Mapped[datetime] = mapped_column(DateTime, nullable=True, default=datetime.utcnow)
+    document: Mapped[str] = mapped_column(String, nullable=True, index=True)
+    status: Mapped[str] = mapped_column(String, nullable=True)
+    records_count: Mapped[int] = mapped_column(Integer, nullable=True, default=0)
+    # JSON string of process numbers
+    details: Mapped[str] = mapped_column(Text, nullable=True, default="[]")
+    # JSON string of party names
+    names: Mapped[str] = mapped_column(Text, nullable=True, default="[]")
+
+    __table_args__ = (
+        Index("ix_requests_document_timestamp", "document", "timestamp"),
+        Index("ix_requests_timestamp_id", "timestamp", "id"),
+        # Never reuse the ids of archived rows, so their archives import cleanly
+        {"sqlite_autoincrement": True},
+    )
+
+
+class RequestProcess(Base):  # type: ignore
+    """One process listed in a logged search result."""
+
+    __tablename__ = "request_processes"
+
+    request_id: Mapped[int] = mapped_column(Integer, ForeignKey("requests.id"), primary_key=True)
+    # CNJ number, digits only
+    number_key: Mapped[str] = mapped_column(String, primary_key=True)
+    degree: Mapped[str] = mapped_column(String, primary_key=True, default="")
+    number: Mapped[str] = mapped_column(String, nullable=True)  # as shown by eSAJ
+
+    __table_args__ = (Index("ix_request_processes_number", "number_key", "request_id"),)
+
+
+class RequestName(Base):  # type: ignore
+    """One party name found in a logged search result."""
+
+    __tablename__ = "request_names"
+
+    request_id: Mapped[int] = mapped_column(Integer, ForeignKey("requests.id"), primary_key=True)
+    name: Mapped[str] = mapped_column(String, primary_key=True)
+
+    __table_args__ = (Index("ix_request_names_name", "name", "request_id"),)
+
+
+class RequestStat(Base):  # type: ignore
+    """Running totals of the requests table, kept in step by insert_request_logs."""
+
+    __tablename__ = "request_stats"
+
+    # "all", "status", "day" or "degree"
+    scope: Mapped[str] = mapped_column(String, primary_key=True)
+    # "", status, ISO date (UTC) or degree name
+    key: Mapped[str] = mapped_column(String, primary_key=True)
+    requests: Mapped[int] = mapped_column(Integer, nullable=True, default=0)
+    success: Mapped[int] = mapped_column(Integer, nullable=True, default=0)
+    failed: Mapped[int] = mapped_column(Integer, nullable=True, default=0)
+    # records_count, or processes found in a degree
+    records: Mapped[int] = mapped_column(Integer, nullable=True, default=0)
+
+
+STAT_COUNTERS = ("requests", "success", "failed", "records")
+
+
+class CachedResult(Base):  # type: ignore
+    __tablename__ = "search_cache"
+
+    namespace: Mapped[str] = mapped_column(String, primary_key=True)  # "search" or "person"
+    key: Mapped[str] = mapped_column(String, primary_key=True)  # normalized document
+    # "positive", "empty" or "error"
+    kind: Mapped[str] = mapped_column(String, nullable=True)
+    payload: Mapped[str] = mapped_column(Text, nullable=True)  # JSON string of the scraper result
+    stored_at: Mapped[float] = mapped_column(Float, nullable=True)  # epoch seconds
+
+    __table_args__ = (Index("ix_search_cache_namespace_stored_at", "namespace", "stored_at"),)
+
+
+class ProcessDetails(Base):  # type: ignore
+    __tablename__ = "process_details"
+
+    # CNJ number, digits only
+    number: Mapped[str] = mapped_column(String, primary_key=True, index=True)
+    # JSON string of extract_details_from_page output
+    details: Mapped[str] = mapped_column(Text, nullable=True)
+    fetched_at: Mapped[datetime] = mapped_column(
+        DateTime, nullable=True, default=datetime.utcnow, index=True
+    )
+
+
+class WatchedDocument(Base):  # type: ignore
+    __tablename__ = "watchlist"
+
+    document: Mapped[str] = mapped_column(String, primary_key=True)  # formatted document
+    added_at: Mapped[Optional[datetime]] = mapped_column(DateTime, default=datetime.utcnow)
+    # Seconds between checks; None uses the default
+    interval: Mapped[Optional[float]] = mapped_column(Float)
+    next_check_at: Mapped[Optional[datetime]] = mapped_column(DateTime, index=True)
+    last_checked_at: Mapped[Optional[datetime]] = mapped_column(DateTime)
+    last_error: Mapped[Optional[str]] = mapped_column(Text)
+    # JSON: process key -> number, degree, latest movement
+    snapshot: Mapped[Optional[str]] = mapped_column(Text)
+
+
+class WatchChange(Base):  # type: ignore
+    """One difference found between two checks of a watched document."""
+
+    __tablename__ = "watch_changes"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    document: Mapped[Optional[str]] = mapped_column(String)
+    detected_at: Mapped[Optional[datetime]] = mapped_column(DateTime, default=datetime.utcnow)
+    # "process_added", "process_removed" or "movement"
+    kind: Mapped[Optional[str]] = mapped_column(String)
+    process: Mapped[Optional[str]] = mapped_column(String)  # CNJ number as shown by eSAJ
+    payload: Mapped[Optional[str]] = mapped_column(Text, default="{}")  # JSON, depends on kind
+
+    __table_args__ = (Index("ix_watch_changes_document_id", "document", "id"),)
+
+
+class Job(Base):  # type: ignore
+    """A lookup queued by POST /jobs and run by a job worker."""
+
+    __tablename__ = "jobs"
 
+    id: Mapped[str] = mapped_column(String, primary_key=True)  # uuid4 hex
+    kind: Mapped[str] = mapped_column(String)  # "search" (TJSP) or "person" (Portal)
+    document: Mapped[str] = mapped_column(String)  # formatted document
+    # JSON: the request that created the job
+    options: Mapped[Optional[str]] = mapped_column(Text, default="{}")
+    # "queued", "running", "done" or "failed"
+    status: Mapped[str] = mapped_column(String, nullable=True, default="queued")
+    created_at: Mapped[Optional[datetime]] = mapped_column(DateTime, default=datetime.utcnow)
+    started_at: Mapped[Optional[datetime]] = mapped_column(DateTime)
+    finished_at: Mapped[Optional[datetime]] = mapped_column(DateTime)
+    worker: Mapped[Optional[str]] = mapped_column(String)
+    result: Mapped[Optional[str]] = mapped_column(Text)  # JSON response body, when done
+    error: Mapped[Optional[str]] = mapped_column(Text)
+    webhook: Mapped[Optional[str]] = mapped_column(String)
+    # "delivered" or the last delivery error
+    webhook_status: Mapped[Optional[str]] = mapped_column(String)
+
+    __table_args__ = (Index("ix_jobs_status_created", "status", "created_at"),)
+
+
+FINISHED_JOB_STATUSES = ("done", "failed")
+ACTIVE_JOB_STATUSES = ("queued", "running")
+
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    # WAL lets readers (/status, caches) proceed while the log writer commits, and
+    # synchronous=NORMAL only fsyncs at checkpoints instead of on every commit.
+    cursor = dbapi_connection.cursor()
+    try:
+        # Only takes effect on a new database; retention converts existing ones
+        cursor.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        if config.SQLITE_WAL:
+            cursor.execute("PRAGMA journal_mode=WAL")
+            cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute(f"PRAGMA busy_timeout={int(config.SQLITE_BUSY_TIMEOUT * 1000)}")
+        cursor.execute("PRAGMA temp_store=MEMORY")
+    finally:
+        cursor.close()
+
+
+def create_db_engine(url: str = DATABASE_URL) -> Engine:
+    """A SQLite engine with the app's connection pragmas."""
+    db_engine = create_engine(url, connect_args={"check_same_thread": False})
+    event.listen(db_engine, "connect", _set_sqlite_pragmas)
+    return db_engine
+
+
+engine = create_db_engine()
 
-engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 
 def init_db():
     Base.metadata.create_all(bind=engine)  # type: ignore
+    # create_all skips indexes of tables that already exist
+    for model in (RequestLog, CachedResult):
+        for index in model.__table__.indexes:  # type: ignore
+            index.create(bind=engine, checkfirst=True)
+    _backfill_request_stats()
+    _backfill_request_children()
+
+
+def request_log_row(
+    document: str,
+    status: str,
+    records_count: int = 0,
+    details: Optional[List[Any]] = None,
+    names: Optional[List[Any]] = None,
+) -> Dict[str, Any]:
+    """Column values of one RequestLog row, ready for insert_request_logs."""
+    return {
+        "timestamp": datetime.utcnow(),
+        "document": document,
+        "status": status,
+        "records_count": records_count,
+        "details": json.dumps(details) if details else "[]",
+        "names": json.dumps(names) if names else "[]",
+    }
+
+
+def _stat_deltas(rows: Iterable[Dict[str, Any]]) -> Dict[Tuple[str, str], Counter]:
+    """Adds up what a batch of RequestLog rows contributes to each RequestStat row."""
+    deltas: Dict[Tuple[str, str], Counter] = defaultdict(Counter)
+    for row in rows:
+        outcome = {"requests": 1, row["status"]: 1, "records": row["records_count"] or 0}
+        timestamp = row.get("timestamp") or datetime.utcnow()
+        for key in (("all", ""), ("status", row["status"]), ("day", timestamp.date().isoformat())):
+            deltas[key].update(outcome)
+
+        per_degree: Counter[str] = Counter(
+            process["degree"]
+            for process in json.loads(row.get("details") or "[]")
+            if isinstance(process, dict) and process.get("degree")
+        )
+        for degree, found in per_degree.items():
+            deltas[("degree", degree)].update({"requests": 1, "records": found})
+    return deltas
+
+
+def _apply_stat_deltas(db, deltas: Dict[Tuple[str, str], Counter]):
+    for (scope, key), delta in deltas.items():
+        values = {name: delta.get(name, 0) for name in STAT_COUNTERS}
+        stmt = sqlite_insert(RequestStat).values(scope=scope, key=key, **values)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["scope", "key"],
+            set_={
+                name: getattr(RequestStat, name) + getattr(stmt.excluded, name)
+                for name in STAT_COUNTERS
+            },
+        )
+        db.execute(stmt)
+
+
+def insert_request_logs(rows: List[Dict[str, Any]]):
+    """
+    Inserts many RequestLog rows (executemany) and updates request_stats in the
+    same transaction.
+    """
+    if not rows:
+        return
+    db = SessionLocal()
+    try:
+        ids: Sequence[int] = (
+            db.execute(
+                insert(RequestLog).returning(RequestLog.id, sort_by_parameter_order=True), rows
+            )
+            .scalars()
+            .all()
+        )
+        _insert_children(db, zip(ids, rows))
+        _apply_stat_deltas(db, _stat_deltas(rows))
+        db.commit()
+    finally:
+        db.close()
+
+
+def _number_key(number: str) -> str:
+    return "".join(filter(str.isdigit, number or ""))
+
+
+def _insert_children(db, logged: Iterable[Tuple[int, Dict[str, Any]]]):
+    """Inserts the request_processes/request_names rows of logged (id, row) pairs."""
+    processes: Dict[Tuple[int, str, str], Dict[str, Any]] = {}
+    names: Dict[Tuple[int, str], Dict[str, Any]] = {}
+    for request_id, row in logged:
+        for process in json.loads(row.get("details") or "[]"):
+            if not isinstance(process, dict) or not _number_key(process.get("number", "")):
+                continue
+            key = (request_id, _number_key(process["number"]), process.get("degree") or "")
+            processes[key] = {
+                "request_id": request_id,
+                "number_key": key[1],
+                "degree": key[2],
+                "number": process["number"],
+            }
+        for name in json.loads(row.get("names") or "[]"):
+            if isinstance(name, str) and name:
+                names[(request_id, name)] = {"request_id": request_id, "name": name}
+    # Ignoring conflicts lets restores re-import rows that are already present
+    if processes:
+        db.execute(sqlite_insert(RequestProcess).on_conflict_do_nothing(), list(processes.values()))
+    if names:
+        db.execute(sqlite_insert(RequestName).on_conflict_do_nothing(), list(names.values()))
+
+
+def _backfill_request_stats():
+    """Builds request_stats from the requests table the first time it is created."""
+    db = SessionLocal()
+    try:
+        if db.query(RequestStat).first() is not None or db.query(RequestLog).first() is None:
+            return
+        rows = (
+            {
+                "timestamp": log.timestamp,
+                "status": log.status,
+                "records_count": log.records_count,
+                "details": log.details,
+            }
+            for log in db.query(RequestLog).yield_per(1000)
+        )
+        _apply_stat_deltas(db, _stat_deltas(rows))
+        db.commit()
+    finally:
+        db.close()
+
+
+def _backfill_request_children():
+    """
+    Fills request_processes/request_names for rows logged before they existed,
+    in batches of BACKFILL_BATCH_SIZE rows. Runs once per database: completion
+    is recorded in PRAGMA user_version.
+    """
+    with engine.connect() as conn:
+        if conn.exec_driver_sql("PRAGMA user_version").scalar() >= CHILDREN_BACKFILLED:
+            return
+    db = SessionLocal()
+    try:
+        last_id = 0
+        while True:
+            # Keyset batches, so each commit leaves no cursor open over the table
+            logs = db.execute(
+                select(RequestLog.id, RequestLog.details, RequestLog.names)
+                .where(RequestLog.id > last_id)
+                .where((RequestLog.details != "[]") | (RequestLog.names != "[]"))
+                .order_by(RequestLog.id)
+                .limit(BACKFILL_BATCH_SIZE)
+            ).all()
+            if not logs:
+                break
+            _insert_children(
+                db, ((log.id, {"details": log.details, "names": log.names}) for log in logs)
+            )
+            db.commit()
+            last_id = logs[-1].id
+    finally:
+        db.close()
+    with engine.begin() as conn:
+        conn.exec_driver_sql(f"PRAGMA user_version={CHILDREN_BACKFILLED}")
 
 
 def log_request(
@@ -36,27 +388,683 @@ def log_request(
     details: Optional[List[Any]] = None,
     names: Optional[List[Any]] = None,
 ):
+    """Writes one row synchronously. The API goes through log_writer instead."""
+    insert_request_logs([request_log_row(document, status, records_count, details, names)])
+
+
+def _archive_record(log: RequestLog) -> Dict[str, Any]:
+    return {
+        "id": log.id,
+        "timestamp": log.timestamp.isoformat(),
+        "document": log.document,
+        "status": log.status,
+        "records_count": log.records_count,
+        "details": json.loads(log.details or "[]"),
+        "names": json.loads(log.names or "[]"),
+    }
+
+
+def fetch_requests_before(before: datetime, limit: int) -> List[Dict[str, Any]]:
+    """The oldest logged requests with timestamp < before, as archive records."""
     db = SessionLocal()
     try:
-        details_json = json.dumps(details) if details else "[]"
-        names_json = json.dumps(names) if names else "[]"
+        logs = db.execute(
+            select(RequestLog)
+            .where(RequestLog.timestamp < before)
+            .order_by(RequestLog.timestamp, RequestLog.id)
+            .limit(limit)
+        ).scalars()
+        return [_archive_record(log) for log in logs]
+    finally:
+        db.close()
+
+
+def delete_requests(ids: List[int]):
+    """Deletes logged requests and their child rows. request_stats keeps counting them."""
+    db = SessionLocal()
+    try:
+        db.query(RequestProcess).filter(RequestProcess.request_id.in_(ids)).delete()
+        db.query(RequestName).filter(RequestName.request_id.in_(ids)).delete()
+        db.query(RequestLog).filter(RequestLog.id.in_(ids)).delete()
+        db.commit()
+    finally:
+        db.close()
+
+
+def import_request_records(records: List[Dict[str, Any]]) -> Dict[str, int]:
+    """
+    Restores archive records with their original ids.
+
+    A record whose row (same document and timestamp) is already present is
+    skipped, so importing twice is harmless. A record whose id now belongs to
+    another row, which happens on tables created before ids were
+    AUTOINCREMENT, gets a new id instead of being dropped.
+
+    request_stats is left alone: archived rows were never subtracted from it.
+
+    Returns:
+        {"imported": rows inserted, "rekeyed": how many of them got a new id}.
+    """
+    if not records:
+        return {"imported": 0, "rekeyed": 0}
+    rows = [
+        {
+            "id": record["id"],
+            "timestamp": datetime.fromisoformat(record["timestamp"]),
+            "document": record.get("document"),
+            "status": record.get("status"),
+            "records_count": record.get("records_count") or 0,
+            "details": json.dumps(record.get("details") or []),
+            "names": json.dumps(record.get("names") or []),
+        }
+        for record in records
+    ]
+    db = SessionLocal()
+    try:
+        present = set(
+            db.execute(
+                select(RequestLog.document, RequestLog.timestamp).where(
+                    tuple_(RequestLog.document, RequestLog.timestamp).in_(
+                        [(row["document"], row["timestamp"]) for row in rows]
+                    )
+                )
+            ).all()
+        )
+        rows = [row for row in rows if (row["document"], row["timestamp"]) not in present]
+        taken = set(
+            db.execute(select(RequestLog.id).where(RequestLog.id.in_([row["id"] for row in rows])))
+            .scalars()
+            .all()
+        )
+        kept = [row for row in rows if row["id"] not in taken]
+        rekeyed = [
+            {k: v for k, v in row.items() if k != "id"} for row in rows if row["id"] in taken
+        ]
+        if kept:
+            db.execute(insert(RequestLog), kept)
+            _insert_children(db, ((row["id"], row) for row in kept))
+        if rekeyed:
+            ids: Sequence[int] = (
+                db.execute(
+                    insert(RequestLog).returning(RequestLog.id, sort_by_parameter_order=True),
+                    rekeyed,
+                )
+                .scalars()
+                .all()
+            )
+            _insert_children(db, zip(ids, rekeyed))
+        db.commit()
+        return {"imported": len(kept) + len(rekeyed), "rekeyed": len(rekeyed)}
+    finally:
+        db.close()
+
+
+def incremental_vacuum(pages: int) -> Dict[str, int]:
+    """
+    Returns up to `pages` free pages to the filesystem.
+
+    A database created before auto_vacuum=INCREMENTAL was set gets one full
+    VACUUM to switch modes; after that only incremental steps run.
+    """
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        if conn.exec_driver_sql("PRAGMA auto_vacuum").scalar() != 2:
+            conn.exec_driver_sql("PRAGMA auto_vacuum=INCREMENTAL")
+            conn.exec_driver_sql("VACUUM")
+        free_before = conn.exec_driver_sql("PRAGMA freelist_count").scalar() or 0
+        # sqlite3's execute() steps a statement once, which frees a single page;
+        # executescript() runs the pragma to completion
+        sqlite_connection = cast(sqlite3.Connection, conn.connection.driver_connection)
+        sqlite_connection.executescript(f"PRAGMA incremental_vacuum({int(pages)});")
+        free_after = conn.exec_driver_sql("PRAGMA freelist_count").scalar() or 0
+    return {"freed_pages": free_before - free_after, "free_pages": free_after}
+
+
+def get_total_requests() -> int:
+    db = SessionLocal()
+    try:
+        row = db.get(RequestStat, ("all", ""))
+        return row.requests if row else 0
+    finally:
+        db.close()
+
+
+def get_request_stats(days: int = 7) -> Dict[str, Any]:
+    """
+    Request totals from request_stats: a handful of primary-key lookups, however
+    large the requests table is.
+
+    Args:
+        days: How many recent UTC days to include in by_day.
+    """
+    since = (datetime.utcnow().date() - timedelta(days=max(days, 1) - 1)).isoformat()
+    db = SessionLocal()
+    try:
+        stats = (
+            db.query(RequestStat)
+            .filter(
+                (RequestStat.scope.in_(("all", "status", "degree")))
+                | ((RequestStat.scope == "day") & (RequestStat.key >= since))
+            )
+            .all()
+        )
+    finally:
+        db.close()
+
+    def counters(stat: RequestStat) -> Dict[str, int]:
+        return {name: getattr(stat, name) or 0 for name in STAT_COUNTERS}
+
+    totals = {name: 0 for name in STAT_COUNTERS}
+    by_status: Dict[str, int] = {}
+    by_day: Dict[str, Dict[str, int]] = {}
+    by_degree: Dict[str, Dict[str, int]] = {}
+    for stat in stats:
+        if stat.scope == "all":
+            totals = counters(stat)
+        elif stat.scope == "status":
+            by_status[stat.key] = stat.requests or 0
+        elif stat.scope == "day":
+            by_day[stat.key] = counters(stat)
+        else:
+            by_degree[stat.key] = {"requests": stat.requests or 0, "processes": stat.records or 0}
+
+    return {
+        "total": totals["requests"],
+        "success": totals["success"],
+        "failed": totals["failed"],
+        "average_records": (
+            round(totals["records"] / totals["success"], 2) if totals["success"] else 0.0
+        ),
+        "by_status": by_status,
+        "by_day": dict(sorted(by_day.items())),
+        "by_degree": by_degree,
+    }
+
+
+def encode_cursor(timestamp: datetime, request_id: int) -> str:
+    raw = f"{timestamp.isoformat()}|{request_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """
+    Raises:
+        ValueError: If the cursor was not produced by encode_cursor.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        timestamp, request_id = raw.split("|")
+        return datetime.fromisoformat(timestamp), int(request_id)
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+
+def get_history(
+    document: Optional[str] = None,
+    status: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    process: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: int = 50,
+) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """
+    Logged searches, newest first, one page at a time.
+
+    Pages are keyset-paginated on (timestamp, id): the cursor is the last row
+    of the previous page, so deep pages cost the same as the first one.
+
+    Args:
+        document: Formatted document, as stored in the log.
+        process: CNJ number, with or without punctuation.
+        since, until: Timestamp range (UTC), inclusive and exclusive.
+        cursor: next_cursor returned with the previous page.
+
+    Returns:
+        The page and the cursor of the next one (None on the last page).
+
+    Raises:
+        ValueError: If the cursor is invalid.
+    """
+    query = select(RequestLog)
+    if document:
+        query = query.where(RequestLog.document == document)
+    if status:
+        query = query.where(RequestLog.status == status)
+    if since:
+        query = query.where(RequestLog.timestamp >= since)
+    if until:
+        query = query.where(RequestLog.timestamp < until)
+    if process:
+        matching = select(RequestProcess.request_id).where(
+            RequestProcess.number_key == _number_key(process)
+        )
+        query = query.where(RequestLog.id.in_(matching))
+    if cursor:
+        timestamp, request_id = decode_cursor(cursor)
+        query = query.where(
+            (RequestLog.timestamp < timestamp)
+            | ((RequestLog.timestamp == timestamp) & (RequestLog.id < request_id))
+        )
+    query = query.order_by(RequestLog.timestamp.desc(), RequestLog.id.desc()).limit(limit + 1)
 
-        log = RequestLog(
+    db = SessionLocal()
+    try:
+        logs = db.execute(query).scalars().all()
+        has_more = len(logs) > limit
+        logs = logs[:limit]
+        ids = [log.id for log in logs]
+
+        processes: Dict[int, List[Dict[str, str]]] = defaultdict(list)
+        names: Dict[int, List[str]] = defaultdict(list)
+        if ids:
+            for child in db.execute(
+                select(RequestProcess).where(RequestProcess.request_id.in_(ids))
+            ).scalars():
+                processes[child.request_id].append({"number": child.number, "degree": child.degree})
+            for child in db.execute(
+                select(RequestName).where(RequestName.request_id.in_(ids))
+            ).scalars():
+                names[child.request_id].append(child.name)
+
+        items = [
+            {
+                "id": log.id,
+                "timestamp": log.timestamp.isoformat(),
+                "document": log.document,
+                "status": log.status,
+                "records_count": log.records_count,
+                "processes": processes[log.id],
+                "names": sorted(names[log.id]),
+            }
+            for log in logs
+        ]
+        next_cursor = encode_cursor(logs[-1].timestamp, logs[-1].id) if has_more else None
+        return items, next_cursor
+    finally:
+        db.close()
+
+
+def get_cached_result(namespace: str, key: str) -> Optional[Tuple[str, Any, float]]:
+    db = SessionLocal()
+    try:
+        row = db.get(CachedResult, (namespace, key))
+        if row is None:
+            return None
+        return row.kind, json.loads(row.payload), row.stored_at
+    finally:
+        db.close()
+
+
+def save_cached_result(namespace: str, key: str, kind: str, payload: Any, stored_at: float):
+    db = SessionLocal()
+    try:
+        db.merge(
+            CachedResult(
+                namespace=namespace,
+                key=key,
+                kind=kind,
+                payload=json.dumps(payload),
+                stored_at=stored_at,
+            )
+        )
+        db.commit()
+    finally:
+        db.close()
+
+
+def prune_cached_results(
+    namespace: str, ttls: Dict[str, float], max_entries: int, now: float
+) -> int:
+    """
+    Deletes the rows of a namespace that are past their kind's TTL, then the
+    oldest ones beyond max_entries.
+
+    Returns:
+        How many rows were deleted.
+    """
+    db = SessionLocal()
+    try:
+        in_namespace = db.query(CachedResult).filter(CachedResult.namespace == namespace)
+        deleted = in_namespace.filter(
+            or_(
+                *(
+                    (CachedResult.kind == kind) & (CachedResult.stored_at < now - ttl)
+                    for kind, ttl in ttls.items()
+                )
+            )
+        ).delete(synchronize_session=False)
+        # stored_at of the newest row past the limit: it and older rows go
+        first_excess = (
+            db.query(CachedResult.stored_at)
+            .filter(CachedResult.namespace == namespace)
+            .order_by(CachedResult.stored_at.desc())
+            .offset(max(0, max_entries))
+            .limit(1)
+            .scalar()
+        )
+        if first_excess is not None:
+            deleted += in_namespace.filter(CachedResult.stored_at <= first_excess).delete(
+                synchronize_session=False
+            )
+        db.commit()
+        return deleted
+    finally:
+        db.close()
+
+
+def delete_cached_result(namespace: str, key: str):
+    db = SessionLocal()
+    try:
+        db.query(CachedResult).filter_by(namespace=namespace, key=key).delete()
+        db.commit()
+    finally:
+        db.close()
+
+
+def get_process_details(number: str) -> Optional[Tuple[Dict[str, Any], datetime]]:
+    db = SessionLocal()
+    try:
+        row = db.get(ProcessDetails, number)
+        if row is None:
+            return None
+        return json.loads(row.details), row.fetched_at
+    finally:
+        db.close()
+
+
+def save_process_details(number: str, details: Any, fetched_at: Optional[datetime] = None):
+    db = SessionLocal()
+    try:
+        db.merge(
+            ProcessDetails(
+                number=number,
+                details=json.dumps(details),
+                fetched_at=fetched_at or datetime.utcnow(),
+            )
+        )
+        db.commit()
+    finally:
+        db.close()
+
+
+def _watch_dict(watch: WatchedDocument) -> Dict[str, Any]:
+    return {
+        "document": watch.document,
+        "added_at": watch.added_at,
+        "interval": watch.interval,
+        "next_check_at": watch.next_check_at,
+        "last_checked_at": watch.last_checked_at,
+        "last_error": watch.last_error,
+        "snapshot": json.loads(watch.snapshot) if watch.snapshot else None,
+    }
+
+
+def add_watch(document: str, interval: Optional[float], next_check_at: datetime) -> Dict[str, Any]:
+    """Registers a document, or updates the interval of one already watched."""
+    db = SessionLocal()
+    try:
+        watch = db.get(WatchedDocument, document)
+        if watch is None:
+            watch = WatchedDocument(document=document, next_check_at=next_check_at)
+            db.add(watch)
+        watch.interval = interval
+        db.commit()
+        return _watch_dict(watch)
+    finally:
+        db.close()
+
+
+def remove_watch(document: str) -> bool:
+    db = SessionLocal()
+    try:
+        removed = db.query(WatchedDocument).filter_by(document=document).delete()
+        db.commit()
+        return bool(removed)
+    finally:
+        db.close()
+
+
+def list_watches() -> List[Dict[str, Any]]:
+    db = SessionLocal()
+    try:
+        watches = db.query(WatchedDocument).order_by(WatchedDocument.document)
+        return [_watch_dict(watch) for watch in watches]
+    finally:
+        db.close()
+
+
+def due_watches(now: datetime, limit: int) -> List[Dict[str, Any]]:
+    """Watched documents whose next check is due, most overdue first."""
+    db = SessionLocal()
+    try:
+        watches = (
+            db.query(WatchedDocument)
+            .filter(WatchedDocument.next_check_at <= now)
+            .order_by(WatchedDocument.next_check_at)
+            .limit(limit)
+        )
+        return [_watch_dict(watch) for watch in watches]
+    finally:
+        db.close()
+
+
+def save_watch_check(
+    document: str,
+    checked_at: datetime,
+    next_check_at: datetime,
+    snapshot: Optional[Dict[str, Any]] = None,
+    changes: Optional[List[Dict[str, Any]]] = None,
+    error: Optional[str] = None,
+):
+    """
+    Stores the outcome of one check: the new snapshot and its changes, in one
+    transaction. A failed check (error) keeps the previous snapshot.
+    """
+    db = SessionLocal()
+    try:
+        watch = db.get(WatchedDocument, document)
+        if watch is None:  # removed while being checked
+            return
+        watch.last_checked_at = checked_at
+        watch.next_check_at = next_check_at
+        watch.last_error = error
+        if snapshot is not None:
+            watch.snapshot = json.dumps(snapshot)
+        for change in changes or []:
+            db.add(
+                WatchChange(
+                    document=document,
+                    detected_at=checked_at,
+                    kind=change["kind"],
+                    process=change.get("process"),
+                    payload=json.dumps(change.get("payload") or {}),
+                )
+            )
+        db.commit()
+    finally:
+        db.close()
+
+
+def get_watch_changes(
+    after: Optional[int] = None, document: Optional[str] = None, limit: int = 100
+) -> List[Dict[str, Any]]:
+    """Changes in detection order; pass the last id seen as `after` to resume."""
+    db = SessionLocal()
+    try:
+        query = db.query(WatchChange)
+        if after:
+            query = query.filter(WatchChange.id > after)
+        if document:
+            query = query.filter(WatchChange.document == document)
+        return [
+            {
+                "id": change.id,
+                "document": change.document,
+                "detected_at": change.detected_at,
+                "kind": change.kind,
+                "process": change.process,
+                "payload": json.loads(change.payload or "{}"),
+            }
+            for change in query.order_by(WatchChange.id).limit(limit)
+        ]
+    finally:
+        db.close()
+
+
+def _job_dict(job: Job) -> Dict[str, Any]:
+    return {
+        "id": job.id,
+        "kind": job.kind,
+        "document": job.document,
+        "options": json.loads(job.options or "{}"),
+        "status": job.status,
+        "created_at": job.created_at,
+        "started_at": job.started_at,
+        "finished_at": job.finished_at,
+        "worker": job.worker,
+        "result": json.loads(job.result) if job.result else None,
+        "error": job.error,
+        "webhook": job.webhook,
+        "webhook_status": job.webhook_status,
+    }
+
+
+def create_job(
+    job_id: str,
+    kind: str,
+    document: str,
+    options: Dict[str, Any],
+    webhook: Optional[str] = None,
+) -> Dict[str, Any]:
+    db = SessionLocal()
+    try:
+        job = Job(
+            id=job_id,
+            kind=kind,
             document=document,
-            status=status,
-            records_count=records_count,
-            details=details_json,
-            names=names_json,
+            options=json.dumps(options),
+            status="queued",
+            created_at=datetime.utcnow(),
+            webhook=webhook,
         )
-        db.add(log)
+        db.add(job)
+        db.commit()
+        return _job_dict(job)
+    finally:
+        db.close()
+
+
+def get_job(job_id: str) -> Optional[Dict[str, Any]]:
+    db = SessionLocal()
+    try:
+        job = db.get(Job, job_id)
+        return _job_dict(job) if job else None
+    finally:
+        db.close()
+
+
+def claim_job(worker: str) -> Optional[Dict[str, Any]]:
+    """
+    Marks the oldest queued job as running and returns it.
+
+    The pick and the update are one UPDATE statement, so workers in several
+    processes never claim the same job.
+    """
+    oldest = (
+        select(Job.id)
+        .where(Job.status == "queued")
+        .order_by(Job.created_at, Job.id)
+        .limit(1)
+        .scalar_subquery()
+    )
+    db = SessionLocal()
+    try:
+        job = db.scalars(
+            update(Job)
+            .where(Job.id == oldest, Job.status == "queued")
+            .values(status="running", worker=worker, started_at=datetime.utcnow())
+            .returning(Job)
+        ).first()
+        db.commit()
+        return _job_dict(job) if job else None
+    finally:
+        db.close()
+
+
+def finish_job(
+    job_id: str, result: Optional[Dict[str, Any]] = None, error: Optional[str] = None
+) -> Optional[Dict[str, Any]]:
+    """Stores the outcome of a job: "done" with its result, or "failed" with the error."""
+    db = SessionLocal()
+    try:
+        job = db.get(Job, job_id)
+        if job is None:
+            return None
+        job.status = "failed" if error is not None else "done"
+        job.result = json.dumps(result, ensure_ascii=False) if result is not None else None
+        job.error = error
+        job.finished_at = datetime.utcnow()
+        db.commit()
+        return _job_dict(job)
+    finally:
+        db.close()
+
+
+def set_webhook_status(job_id: str, status: str):
+    db = SessionLocal()
+    try:
+        db.query(Job).filter_by(id=job_id).update({"webhook_status": status})
+        db.commit()
+    finally:
+        db.close()
+
+
+def requeue_running_jobs(worker: Optional[str] = None) -> int:
+    """Puts jobs left running by workers that died (all, or one worker's) back in the queue."""
+    db = SessionLocal()
+    try:
+        query = db.query(Job).filter_by(status="running")
+        if worker is not None:
+            query = query.filter_by(worker=worker)
+        requeued = query.update({"status": "queued", "worker": None, "started_at": None})
         db.commit()
+        return requeued
     finally:
         db.close()
 
 
-def get_total_requests():
+def count_jobs(statuses: Optional[Iterable[str]] = None) -> Dict[str, int]:
+    """
+    Number of jobs per status. Limited to `statuses`, the count only reads their
+    part of ix_jobs_status_created.
+    """
     db = SessionLocal()
     try:
-        return db.query(RequestLog).count()
+        query = db.query(Job.status, func.count())
+        if statuses is not None:
+            query = query.filter(Job.status.in_(list(statuses)))
+        rows: Iterable[Tuple[str, int]] = query.group_by(Job.status)
+        return {status: count for status, count in rows}
+    finally:
+        db.close()
+
+
+def purge_finished_jobs(before: datetime, limit: int) -> int:
+    """
+    Deletes up to `limit` done or failed jobs submitted before `before`.
+
+    Returns:
+        How many jobs were deleted.
+    """
+    db = SessionLocal()
+    try:
+        finished = (
+            select(Job.id)
+            .where(Job.status.in_(FINISHED_JOB_STATUSES), Job.created_at < before)
+            .limit(limit)
+        )
+        deleted = db.query(Job).filter(Job.id.in_(finished)).delete(synchronize_session=False)
+        db.commit()
+        return deleted
     finally:
         db.close()
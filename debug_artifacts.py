@@ -0,0 +1,119 @@
+"""
+Debug artifacts of scraped pages that did not look as expected.
+
+Captures are sampled (DEBUG_ARTIFACT_SAMPLE_RATE) and at most one per
+DEBUG_ARTIFACT_MIN_INTERVAL, so a site outage does not turn every search
+into a page dump. Each artifact is an HTML snapshot, plus a viewport PNG
+when DEBUG_ARTIFACT_SCREENSHOT is set, under a unique name in
+DEBUG_ARTIFACTS_DIR; only the newest DEBUG_ARTIFACT_MAX_FILES are kept.
+"""
+
+import asyncio
+import logging
+import os
+import random
+import re
+import time
+import uuid
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+import config
+
+logger = logging.getLogger(__name__)
+
+
+def _slug(label: str) -> str:
+    return re.sub(r"[^0-9A-Za-z]+", "_", label).strip("_") or "page"
+
+
+class DebugArtifacts:
+    """
+    Sampled, rate-limited page snapshots.
+    """
+
+    def __init__(
+        self,
+        directory: str = config.DEBUG_ARTIFACTS_DIR,
+        sample_rate: float = config.DEBUG_ARTIFACT_SAMPLE_RATE,
+        min_interval: float = config.DEBUG_ARTIFACT_MIN_INTERVAL,
+        max_files: int = config.DEBUG_ARTIFACT_MAX_FILES,
+        screenshot: bool = config.DEBUG_ARTIFACT_SCREENSHOT,
+    ):
+        self.directory = directory
+        self.sample_rate = sample_rate
+        self.min_interval = min_interval
+        self.max_files = max(1, max_files)
+        self.screenshot = screenshot
+        self._last = float("-inf")
+        self.saved = 0
+        self.skipped = 0
+        self.failed = 0
+        self.last_path: Optional[str] = None
+
+    def _due(self) -> bool:
+        """Takes the capture slot if this one is sampled and not rate-limited."""
+        now = time.monotonic()
+        if random.random() >= self.sample_rate or now - self._last < self.min_interval:
+            return False
+        self._last = now
+        return True
+
+    def _write(self, name: str, html: str, png: Optional[bytes]) -> str:
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, f"{name}.html")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(html)
+        if png is not None:
+            with open(os.path.join(self.directory, f"{name}.png"), "wb") as f:
+                f.write(png)
+        self._prune()
+        return path
+
+    def _prune(self):
+        # An artifact is one or two files sharing a name; keep the newest ones
+        files = [entry for entry in os.scandir(self.directory) if entry.is_file()]
+        newest: Dict[str, float] = {}
+        for entry in files:
+            stem = os.path.splitext(entry.name)[0]
+            newest[stem] = max(newest.get(stem, 0.0), entry.stat().st_mtime)
+        old = set(sorted(newest, key=newest.__getitem__, reverse=True)[self.max_files :])
+        for entry in files:
+            if os.path.splitext(entry.name)[0] in old:
+                os.remove(entry.path)
+
+    async def capture(self, page, label: str) -> Optional[str]:
+        """
+        Saves a snapshot of page if one is due. Never raises.
+
+        Returns:
+            The path of the HTML snapshot, or None if none was saved.
+        """
+        if not self._due():
+            self.skipped += 1
+            return None
+        stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+        name = f"{_slug(label)}-{stamp}-{uuid.uuid4().hex[:8]}"
+        try:
+            html = await page.content()
+            png = await page.screenshot(timeout=5000) if self.screenshot else None
+            path = await asyncio.to_thread(self._write, name, html, png)
+        except Exception as e:
+            self.failed += 1
+            logger.warning(f"Could not save debug artifact {name}: {e}")
+            return None
+        self.saved += 1
+        self.last_path = path
+        return path
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "saved": self.saved,
+            "skipped": self.skipped,
+            "failed": self.failed,
+            "last_path": self.last_path,
+        }
+
+
+# Shared instance used by the browser scraper
+debug_artifacts = DebugArtifacts()
@@ -0,0 +1,381 @@
+"""
+HTTP-only eSAJ search engine.
+
+The cpopg/cposg document search is a plain GET to search.do, so most lookups
+need no browser at all. Pages whose markup is not recognised raise
+UnexpectedMarkupError so the caller can fall back to Playwright.
+"""
+
+import asyncio
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+import httpx
+
+import config
+import metrics
+from browser_pool import USER_AGENT
+from html_tree import Node, parse_html
+from process_store import process_store
+from rate_limit import THROTTLE_STATUSES, retry_after, upstream
+from resilience import error_kind
+from parsing import (
+    DETAIL_SELECTORS,
+    PAGE_PARAM,
+    TOTAL_COUNT_SELECTOR,
+    build_details,
+    build_paged_result,
+    has_no_results,
+    is_blocked,
+    parse_total,
+    parties_from_partes,
+    party_dicts,
+    remaining_page_urls,
+)
+
+logger = logging.getLogger(__name__)
+
+
+LIST_ROW_CLASSES = {"fundoClaro", "fundoEscuro"}
+
+
+class UnexpectedMarkupError(Exception):
+    """Raised when a response does not look like any known result page."""
+
+
+def pooled_client(
+    timeout: float = config.HTTP_TIMEOUT, max_connections: int = config.HTTP_MAX_CONNECTIONS
+) -> httpx.AsyncClient:
+    """Keep-alive client with the browser's User-Agent, for the HTTP engines."""
+    return httpx.AsyncClient(
+        headers={"User-Agent": USER_AGENT},
+        timeout=timeout,
+        follow_redirects=True,
+        limits=httpx.Limits(
+            max_connections=max_connections, max_keepalive_connections=max_connections
+        ),
+    )
+
+
+async def limited_get(client: httpx.AsyncClient, url: str, **kwargs: Any) -> httpx.Response:
+    """GET through the host's rate limiter; 429/503 answers make it back off."""
+    async with upstream.slot(url) as permit:
+        response = await client.get(url, **kwargs)
+        if response.status_code in THROTTLE_STATUSES:
+            permit.throttled(retry_after(response.headers.get("Retry-After")))
+        elif response.status_code >= 500:
+            permit.failed()
+    return response
+
+
+def search_params(system: str, clean_document: str) -> Dict[str, str]:
+    """Query string of search.do for a document search in cpopg or cposg."""
+    if system == "cposg":
+        return {
+            "conversationId": "",
+            "paginaConsulta": "1",
+            "cbPesquisa": "DOCPARTE",
+            "tipoNuProcesso": "UNIFICADO",
+            "dePesquisa": clean_document,
+        }
+    return {
+        "conversationId": "",
+        "cbPesquisa": "DOCPARTE",
+        "dadosConsulta.valorConsulta": clean_document,
+        "cdForo": "-1",
+    }
+
+
+def _text_by_id(tree: Node, element_id: str) -> Optional[str]:
+    node = tree.find(id=element_id)
+    return node.text() if node else None
+
+
+def _table_cells(table: Optional[Node]) -> List[List[str]]:
+    if table is None:
+        return []
+    return [[td.text() for td in row.find_all("td")] for row in table.find_all("tr")]
+
+
+def _link(link: Node) -> Dict[str, Optional[str]]:
+    return {"number": link.text(), "href": link.get("href")}
+
+
+def parse_detail_page(tree: Node) -> Dict[str, Any]:
+    """
+    Same fields as scraper.extract_details_from_page, from parsed HTML.
+    """
+    fields = {
+        key: _text_by_id(tree, selector.split("#", 1)[1])
+        for key, selector in DETAIL_SELECTORS.items()
+    }
+    return build_details(
+        fields,
+        _table_cells(tree.find("table", id="tablePartesPrincipais")),
+        _table_cells(tree.find("tbody", id="tabelaTodasMovimentacoes")),
+    )
+
+
+def _is_result_row(node: Node) -> bool:
+    if node.tag == "div":
+        return "processoDetalhes" in node.classes
+    return node.tag == "tr" and bool(LIST_ROW_CLASSES.intersection(node.classes))
+
+
+def list_snapshot(tree: Node) -> Dict[str, Any]:
+    """Raw rows, links and pagination of a list page, like scraper.LIST_PAGE_JS."""
+    rows = []
+    for node in tree.iter():
+        if _is_result_row(node):
+            link = node.find("a", cls="linkProcesso")
+            rows.append({"link": _link(link) if link else None, "text": node.text()})
+    total = tree.find(id=TOTAL_COUNT_SELECTOR.split("#", 1)[1])
+    return {
+        "rows": rows,
+        "links": [_link(link) for link in tree.find_all("a", cls="linkProcesso")],
+        "total": total.text() if total else None,
+        "pageLinks": [
+            a.get("href") or ""
+            for a in tree.find_all("a")
+            if f"{PAGE_PARAM}=" in (a.get("href") or "")
+        ],
+    }
+
+
+def read_search_page(
+    html: str, degree_name: str, page_url: str
+) -> Tuple[Optional[Dict[str, Any]], Dict[str, Any]]:
+    """
+    Reads the first page of a search.do response.
+
+    Returns:
+        (result, snapshot): result is final for "no results" and detail pages
+        and None for a result list, whose snapshot may need more pages.
+
+    Raises:
+        UnexpectedMarkupError: If the page is neither a "no results" message,
+            a process detail page nor a result list.
+    """
+    empty: Dict[str, Any] = {"rows": [], "links": [], "total": None, "pageLinks": []}
+    if has_no_results(html):
+        return {"count": 0, "details": [], "names": []}, empty
+
+    tree = parse_html(html)
+
+    # A single result redirects straight to the process detail page
+    number = (_text_by_id(tree, "numeroProcesso") or "").strip()
+    if number:
+        full_details = parse_detail_page(tree)
+        parties = parties_from_partes(full_details["partes"])
+        result = {
+            "count": 1,
+            "details": [
+                {"number": number, "degree": degree_name, "link": page_url, **full_details}
+            ],
+            "names": list({party.name for party in parties}),
+            "parties": party_dicts(parties),
+        }
+        return result, empty
+
+    snapshot = list_snapshot(tree)
+    if not snapshot["rows"] and not snapshot["links"]:
+        raise UnexpectedMarkupError(f"No result markers in {degree_name} page {page_url}")
+    return None, snapshot
+
+
+def parse_search_page(html: str, degree_name: str, page_url: str) -> Dict[str, Any]:
+    """
+    Turns a single search.do response into the {count, details, names} shape.
+    """
+    result, snapshot = read_search_page(html, degree_name, page_url)
+    if result is not None:
+        return result
+    return build_paged_result([snapshot], degree_name, page_url)
+
+
+class EsajHttpEngine:
+    """
+    Pooled keep-alive client that runs eSAJ document searches over plain HTTP.
+    """
+
+    def __init__(
+        self,
+        base_url: str = config.ESAJ_BASE_URL,
+        client: Optional[httpx.AsyncClient] = None,
+        timeout: float = config.HTTP_TIMEOUT,
+        max_connections: int = config.HTTP_MAX_CONNECTIONS,
+    ):
+        self.base_url = base_url
+        self.timeout = timeout
+        self.max_connections = max_connections
+        self._client = client
+        self._primed: set = set()
+        self.lookups = 0
+        self.fallbacks = 0
+
+    def _get_client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = pooled_client(self.timeout, self.max_connections)
+        return self._client
+
+    async def _prime(self, client: httpx.AsyncClient, system: str):
+        # open.do hands out the JSESSIONID the search is tied to; the client's
+        # cookie jar then reuses it for every later search.
+        if system in self._primed:
+            return
+        await self._get(client, f"{self.base_url}/{system}/open.do")
+        self._primed.add(system)
+
+    async def _get(self, client: httpx.AsyncClient, url: str, **kwargs: Any) -> httpx.Response:
+        return await limited_get(client, url, **kwargs)
+
+    async def search_degree(
+        self,
+        system: str,
+        document: str,
+        degree_name: str,
+        max_processes: Optional[int] = None,
+    ) -> Dict[str, Any]:
+        """
+        HTTP counterpart of scraper.search_degree.
+
+        Args:
+            system: "cpopg" (1st degree) or "cposg" (2nd degree).
+            document: CPF/CNPJ in any format.
+            degree_name: Label used in the results ("1º Grau", "2º Grau").
+            max_processes: Stop paginating once this many processes are listed.
+
+        Raises:
+            UnexpectedMarkupError: If the page cannot be parsed; fall back to the browser.
+        """
+        clean_document = "".join(filter(str.isdigit, document))
+        logger.info(f"Querying TJSP {degree_name} over HTTP for document: {clean_document}")
+        self.lookups += 1
+        client = self._get_client()
+        try:
+            with metrics.stage("http_fetch"):
+                await self._prime(client, system)
+                response = await self._get(
+                    client,
+                    f"{self.base_url}/{system}/search.do",
+                    params=search_params(system, clean_document),
+                )
+        except httpx.HTTPError as e:
+            logger.error(f"Error during HTTP search {degree_name}: {e!r}")
+            metrics.count_error()
+            return {
+                "error": str(e) or repr(e),
+                "error_kind": error_kind(e),
+                "count": 0,
+                "details": [],
+                "names": [],
+            }
+
+        page_url = str(response.url)
+        try:
+            if response.status_code != 200:
+                raise UnexpectedMarkupError(f"{degree_name} answered HTTP {response.status_code}")
+            with metrics.stage("list_parse"):
+                result, snapshot = read_search_page(response.text, degree_name, page_url)
+        except UnexpectedMarkupError:
+            # The session may have expired; prime a new one next time
+            self._primed.discard(system)
+            if is_blocked(response.text):
+                upstream.backoff(page_url, "blocked")
+            raise
+
+        if result is not None and result["count"] == 0:
+            metrics.count_no_results()
+        elif result is not None and result["count"] == 1:
+            # Single-result redirect: keep the details for other documents' searches
+            process = result["details"][0]
+            await process_store.save(process["number"], process)
+        elif result is None:
+            extra_urls = remaining_page_urls(
+                page_url,
+                snapshot["pageLinks"],
+                len(snapshot["rows"]) or len(snapshot["links"]),
+                parse_total(snapshot["total"]),
+                max_processes,
+                config.PAGINATION_MAX_PAGES,
+            )
+            snapshots = [snapshot]
+            if extra_urls:
+                with metrics.stage("pagination"):
+                    snapshots += await self._fetch_list_pages(client, extra_urls, degree_name)
+            with metrics.stage("list_parse"):
+                result = build_paged_result(
+                    snapshots,
+                    degree_name,
+                    page_url,
+                    max_processes,
+                    skipped_pages=1 + len(extra_urls) - len(snapshots),
+                )
+
+        logger.info(f"Found {result['count']} records in {degree_name} over HTTP.")
+        return result
+
+    async def fetch_details(self, link: str) -> Dict[str, Any]:
+        """
+        Fetches a process detail page (show.do) and extracts its fields.
+
+        Raises:
+            UnexpectedMarkupError: If the page is not a process detail page.
+            httpx.HTTPError: On transport errors.
+        """
+        client = self._get_client()
+        system = urlsplit(link).path.strip("/").split("/", 1)[0]
+        with metrics.stage("http_fetch"):
+            if system in ("cpopg", "cposg"):
+                await self._prime(client, system)
+            response = await self._get(client, link)
+        if response.status_code != 200:
+            raise UnexpectedMarkupError(f"Detail page answered HTTP {response.status_code}")
+        with metrics.stage("detail_extraction"):
+            tree = parse_html(response.text)
+            if tree.find(id="numeroProcesso") is None:
+                if is_blocked(response.text):
+                    upstream.backoff(link, "blocked")
+                raise UnexpectedMarkupError(f"Not a process detail page: {link}")
+            return parse_detail_page(tree)
+
+    async def _fetch_list_pages(
+        self, client: httpx.AsyncClient, urls: List[str], degree_name: str
+    ) -> List[Dict[str, Any]]:
+        """
+        Fetches the remaining list pages concurrently; failed pages are left
+        out and reported by the caller as skipped.
+        """
+        semaphore = asyncio.Semaphore(config.PAGINATION_CONCURRENCY)
+
+        async def fetch(url: str) -> Optional[Dict[str, Any]]:
+            async with semaphore:
+                try:
+                    response = await self._get(client, url)
+                    response.raise_for_status()
+                except httpx.HTTPError as e:
+                    logger.warning(f"Skipping {degree_name} result page {url}: {e!r}")
+                    return None
+            return list_snapshot(parse_html(response.text))
+
+        if urls:
+            logger.info(f"Fetching {len(urls)} more result pages in {degree_name} over HTTP")
+        snapshots = await asyncio.gather(*(fetch(url) for url in urls))
+        return [snapshot for snapshot in snapshots if snapshot is not None]
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+        self._primed.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "default": config.SEARCH_ENGINE,
+            "lookups": self.lookups,
+            "fallbacks": self.fallbacks,
+        }
+
+
+http_engine = EsajHttpEngine()
@@ -0,0 +1,196 @@
+"""
+Minimal, dependency-free HTML tree for the HTTP engines.
+
+Only what the eSAJ/Portal pages need: lookup by tag, id and class, and an
+approximation of Playwright's inner_text() (block elements break lines).
+"""
+
+import re
+from html.parser import HTMLParser
+from typing import Dict, Iterator, List, Optional, Union
+
+VOID_TAGS = {
+    "area",
+    "base",
+    "br",
+    "col",
+    "embed",
+    "hr",
+    "img",
+    "input",
+    "link",
+    "meta",
+    "source",
+    "track",
+    "wbr",
+}
+BLOCK_TAGS = {
+    "address",
+    "article",
+    "aside",
+    "blockquote",
+    "dd",
+    "div",
+    "dl",
+    "dt",
+    "fieldset",
+    "footer",
+    "form",
+    "h1",
+    "h2",
+    "h3",
+    "h4",
+    "h5",
+    "h6",
+    "header",
+    "li",
+    "main",
+    "nav",
+    "ol",
+    "p",
+    "section",
+    "table",
+    "tbody",
+    "thead",
+    "tfoot",
+    "tr",
+    "ul",
+}
+SKIPPED_TAGS = {"script", "style", "noscript", "template"}
+# Whitespace as HTML defines it; a no-break space is kept
+WHITESPACE = re.compile(r"[ \t\n\r\f]+")
+# Opening one of these implicitly closes an open sibling of the listed tags
+IMPLICIT_CLOSE = {
+    "td": {"td", "th"},
+    "th": {"td", "th"},
+    "tr": {"td", "th", "tr"},
+    "li": {"li"},
+    "option": {"option"},
+    "p": {"p"},
+}
+
+
+class Node:
+    """An element with its attributes and children (nodes or text)."""
+
+    __slots__ = ("tag", "attrs", "children", "parent")
+
+    def __init__(self, tag: str, attrs: Dict[str, str], parent: Optional["Node"] = None):
+        self.tag = tag
+        self.attrs = attrs
+        self.children: List[Union["Node", str]] = []
+        self.parent = parent
+
+    @property
+    def id(self) -> Optional[str]:
+        return self.attrs.get("id")
+
+    @property
+    def classes(self) -> List[str]:
+        return self.attrs.get("class", "").split()
+
+    def get(self, name: str, default: Optional[str] = None) -> Optional[str]:
+        return self.attrs.get(name, default)
+
+    def iter(self) -> Iterator["Node"]:
+        """Yields every descendant element in document order."""
+        for child in self.children:
+            if isinstance(child, Node):
+                yield child
+                yield from child.iter()
+
+    def matches(
+        self, tag: Optional[str] = None, id: Optional[str] = None, cls: Optional[str] = None
+    ) -> bool:
+        if tag is not None and self.tag != tag:
+            return False
+        if id is not None and self.id != id:
+            return False
+        return cls is None or cls in self.classes
+
+    def find_all(
+        self, tag: Optional[str] = None, id: Optional[str] = None, cls: Optional[str] = None
+    ) -> List["Node"]:
+        return [node for node in self.iter() if node.matches(tag, id, cls)]
+
+    def find(
+        self, tag: Optional[str] = None, id: Optional[str] = None, cls: Optional[str] = None
+    ) -> Optional["Node"]:
+        for node in self.iter():
+            if node.matches(tag, id, cls):
+                return node
+        return None
+
+    def _collect(self, out: List[str]):
+        if self.tag in SKIPPED_TAGS:
+            return
+        if self.tag == "br":
+            out.append("\n")
+            return
+        block = self.tag in BLOCK_TAGS
+        if block:
+            out.append("\n")
+        for child in self.children:
+            if isinstance(child, Node):
+                child._collect(out)
+            else:
+                out.append(WHITESPACE.sub(" ", child))
+        if block:
+            out.append("\n")
+        elif self.tag in ("td", "th"):
+            out.append("\t")
+
+    def text(self) -> str:
+        """
+        Rendered text like innerText: whitespace in the markup collapses to
+        one space and lines break only at block elements and <br>.
+        """
+        out: List[str] = []
+        for child in self.children:
+            if isinstance(child, Node):
+                child._collect(out)
+            else:
+                out.append(WHITESPACE.sub(" ", child))
+        raw = "".join(out).replace("\xa0", " ")
+        lines = (re.sub(r"[ \t]+", " ", line).strip() for line in raw.split("\n"))
+        return "\n".join(line for line in lines if line)
+
+
+class _TreeBuilder(HTMLParser):
+    def __init__(self) -> None:
+        super().__init__(convert_charrefs=True)
+        self.root = Node("#document", {})
+        self._stack = [self.root]
+
+    def handle_starttag(self, tag, attrs):
+        closes = IMPLICIT_CLOSE.get(tag)
+        if closes:
+            while len(self._stack) > 1 and self._stack[-1].tag in closes:
+                self._stack.pop()
+        parent = self._stack[-1]
+        node = Node(tag, {k: v or "" for k, v in attrs}, parent)
+        parent.children.append(node)
+        if tag not in VOID_TAGS:
+            self._stack.append(node)
+
+    def handle_startendtag(self, tag, attrs):
+        parent = self._stack[-1]
+        parent.children.append(Node(tag, {k: v or "" for k, v in attrs}, parent))
+
+    def handle_endtag(self, tag):
+        # Tolerate stray end tags: only close if the element is actually open
+        for i in range(len(self._stack) - 1, 0, -1):
+            if self._stack[i].tag == tag:
+                del self._stack[i:]
+                return
+
+    def handle_data(self, data):
+        self._stack[-1].children.append(data)
+
+
+def parse_html(markup: str) -> Node:
+    """Parses markup into a tree rooted at a synthetic #document node."""
+    builder = _TreeBuilder()
+    builder.feed(markup)
+    builder.close()
+    return builder.root
@@ -0,0 +1,317 @@
+"""
+Asynchronous jobs: lookups queued in SQLite and run by worker processes.
+
+POST /jobs stores a job and returns its id at once; GET /jobs/{id} reads it
+back. Workers claim queued jobs with a single UPDATE, so any number of
+processes can share the queue. Each worker process has its own event loop,
+browser pool and HTTP engine, so browser orchestration and HTML parsing
+spread over cores instead of sharing the API process. When a job has a
+webhook, its final state is POSTed there, provided the target passes
+webhook_target_error: workers must not be aimed at loopback, private or
+link-local services (server-side request forgery).
+
+The handler that runs a job is passed in by the app (main.execute_job), so
+jobs go through the same caches and payload building as the API.
+"""
+
+import asyncio
+import ipaddress
+import logging
+import multiprocessing
+import multiprocessing.synchronize
+import os
+import signal
+import socket
+import uuid
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set
+from urllib.parse import urlsplit
+
+import httpx
+
+import config
+from browser_pool import pool
+from browser_watchdog import browser_watchdog
+from database import claim_job, finish_job, requeue_running_jobs, set_webhook_status
+from esaj_http import http_engine
+from log_writer import log_writer
+from portal_http import portal_engine
+
+logger = logging.getLogger(__name__)
+
+Handler = Callable[[Dict[str, Any]], Awaitable[Dict[str, Any]]]
+
+JOB_KINDS = ("search", "person")
+
+
+def new_job_id() -> str:
+    return uuid.uuid4().hex
+
+
+def _iso(value: Optional[datetime]) -> Optional[str]:
+    return value.isoformat() if value else None
+
+
+def job_view(job: Dict[str, Any]) -> Dict[str, Any]:
+    """The public body of a job, as returned by GET /jobs/{id} and sent to webhooks."""
+    return {
+        "id": job["id"],
+        "kind": job["kind"],
+        "document": job["document"],
+        "status": job["status"],
+        "created_at": _iso(job["created_at"]),
+        "started_at": _iso(job["started_at"]),
+        "finished_at": _iso(job["finished_at"]),
+        "result": job["result"],
+        "error": job["error"],
+        "webhook_status": job["webhook_status"],
+    }
+
+
+def webhook_target_error(url: str) -> Optional[str]:
+    """
+    Why url may not receive webhooks, or None when it may.
+
+    Hosts in JOB_WEBHOOK_ALLOWED_HOSTS are accepted as they are. Any other host
+    must resolve, and every address it resolves to must be public.
+    """
+    parts = urlsplit(url)
+    host = parts.hostname
+    if parts.scheme not in ("http", "https") or not host:
+        return "webhook must be an http(s) URL"
+    if host in config.JOB_WEBHOOK_ALLOWED_HOSTS:
+        return None
+    try:
+        addresses = {info[4][0] for info in socket.getaddrinfo(host, None)}
+    except (socket.gaierror, UnicodeError):
+        return f"webhook host {host} does not resolve"
+    for address in addresses:
+        # Drop the zone of scoped IPv6 addresses ("fe80::1%eth0")
+        if not ipaddress.ip_address(str(address).split("%")[0]).is_global:
+            return f"webhook host {host} is not a public address"
+    return None
+
+
+async def deliver_webhook(
+    job: Dict[str, Any],
+    client: httpx.AsyncClient,
+    retries: int = config.JOB_WEBHOOK_RETRIES,
+) -> str:
+    """
+    POSTs the job to its webhook, retrying with backoff. The target is checked
+    again first, since the host may resolve elsewhere than at submission.
+
+    Returns:
+        "delivered", or the last error.
+    """
+    refused = await asyncio.to_thread(webhook_target_error, job["webhook"])
+    if refused:
+        logger.warning(f"Webhook for job {job['id']} refused: {refused}")
+        return refused
+    error = ""
+    for attempt in range(max(1, retries)):
+        if attempt:
+            await asyncio.sleep(2 ** (attempt - 1))
+        try:
+            response = await client.post(job["webhook"], json=job_view(job))
+            if response.status_code < 400:
+                return "delivered"
+            error = f"HTTP {response.status_code}"
+        except httpx.HTTPError as e:
+            error = str(e) or repr(e)
+    logger.warning(f"Webhook for job {job['id']} failed: {error}")
+    return error
+
+
+class JobWorker:
+    """
+    Claims and runs jobs, at most `concurrency` at a time.
+    """
+
+    def __init__(
+        self,
+        handler: Handler,
+        name: str,
+        concurrency: int = config.JOB_CONCURRENCY,
+        poll_interval: float = config.JOB_POLL_INTERVAL,
+        webhook_timeout: float = config.JOB_WEBHOOK_TIMEOUT,
+    ):
+        self.handler = handler
+        self.name = name
+        self.concurrency = max(1, concurrency)
+        self.poll_interval = poll_interval
+        self.webhook_timeout = webhook_timeout
+        self.completed = 0
+        self.failed = 0
+
+    async def execute(self, job: Dict[str, Any]) -> Dict[str, Any]:
+        """Runs one claimed job, stores its outcome and calls its webhook."""
+        try:
+            result = await self.handler(job)
+        except Exception as e:
+            self.failed += 1
+            logger.warning(f"Job {job['id']} failed: {e!r}")
+            finished = await asyncio.to_thread(finish_job, job["id"], error=str(e) or repr(e))
+        else:
+            self.completed += 1
+            finished = await asyncio.to_thread(finish_job, job["id"], result)
+
+        if finished is not None and finished["webhook"]:
+            async with httpx.AsyncClient(timeout=self.webhook_timeout) as client:
+                status = await deliver_webhook(finished, client)
+            await asyncio.to_thread(set_webhook_status, job["id"], status)
+            finished["webhook_status"] = status
+        return finished or job
+
+    async def run_once(self) -> bool:
+        """Claims and runs one job. Returns False if the queue was empty."""
+        job = await asyncio.to_thread(claim_job, self.name)
+        if job is None:
+            return False
+        await self.execute(job)
+        return True
+
+    async def run(self, should_stop: Callable[[], bool]):
+        """Runs jobs until should_stop() is true, then waits for those in flight."""
+        running: Set[asyncio.Task] = set()
+        while not should_stop():
+            job = None
+            if len(running) < self.concurrency:
+                try:
+                    job = await asyncio.to_thread(claim_job, self.name)
+                except Exception as e:
+                    logger.error(f"Job worker {self.name} could not claim a job: {e}")
+            if job is not None:
+                running.add(asyncio.create_task(self.execute(job)))
+                continue
+            if running:
+                _, running = await asyncio.wait(
+                    running, timeout=self.poll_interval, return_when=asyncio.FIRST_COMPLETED
+                )
+            else:
+                await asyncio.sleep(self.poll_interval)
+        if running:
+            await asyncio.wait(running)
+
+
+async def _serve(name: str, handler: Handler, stop_event, concurrency: int, poll_interval: float):
+    worker = JobWorker(handler, name, concurrency, poll_interval)
+    browser_watchdog.start()
+    try:
+        await worker.run(stop_event.is_set)
+    finally:
+        await http_engine.close()
+        await portal_engine.close()
+        await browser_watchdog.stop()
+        await pool.stop()
+        await asyncio.to_thread(log_writer.stop)
+
+
+def worker_name(index: int, pid: Optional[int]) -> str:
+    return f"worker-{index}:{pid}"
+
+
+def _worker_process(index: int, handler: Handler, stop_event, concurrency: int, poll: float):
+    # Ctrl+C reaches the whole process group; the parent stops workers through stop_event
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(_serve(worker_name(index, os.getpid()), handler, stop_event, concurrency, poll))
+
+
+class JobPool:
+    """
+    Runs the job workers: `workers` processes, or a task in the API process
+    when workers is 0. Dead worker processes are replaced and their running
+    jobs put back in the queue.
+    """
+
+    def __init__(
+        self,
+        workers: int = config.JOB_WORKERS,
+        concurrency: int = config.JOB_CONCURRENCY,
+        poll_interval: float = config.JOB_POLL_INTERVAL,
+    ):
+        self.workers = max(0, workers)
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self._handler: Optional[Handler] = None
+        self._context = multiprocessing.get_context("spawn")
+        self._stop_event: Optional[multiprocessing.synchronize.Event] = None
+        self._processes: List[Any] = []
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+        self.restarts = 0
+
+    def _spawn(self, index: int):
+        process = self._context.Process(
+            target=_worker_process,
+            args=(index, self._handler, self._stop_event, self.concurrency, self.poll_interval),
+            name=f"job-worker-{index}",
+            daemon=True,
+        )
+        process.start()
+        return process
+
+    async def _supervise(self):
+        while not self._stopping:
+            await asyncio.sleep(self.poll_interval * 10)
+            for index, process in enumerate(self._processes):
+                if process.is_alive() or self._stopping:
+                    continue
+                logger.warning(f"Job worker {index} exited ({process.exitcode}); restarting")
+                await asyncio.to_thread(requeue_running_jobs, worker_name(index, process.pid))
+                self._processes[index] = self._spawn(index)
+                self.restarts += 1
+
+    def start(self, handler: Handler):
+        """Starts the workers; jobs left running by a previous run are queued again."""
+        if self._task is not None:
+            return
+        requeued = requeue_running_jobs()
+        if requeued:
+            logger.info(f"Requeued {requeued} interrupted jobs")
+        self._handler = handler
+        self._stopping = False
+        if self.workers == 0:
+            worker = JobWorker(
+                handler, worker_name(0, os.getpid()), self.concurrency, self.poll_interval
+            )
+            self._task = asyncio.create_task(worker.run(lambda: self._stopping))
+            return
+        self._stop_event = self._context.Event()
+        self._processes = [self._spawn(index) for index in range(self.workers)]
+        self._task = asyncio.create_task(self._supervise())
+
+    async def stop(self, timeout: float = 30.0):
+        """Lets the workers finish their jobs in flight, up to timeout."""
+        if self._task is None:
+            return
+        self._stopping = True
+        if self._stop_event is not None:
+            self._stop_event.set()
+            self._task.cancel()
+        try:
+            await asyncio.wait_for(self._task, timeout)
+        except (asyncio.CancelledError, asyncio.TimeoutError):
+            pass
+        for process in self._processes:
+            await asyncio.to_thread(process.join, timeout)
+            if process.is_alive():
+                logger.warning(f"Job worker {process.name} did not stop; terminating")
+                process.terminate()
+        self._processes = []
+        self._stop_event = None
+        self._task = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "workers": self.workers,
+            "mode": "processes" if self.workers else "in-process",
+            "running": self._task is not None,
+            "alive": sum(process.is_alive() for process in self._processes),
+            "restarts": self.restarts,
+        }
+
+
+# Shared instance started by the app lifespan
+job_pool = JobPool()
@@ -0,0 +1,145 @@
+"""
+Write-behind queue for the request log.
+
+Requests enqueue their log row and return; a background thread inserts the
+rows in batches, so searches neither wait on SQLite's write lock nor pay an
+fsync each.
+"""
+
+import logging
+import queue
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+import config
+from database import insert_request_logs, request_log_row
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+class LogWriter:
+    """
+    Buffers RequestLog rows and flushes them by batch size or interval.
+
+    The writer thread starts on first use, so no explicit start is needed
+    (e.g. in tests); stop() flushes what is queued and is called on shutdown.
+    """
+
+    def __init__(
+        self,
+        batch_size: int = config.LOG_BATCH_SIZE,
+        flush_interval: float = config.LOG_FLUSH_INTERVAL,
+        max_queue: int = config.LOG_QUEUE_MAX,
+    ):
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self._queue: "queue.Queue[Any]" = queue.Queue(maxsize=max_queue)
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self.written = 0
+        self.batches = 0
+        self.dropped = 0  # queue full
+        self.failed = 0  # rows lost to a failed insert
+
+    def _ensure_started(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run, name="request-log-writer", daemon=True
+                )
+                self._thread.start()
+
+    def log(
+        self,
+        document: str,
+        status: str,
+        records_count: int = 0,
+        details: Optional[List[Any]] = None,
+        names: Optional[List[Any]] = None,
+    ) -> bool:
+        """
+        Queues one log row without blocking.
+
+        Returns:
+            False if the queue was full and the row was dropped.
+        """
+        self._ensure_started()
+        row = request_log_row(document, status, records_count, details, names)
+        try:
+            self._queue.put_nowait(row)
+        except queue.Full:
+            self.dropped += 1
+            logger.warning(f"Request log queue full, dropping row for {document}")
+            return False
+        return True
+
+    def _write(self, rows: List[Dict[str, Any]]):
+        try:
+            insert_request_logs(rows)
+        except Exception as e:
+            self.failed += len(rows)
+            logger.error(f"Failed to write {len(rows)} request log rows: {e}")
+        else:
+            self.written += len(rows)
+            self.batches += 1
+        finally:
+            for _ in rows:
+                self._queue.task_done()
+
+    def _run(self):
+        while True:
+            first = self._queue.get()
+            if first is _STOP:
+                self._queue.task_done()
+                return
+            batch = [first]
+            deadline = time.monotonic() + self.flush_interval
+            stopping = False
+            while len(batch) < self.batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    self._queue.task_done()
+                    stopping = True
+                    break
+                batch.append(item)
+            self._write(batch)
+            if stopping:
+                return
+
+    def flush(self):
+        """Blocks until every queued row has been written (or has failed)."""
+        if self._thread is not None and self._thread.is_alive():
+            self._queue.join()
+
+    def stop(self, timeout: float = 10.0):
+        """Drains the queue and stops the writer thread."""
+        thread = self._thread
+        if thread is None or not thread.is_alive():
+            return
+        # Blocks if the queue is full, until the writer makes room
+        self._queue.put(_STOP)
+        thread.join(timeout)
+        if thread.is_alive():
+            logger.warning(f"Request log writer did not drain within {timeout:.1f}s")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "queue_depth": self._queue.qsize(),
+            "written": self.written,
+            "batches": self.batches,
+            "dropped": self.dropped,
+            "failed": self.failed,
+        }
+
+
+# Shared instance used by the API and drained by the app lifespan
+log_writer = LogWriter()
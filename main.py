@@ -1,19 +1,107 @@
-from fastapi import FastAPI, HTTPException, BackgroundTasks
-from pydantic import BaseModel
-from typing import Optional
-from scraper import search_tjsp, search_portal_transparencia
-from database import init_db, log_request, get_total_requests
+import asyncio
+import json
+import time
+from functools import partial
+from datetime import datetime, timezone
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Query, Request
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from pydantic import BaseModel, Field
+from typing import Any, Dict, List, Literal, Optional, Tuple
+from scraper import (
+    TJSP_DEGREES,
+    enrich_processes,
+    search_portal_transparencia,
+    search_tjsp,
+    search_tjsp_degree,
+)
+from database import (
+    ACTIVE_JOB_STATUSES,
+    add_watch,
+    count_jobs,
+    create_job,
+    get_history,
+    get_job,
+    get_request_stats,
+    get_watch_changes,
+    init_db,
+    list_watches,
+    remove_watch,
+)
+from browser_pool import PoolSaturatedError, pool
+from browser_watchdog import browser_watchdog
+from resource_blocking import resource_blocker
+from process_store import process_store
+from cache import CacheEntry, ResultCache, person_cache, search_cache
+from singleflight import person_flight, search_flight
+from esaj_http import http_engine
+from portal_http import portal_engine
+from batch import parse_document_list, run_bounded
+from log_writer import log_writer
+from retention import retention
+from watchlist import watchlist
+from jobs import job_pool, job_view, new_job_id, webhook_target_error
+from rate_limit import upstream
+from resilience import resilience
+from debug_artifacts import debug_artifacts
+from profile_sources import run_sources, sse_event
+import config
+import metrics
 
 # Initialize DB
 init_db()
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Launch the shared browser once and reuse it across requests
+    await pool.start()
+    browser_watchdog.start()
+    retention.start()
+    watchlist.start()
+    job_pool.start(execute_job)
+    try:
+        yield
+    finally:
+        await job_pool.stop()
+        await watchlist.stop()
+        await retention.stop()
+        await http_engine.close()
+        await portal_engine.close()
+        await browser_watchdog.stop()
+        await pool.stop()
+        # Write out queued request logs before exiting
+        await asyncio.to_thread(log_writer.stop)
+
+
 app = FastAPI(
     title="TJSP Criminal Records API",
     description="API to check criminal records (antecedents) on TJSP by CPF/CNPJ.",
     version="1.0.0",
+    lifespan=lifespan,
 )
 
 
+@app.middleware("http")
+async def time_requests(request: Request, call_next):
+    started = time.perf_counter()
+    response = await call_next(request)
+    # Label by route template, not the raw URL, to keep label values bounded
+    route = request.scope.get("route")
+    metrics.REQUEST_SECONDS.observe(
+        time.perf_counter() - started,
+        method=request.method,
+        path=getattr(route, "path", "unmatched"),
+        status=str(response.status_code),
+    )
+    return response
+
+
+def pool_saturated(e: PoolSaturatedError) -> HTTPException:
+    """Maps browser pool backpressure to a 503 the client can retry."""
+    return HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
+
+
 def format_document(doc: str) -> str:
     """Formats a string of digits into CPF or CNPJ format."""
     clean = "".join(filter(str.isdigit, doc))
@@ -28,6 +116,24 @@ def format_document(doc: str) -> str:
 
 class SearchRequest(BaseModel):
     document: str
+    max_age: Optional[float] = None  # only accept cached results younger than this (seconds)
+    no_cache: bool = False  # always scrape; the fresh result still refreshes the cache
+    engine: Optional[Literal["http", "browser"]] = None  # search engine; defaults to config
+    max_processes: Optional[int] = Field(None, ge=1)  # per-degree cap; limits pagination
+    enrich: bool = False  # visit each listed process to fill in its details
+    enrich_budget: Optional[float] = Field(None, gt=0)  # seconds; defaults to config
+    timings: bool = False  # include a per-stage timing breakdown in the response
+    fields: Optional[list[Literal["name", "location"]]] = None  # Portal; "location" costs a page
+
+
+class JobRequest(SearchRequest):
+    kind: Literal["search", "person"] = "search"  # /search (TJSP) or /search-person (Portal)
+    webhook: Optional[str] = Field(None, pattern=r"^https?://")  # POSTed the finished job
+
+
+class ProfileRequest(SearchRequest):
+    deadline: Optional[float] = Field(None, gt=0)  # seconds; later sources are left "pending"
+    stream: bool = False  # Server-Sent Events, one per source as it finishes
 
 
 class Process(BaseModel):
@@ -44,68 +150,581 @@ class Process(BaseModel):
     movimentacoes: list[str] = []
 
 
+class Party(BaseModel):
+    role: str  # canonical role, e.g. "Réu" for both "Réu:" and "Ré:"
+    name: str
+
+
+class StageTiming(BaseModel):
+    stage: str
+    source: str
+    degree: str
+    seconds: float
+
+
 class SearchResponse(BaseModel):
     document: str
     records_count: int
     processes: list[Process] = []
     names: list[str] = []
+    parties: list[Party] = []
+    errors: list[str] = []  # degrees that failed after retries; the rest is still returned
     status: str
+    cached: bool = False
+    cached_at: Optional[str] = None
+    enrichment: Optional[Dict[str, int]] = None  # enriched/failed/pending counts
+    timings: Optional[list[StageTiming]] = None  # when requested; empty for cached results
 
 
-@app.get("/")
-def read_root():
-    return {"message": "Welcome to TJSP Criminal Records API. Use /search to check records."}
+class JobStatus(BaseModel):
+    id: str
+    kind: str
+    document: str
+    status: str  # "queued", "running", "done" or "failed"
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    result: Optional[Dict[str, Any]] = None  # the /search or /search-person body
+    error: Optional[str] = None
+    webhook_status: Optional[str] = None  # "delivered" or the last delivery error
 
 
-@app.get("/status")
-def get_status():
-    total = get_total_requests()
-    return {"status": "online", "total_requests_processed": total}
+class SourceOutcome(BaseModel):
+    source: str  # "portal", "tjsp_1" or "tjsp_2"
+    status: str  # "done", "failed" or "pending"
+    result: Optional[Dict[str, Any]] = None  # the /search-person or per-degree /search body
+    error: Optional[str] = None
+    seconds: Optional[float] = None  # since the profile request started
 
 
-@app.post("/search", response_model=SearchResponse)
-async def search_records(request: SearchRequest, background_tasks: BackgroundTasks):
-    document = request.document.strip()
+class ProfileResponse(BaseModel):
+    document: str
+    status: str  # "complete", or "partial" when a source failed or is pending
+    sources: Dict[str, SourceOutcome]
 
-    # Basic validation
-    if not document:
-        raise HTTPException(status_code=400, detail="Document is required")
 
-    # Perform search
-    result = await search_tjsp(document)
+class HistoryProcess(BaseModel):
+    number: str
+    degree: str
+
 
-    # Format document for response
-    formatted_doc = format_document(document)
+class HistoryEntry(BaseModel):
+    id: int
+    timestamp: datetime
+    document: str
+    status: str
+    records_count: int
+    processes: list[HistoryProcess] = []
+    names: list[str] = []
 
-    if "error" in result:
-        # Log failure
-        background_tasks.add_task(log_request, formatted_doc, "failed", 0, [], [])
-        raise HTTPException(status_code=500, detail=f"Search failed: {result['error']}")
 
-    count = result["count"]
-    processes = result.get("details", [])  # Scraper now returns dicts in 'details' key
-    names = result.get("names", [])
+class HistoryPage(BaseModel):
+    items: list[HistoryEntry]
+    next_cursor: Optional[str] = None  # pass as ?cursor= to get the next page
+
+
+class WatchRequest(BaseModel):
+    document: str
+    interval: Optional[float] = Field(None, gt=0)  # seconds; defaults to config
+
+
+class Watch(BaseModel):
+    document: str
+    added_at: Optional[datetime] = None
+    interval: Optional[float] = None
+    next_check_at: Optional[datetime] = None
+    last_checked_at: Optional[datetime] = None
+    last_error: Optional[str] = None
+    processes: int = 0  # in the last snapshot
+
+
+class WatchChangeEntry(BaseModel):
+    id: int
+    document: str
+    detected_at: datetime
+    kind: str  # "process_added", "process_removed" or "movement"
+    process: Optional[str] = None
+    payload: Dict[str, Any] = {}
+
+
+class WatchChangesPage(BaseModel):
+    items: list[WatchChangeEntry]
+    next_after: Optional[int] = None  # pass as ?after= to poll for newer changes
+
+
+async def cached_lookup(
+    cache: ResultCache, key: str, request: SearchRequest
+) -> Optional[CacheEntry]:
+    """Returns a usable cache entry unless the caller asked to bypass the cache."""
+    if request.no_cache:
+        return None
+    return await cache.get(key, max_age=request.max_age)
+
+
+def tjsp_key(formatted_doc: str, max_processes: Optional[int]) -> str:
+    """Cache/coalescing key: a capped search must not answer an uncapped one."""
+    return f"{formatted_doc}|max={max_processes}" if max_processes else formatted_doc
+
+
+async def fetch_tjsp(document: str, formatted_doc: str, request: SearchRequest) -> Dict[str, Any]:
+    """Scrapes TJSP, sharing one scrape among concurrent requests for the same document."""
+    key = tjsp_key(formatted_doc, request.max_processes)
+
+    async def scrape():
+        result = await search_tjsp(
+            document, engine=request.engine, max_processes=request.max_processes
+        )
+        await search_cache.set(key, result)
+        return result
+
+    return await search_flight.do(key, scrape)
+
+
+def person_keys(formatted_doc: str, request: SearchRequest) -> List[str]:
+    """
+    Cache/coalescing keys that can answer a Portal lookup, the one it is
+    stored under first: a full lookup also answers a name-only one.
+    """
+    if request.fields is None or "location" in request.fields:
+        return [formatted_doc]
+    return [f"{formatted_doc}|name", formatted_doc]
+
 
-    # Log success
-    background_tasks.add_task(log_request, formatted_doc, "success", count, processes, names)
+async def fetch_person(formatted_doc: str, request: SearchRequest) -> Dict[str, Any]:
+    """Scrapes the Portal, sharing one scrape among concurrent requests for the same document."""
+    key = person_keys(formatted_doc, request)[0]
 
+    async def scrape():
+        result = await search_portal_transparencia(
+            formatted_doc, fields=request.fields, engine=request.engine
+        )
+        await person_cache.set(key, result)
+        return result
+
+    return await person_flight.do(key, scrape)
+
+
+async def lookup_tjsp(
+    document: str, formatted_doc: str, request: SearchRequest
+) -> Tuple[Dict[str, Any], Optional[CacheEntry]]:
+    """Returns the TJSP result for a document, from the cache when allowed."""
+    key = tjsp_key(formatted_doc, request.max_processes)
+    entry = await cached_lookup(search_cache, key, request)
+    if entry is not None:
+        return entry.value, entry
+    return await fetch_tjsp(document, formatted_doc, request), None
+
+
+def search_payload(
+    formatted_doc: str, result: Dict[str, Any], entry: Optional[CacheEntry]
+) -> Dict[str, Any]:
+    """Builds the SearchResponse body for a successful TJSP result."""
     return {
         "document": formatted_doc,
-        "records_count": count,
-        "processes": processes,
-        "names": names,
+        "records_count": result["count"],
+        "processes": result.get("details", []),  # Scraper now returns dicts in 'details' key
+        "names": result.get("names", []),
+        "parties": result.get("parties", []),
+        "errors": result.get("errors", []),
         "status": "success",
+        "cached": entry is not None,
+        "cached_at": entry.cached_at if entry else None,
     }
 
+
+class SearchFailed(Exception):
+    """A lookup whose scrape returned an error."""
+
+
+async def tjsp_search(document: str, formatted_doc: str, request: SearchRequest) -> Dict[str, Any]:
+    """
+    Runs a /search lookup, with enrichment when asked, and logs its outcome.
+
+    Raises:
+        SearchFailed: If the scrape failed.
+        PoolSaturatedError: If no browser page could be had in time.
+    """
+    result, entry = await lookup_tjsp(document, formatted_doc, request)
+    if "error" in result:
+        log_writer.log(formatted_doc, "failed")
+        raise SearchFailed(result["error"])
+
+    payload = search_payload(formatted_doc, result, entry)
+    if request.enrich:
+        payload["processes"], payload["enrichment"] = await enrich_processes(
+            payload["processes"],
+            engine=request.engine,
+            budget=request.enrich_budget or config.ENRICH_TIME_BUDGET,
+        )
+
+    log_writer.log(
+        formatted_doc,
+        "success",
+        payload["records_count"],
+        payload["processes"],
+        payload["names"],
+    )
+    return payload
+
+
+async def person_search(formatted_doc: str, request: SearchRequest) -> Dict[str, Any]:
+    """
+    Runs a /search-person lookup.
+
+    Raises:
+        SearchFailed: If the scrape failed.
+        PoolSaturatedError: If no browser page could be had in time.
+    """
+    # Search Portal, unless a fresh enough result is cached
+    entry = None
+    for key in person_keys(formatted_doc, request):
+        entry = await cached_lookup(person_cache, key, request)
+        if entry is not None:
+            break
+    result = entry.value if entry is not None else await fetch_person(formatted_doc, request)
+    if "error" in result:
+        raise SearchFailed(result["error"])
+
     return {
         "document": formatted_doc,
-        "records_count": count,
-        "processes": processes,
-        "names": names,
-        "status": "success",
+        "data": result,
+        "cached": entry is not None,
+        "cached_at": entry.cached_at if entry else None,
     }
 
 
+# /profile sources for the TJSP degrees, and the eSAJ system each one searches
+PROFILE_DEGREES = {f"tjsp_{n}": system for n, system in enumerate(TJSP_DEGREES, 1)}
+
+
+async def tjsp_degree_search(
+    system: str, document: str, formatted_doc: str, request: SearchRequest
+) -> Dict[str, Any]:
+    """
+    Runs a lookup of one TJSP degree for /profile, cached and coalesced
+    separately from the two-degree /search lookups.
+
+    Raises:
+        SearchFailed: If the scrape failed.
+        PoolSaturatedError: If no browser page could be had in time.
+    """
+    key = f"{tjsp_key(formatted_doc, request.max_processes)}|{system}"
+    entry = await cached_lookup(search_cache, key, request)
+    if entry is not None:
+        result = entry.value
+    else:
+
+        async def scrape():
+            result = await search_tjsp_degree(
+                system, document, engine=request.engine, max_processes=request.max_processes
+            )
+            await search_cache.set(key, result)
+            return result
+
+        result = await search_flight.do(key, scrape)
+    if result.get("error"):
+        raise SearchFailed(result["error"])
+
+    payload = search_payload(formatted_doc, result, entry)
+    if request.enrich:
+        payload["processes"], payload["enrichment"] = await enrich_processes(
+            payload["processes"],
+            engine=request.engine,
+            budget=request.enrich_budget or config.ENRICH_TIME_BUDGET,
+        )
+    return payload
+
+
+def profile_sources(document: str, formatted_doc: str, request: ProfileRequest):
+    sources = {"portal": partial(person_search, formatted_doc, request)}
+    for name, system in PROFILE_DEGREES.items():
+        sources[name] = partial(tjsp_degree_search, system, document, formatted_doc, request)
+    return sources
+
+
+def profile_status(outcomes: Dict[str, Dict[str, Any]]) -> str:
+    return "complete" if all(o["status"] == "done" for o in outcomes.values()) else "partial"
+
+
+def log_profile(formatted_doc: str, outcomes: Dict[str, Dict[str, Any]]):
+    """Logs the TJSP part of a profile once both degrees have an answer."""
+    degrees = [outcomes[name] for name in PROFILE_DEGREES if name in outcomes]
+    if len(degrees) < len(PROFILE_DEGREES) or any(d["status"] == "pending" for d in degrees):
+        return
+    if any(d["status"] == "failed" for d in degrees):
+        log_writer.log(formatted_doc, "failed")
+        return
+    payloads = [d["result"] for d in degrees]
+    log_writer.log(
+        formatted_doc,
+        "success",
+        sum(p["records_count"] for p in payloads),
+        [process for p in payloads for process in p["processes"]],
+        list({name for p in payloads for name in p["names"]}),
+    )
+
+
+async def execute_job(job: Dict[str, Any]) -> Dict[str, Any]:
+    """Runs a POST /jobs job in a job worker; its result is the matching endpoint's body."""
+    request = SearchRequest(**job["options"])
+    if job["kind"] == "person":
+        return await person_search(job["document"], request)
+    return await tjsp_search(request.document.strip(), job["document"], request)
+
+
+async def read_batch_documents(request: Request) -> List[str]:
+    """Reads documents from a JSON body, a plain-text body or a multipart "file" upload."""
+    content_type = request.headers.get("content-type", "")
+    if content_type.startswith("multipart/form-data"):
+        form = await request.form()
+        upload = form.get("file")
+        if upload is None or isinstance(upload, str):
+            raise HTTPException(status_code=400, detail='Upload the documents as a "file" field')
+        body = await upload.read()
+        is_json = (upload.filename or "").endswith(".json") or "json" in (upload.content_type or "")
+    else:
+        body = await request.body()
+        is_json = "json" in content_type
+
+    try:
+        return parse_document_list(body.decode("utf-8-sig"), is_json)
+    except UnicodeDecodeError:
+        raise HTTPException(status_code=400, detail="The documents must be UTF-8 text")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@app.get("/")
+def read_root():
+    return {"message": "Welcome to TJSP Criminal Records API. Use /search to check records."}
+
+
+@app.get("/status")
+def get_status():
+    requests = get_request_stats(config.STATUS_HISTORY_DAYS)
+    return {
+        "status": "online",
+        "total_requests_processed": requests["total"],
+        "requests": requests,
+        "browser_pool": pool.stats(),
+        "browser_memory": browser_watchdog.stats(),
+        "resource_blocking": resource_blocker.stats(),
+        "cache": {"search": search_cache.stats(), "person": person_cache.stats()},
+        "coalescing": {"search": search_flight.stats(), "person": person_flight.stats()},
+        "search_engine": http_engine.stats(),
+        "portal_engine": portal_engine.stats(),
+        "process_details": process_store.stats(),
+        "request_log": log_writer.stats(),
+        "retention": retention.stats(),
+        "watchlist": watchlist.stats(),
+        # Only the active statuses: a range of the status index, however many jobs finished
+        "jobs": {**job_pool.stats(), "queue": count_jobs(ACTIVE_JOB_STATUSES)},
+        "upstream": upstream.stats(),
+        "resilience": resilience.stats(),
+        "debug_artifacts": debug_artifacts.stats(),
+    }
+
+
+def export_status_gauges():
+    """Mirrors the numeric /status counters of in-process components as gauges."""
+    components = {
+        "browser_pool": pool.stats(),
+        "browser_memory": browser_watchdog.stats(),
+        "cache_search": search_cache.stats(),
+        "cache_person": person_cache.stats(),
+        "coalescing_search": search_flight.stats(),
+        "coalescing_person": person_flight.stats(),
+        "search_engine": http_engine.stats(),
+        "portal_engine": portal_engine.stats(),
+        "request_log": log_writer.stats(),
+    }
+    for component, stats in components.items():
+        for field, value in stats.items():
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                metrics.APP_STATE.set(value, component=component, field=field)
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def get_metrics():
+    """Prometheus text exposition of stage latencies, scraper outcomes and API latency."""
+    export_status_gauges()
+    return PlainTextResponse(
+        metrics.registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
+
+
+def naive_utc(value: Optional[datetime]) -> Optional[datetime]:
+    """The log stores naive UTC timestamps; convert aware query values to match."""
+    if value is None or value.tzinfo is None:
+        return value
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+@app.get("/history", response_model=HistoryPage)
+def get_search_history(
+    document: Optional[str] = None,
+    status: Optional[Literal["success", "failed"]] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    process: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=500),
+):
+    """
+    Lists logged searches, newest first.
+
+    Filters combine: document (any format), status, a [since, until) UTC range
+    and a process number. Follow next_cursor for older entries.
+    """
+    try:
+        items, next_cursor = get_history(
+            document=format_document(document.strip()) if document else None,
+            status=status,
+            since=naive_utc(since),
+            until=naive_utc(until),
+            process=process,
+            cursor=cursor,
+            limit=limit,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"items": items, "next_cursor": next_cursor}
+
+
+def watch_payload(watch: Dict[str, Any]) -> Dict[str, Any]:
+    snapshot = watch.pop("snapshot", None) or {}
+    return {**watch, "processes": len(snapshot)}
+
+
+@app.post("/watchlist", response_model=Watch)
+def watch_document(request: WatchRequest):
+    """Adds a document to the watchlist; its first check records the baseline."""
+    document = request.document.strip()
+    if not document:
+        raise HTTPException(status_code=400, detail="Document is required")
+    watch = add_watch(format_document(document), request.interval, datetime.utcnow())
+    return watch_payload(watch)
+
+
+@app.get("/watchlist", response_model=List[Watch])
+def get_watchlist():
+    return [watch_payload(watch) for watch in list_watches()]
+
+
+@app.get("/watchlist/changes", response_model=WatchChangesPage)
+def get_watchlist_changes(
+    after: Optional[int] = Query(None, ge=0),
+    document: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=1000),
+):
+    """
+    Changes found by watchlist checks, oldest first.
+
+    Poll with ?after=<next_after> to receive only changes detected since.
+    """
+    items = get_watch_changes(
+        after=after,
+        document=format_document(document.strip()) if document else None,
+        limit=limit,
+    )
+    return {"items": items, "next_after": items[-1]["id"] if items else after}
+
+
+@app.delete("/watchlist/{document:path}")
+def unwatch_document(document: str):
+    if not remove_watch(format_document(document.strip())):
+        raise HTTPException(status_code=404, detail="Document is not on the watchlist")
+    return {"document": format_document(document.strip()), "removed": True}
+
+
+@app.post("/search", response_model=SearchResponse)
+async def search_records(request: SearchRequest):
+    document = request.document.strip()
+
+    # Basic validation
+    if not document:
+        raise HTTPException(status_code=400, detail="Document is required")
+
+    # Format document for response
+    formatted_doc = format_document(document)
+
+    with metrics.collect_timings() as timings:
+        # Perform search, unless a fresh enough result is cached
+        try:
+            payload = await tjsp_search(document, formatted_doc, request)
+        except PoolSaturatedError as e:
+            raise pool_saturated(e)
+        except SearchFailed as e:
+            raise HTTPException(status_code=500, detail=f"Search failed: {e}")
+
+    if request.timings:
+        payload["timings"] = timings
+
+    return payload
+
+
+@app.post("/search/batch")
+async def search_batch(
+    request: Request,
+    concurrency: int = config.BATCH_CONCURRENCY,
+    max_age: Optional[float] = None,
+    no_cache: bool = False,
+    engine: Optional[Literal["http", "browser"]] = None,
+    max_processes: Optional[int] = Query(None, ge=1),
+):
+    """
+    Searches many documents, streaming one NDJSON line per document as it finishes.
+
+    The body is JSON ({"documents": [...]} or a bare list), plain text with one
+    document per line, or a multipart upload with a "file" field in either format.
+    A failed document yields a "failed" line and does not stop the batch.
+    """
+    documents = await read_batch_documents(request)
+    if not documents:
+        raise HTTPException(status_code=400, detail="At least one document is required")
+    if len(documents) > config.BATCH_MAX_DOCUMENTS:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Batch too large (max {config.BATCH_MAX_DOCUMENTS} documents)",
+        )
+    concurrency = max(1, min(concurrency, config.BATCH_MAX_CONCURRENCY))
+
+    async def screen(document: str) -> Dict[str, Any]:
+        formatted_doc = format_document(document)
+        options = SearchRequest(
+            document=document,
+            max_age=max_age,
+            no_cache=no_cache,
+            engine=engine,
+            max_processes=max_processes,
+            enrich_budget=None,
+        )
+        try:
+            result, entry = await lookup_tjsp(document, formatted_doc, options)
+        except Exception as e:
+            result, entry = {"error": str(e)}, None
+
+        if "error" in result:
+            log_writer.log(formatted_doc, "failed")
+            return {"document": formatted_doc, "status": "failed", "error": result["error"]}
+
+        payload = search_payload(formatted_doc, result, entry)
+        log_writer.log(
+            formatted_doc,
+            "success",
+            payload["records_count"],
+            payload["processes"],
+            payload["names"],
+        )
+        return payload
+
+    async def stream():
+        async for item in run_bounded(documents, screen, concurrency):
+            yield json.dumps(item, ensure_ascii=False) + "\n"
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+
 @app.post("/search-person")
 async def search_person(request: SearchRequest):
     document = request.document.strip()
@@ -116,13 +735,89 @@ async def search_person(request: SearchRequest):
     # Format document
     formatted_doc = format_document(document)
 
-    # Search Portal
-    result = await search_portal_transparencia(formatted_doc)
+    try:
+        return await person_search(formatted_doc, request)
+    except PoolSaturatedError as e:
+        raise pool_saturated(e)
+    except SearchFailed as e:
+        raise HTTPException(status_code=500, detail=f"Search failed: {e}")
+
+
+@app.post("/profile", response_model=ProfileResponse)
+async def search_profile(request: ProfileRequest, http_request: Request):
+    """
+    Looks a document up in the Portal da Transparência (source "portal") and
+    in both TJSP degrees ("tjsp_1", "tjsp_2") concurrently.
+
+    With a deadline, sources still running by then are returned as "pending";
+    their scrapes still finish and are cached. With stream (or an
+    Accept: text/event-stream header), each source is sent as a "source"
+    event as soon as it is ready, followed by a "done" event.
+    """
+    document = request.document.strip()
+    if not document:
+        raise HTTPException(status_code=400, detail="Document is required")
+    formatted_doc = format_document(document)
+    sources = profile_sources(document, formatted_doc, request)
+
+    if request.stream or "text/event-stream" in http_request.headers.get("accept", ""):
+
+        async def events():
+            outcomes: Dict[str, Dict[str, Any]] = {}
+            async for outcome in run_sources(sources, request.deadline):
+                outcomes[outcome["source"]] = outcome
+                yield sse_event("source", outcome)
+            log_profile(formatted_doc, outcomes)
+            yield sse_event("done", {"document": formatted_doc, "status": profile_status(outcomes)})
+
+        return StreamingResponse(
+            events(),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
+
+    outcomes = {o["source"]: o async for o in run_sources(sources, request.deadline)}
+    log_profile(formatted_doc, outcomes)
+    return {
+        "document": formatted_doc,
+        "status": profile_status(outcomes),
+        "sources": {name: outcomes[name] for name in sources},
+    }
 
-    if "error" in result:
-        raise HTTPException(status_code=500, detail=f"Search failed: {result['error']}")
 
-    return {"document": formatted_doc, "data": result}
+@app.post("/jobs", response_model=JobStatus, status_code=202)
+def submit_job(request: JobRequest):
+    """
+    Queues a /search (kind "search") or /search-person (kind "person") lookup
+    and returns the job at once. Poll GET /jobs/{id}, or pass a webhook to be
+    sent the finished job.
+    """
+    document = request.document.strip()
+    if not document:
+        raise HTTPException(status_code=400, detail="Document is required")
+    if request.webhook:
+        webhook_error = webhook_target_error(request.webhook)
+        if webhook_error:
+            raise HTTPException(status_code=400, detail=webhook_error)
+    options = request.model_dump(exclude={"kind", "webhook"})
+    job = create_job(
+        new_job_id(), request.kind, format_document(document), options, request.webhook
+    )
+    return job_view(job)
+
+
+@app.get("/jobs")
+def get_job_counts():
+    """Number of jobs per status, finished ones included (until retention deletes them)."""
+    return {"jobs": count_jobs()}
+
+
+@app.get("/jobs/{job_id}", response_model=JobStatus)
+def get_job_status(job_id: str):
+    job = get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job_view(job)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,305 @@
+"""
+Latency histograms and counters in the Prometheus text format.
+
+Scraper stages are timed with `stage()`. Each timing goes into the
+scraper_stage_seconds histogram and, while a request collects a breakdown
+(`collect_timings()`), into that request's timing list as well. Source and
+degree labels come from `labels()`, set once per degree search, so pool and
+engine code can time stages without knowing which search they serve.
+"""
+
+import asyncio
+import math
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+# Scraper stages take from milliseconds (parsing) to a minute (page loads)
+DEFAULT_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        header = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        return "\n".join(header + self._samples())
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, /, **labels: str):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: str) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [
+            f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+            for key, value in items
+        ]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value: float, /, **labels: str):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        # labels -> (per-bucket counts, sum, count)
+        self._values: Dict[Tuple[str, ...], Tuple[List[int], float, int]] = {}
+
+    def observe(self, value: float, /, **labels: str):
+        key = self._key(labels)
+        with self._lock:
+            counts, total, count = self._values.get(key) or ([0] * len(self.buckets), 0.0, 0)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            self._values[key] = (counts, total + value, count + 1)
+
+    def count(self, **labels: str) -> int:
+        entry = self._values.get(self._key(labels))
+        return entry[2] if entry else 0
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = sorted((key, (list(c), s, n)) for key, (c, s, n) in self._values.items())
+        lines = []
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                le = _format_labels(self.labelnames, key, f'le="{_format_value(bound)}"')
+                lines.append(f"{self.name}_bucket{le} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        return "\n".join(metric.render() for metric in self._metrics) + "\n"
+
+
+registry = Registry()
+
+STAGE_SECONDS: Histogram = registry.register(  # type: ignore
+    Histogram(
+        "scraper_stage_seconds",
+        "Time spent in each scraper stage.",
+        ("stage", "source", "degree"),
+    )
+)
+TIMEOUTS: Counter = registry.register(  # type: ignore
+    Counter("scraper_timeouts_total", "Stages that timed out.", ("stage", "source", "degree"))
+)
+NO_RESULTS: Counter = registry.register(  # type: ignore
+    Counter("scraper_no_results_total", "Searches that found no records.", ("source", "degree"))
+)
+ERRORS: Counter = registry.register(  # type: ignore
+    Counter("scraper_errors_total", "Searches that failed.", ("source", "degree"))
+)
+REQUEST_SECONDS: Histogram = registry.register(  # type: ignore
+    Histogram(
+        "api_request_seconds",
+        "API request latency.",
+        ("method", "path", "status"),
+    )
+)
+APP_STATE: Gauge = registry.register(  # type: ignore
+    Gauge("app_state", "Numeric /status counters by component.", ("component", "field"))
+)
+
+UPSTREAM_LIMIT: Gauge = registry.register(  # type: ignore
+    Gauge("upstream_concurrency_limit", "Adaptive concurrency limit per upstream host.", ("host",))
+)
+UPSTREAM_IN_FLIGHT: Gauge = registry.register(  # type: ignore
+    Gauge("upstream_in_flight", "Requests in flight per upstream host.", ("host",))
+)
+UPSTREAM_RATE: Gauge = registry.register(  # type: ignore
+    Gauge("upstream_rate_limit", "Token bucket rate per upstream host, requests/s.", ("host",))
+)
+UPSTREAM_WAIT_SECONDS: Histogram = registry.register(  # type: ignore
+    Histogram(
+        "upstream_throttle_wait_seconds",
+        "Time requests waited for the upstream rate/concurrency limiter.",
+        ("host",),
+    )
+)
+UPSTREAM_BACKOFFS: Counter = registry.register(  # type: ignore
+    Counter(
+        "upstream_backoffs_total",
+        "Throttling signals per upstream host (timeout, throttled, blocked, errors).",
+        ("host", "reason"),
+    )
+)
+
+RETRIES: Counter = registry.register(  # type: ignore
+    Counter("scraper_retries_total", "Retried degree searches.", ("source", "degree"))
+)
+HEDGES: Counter = registry.register(  # type: ignore
+    Counter(
+        "scraper_hedges_total",
+        "Hedged duplicate attempts, by which attempt answered first.",
+        ("source", "degree", "winner"),
+    )
+)
+CIRCUIT_STATE: Gauge = registry.register(  # type: ignore
+    Gauge("circuit_state", "Circuit breaker state: 0 closed, 1 open, 2 half-open.", ("host",))
+)
+CIRCUIT_REJECTIONS: Counter = registry.register(  # type: ignore
+    Counter("circuit_rejections_total", "Attempts failed fast by an open circuit.", ("host",))
+)
+
+BROWSER_RSS: Gauge = registry.register(  # type: ignore
+    Gauge("browser_rss_bytes", "Resident memory of the pooled Chromium processes.")
+)
+BROWSER_RECYCLES: Counter = registry.register(  # type: ignore
+    Counter(
+        "browser_recycles_total",
+        "Pooled browsers retired, by reason (uses, memory, crashed).",
+        ("reason",),
+    )
+)
+BROWSER_ORPHANS_KILLED: Counter = registry.register(  # type: ignore
+    Counter("browser_orphans_killed_total", "Leftover Chromium processes killed.")
+)
+
+_labels: ContextVar[Dict[str, str]] = ContextVar("metric_labels", default={})
+_timings: ContextVar[Optional[List[Dict[str, object]]]] = ContextVar("timings", default=None)
+
+
+@contextmanager
+def labels(**values: str) -> Iterator[None]:
+    """Sets default source/degree labels for stages timed inside the block."""
+    token = _labels.set({**_labels.get(), **values})
+    try:
+        yield
+    finally:
+        _labels.reset(token)
+
+
+def current_labels() -> Dict[str, str]:
+    return {"source": "", "degree": "", **_labels.get()}
+
+
+def is_timeout(error: BaseException) -> bool:
+    # Playwright and httpx raise their own TimeoutError/TimeoutException classes
+    return (
+        isinstance(error, (asyncio.TimeoutError, TimeoutError)) or "Timeout" in type(error).__name__
+    )
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    """Times the block as one stage; an escaping timeout is also counted."""
+    started = time.perf_counter()
+    try:
+        yield
+    except BaseException as e:
+        if is_timeout(e):
+            count_timeout(name)
+        raise
+    finally:
+        observe_stage(name, time.perf_counter() - started)
+
+
+def observe_stage(name: str, seconds: float):
+    """Records a stage timed by the caller (see stage())."""
+    stage_labels = current_labels()
+    STAGE_SECONDS.observe(seconds, stage=name, **stage_labels)
+    timings = _timings.get()
+    if timings is not None:
+        timings.append({"stage": name, **stage_labels, "seconds": round(seconds, 4)})
+
+
+def count_timeout(stage_name: str):
+    TIMEOUTS.inc(stage=stage_name, **current_labels())
+
+
+def count_no_results():
+    NO_RESULTS.inc(**current_labels())
+
+
+def count_error():
+    ERRORS.inc(**current_labels())
+
+
+@contextmanager
+def collect_timings() -> Iterator[List[Dict[str, object]]]:
+    """
+    Collects the stages timed inside the block, including those of tasks it
+    starts. Stages of a lookup shared with an earlier request (singleflight)
+    are recorded by that request only.
+    """
+    timings: List[Dict[str, object]] = []
+    token = _timings.set(timings)
+    try:
+        yield timings
+    finally:
+        _timings.reset(token)
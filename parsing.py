@@ -0,0 +1,276 @@
+"""
+Text cleaning rules shared by the browser and HTTP search engines.
+"""
+
+import math
+import re
+from typing import Any, Dict, Iterable, List, Optional, Set
+from urllib.parse import parse_qsl, urlencode, urljoin, urlsplit, urlunsplit
+
+from party_names import Party, extractor
+
+NO_RESULTS_MARKERS = (
+    "Não existem processos",
+    "Nenhum processo foi encontrado",
+    "Não existem informações disponíveis para os parâmetros informados",
+)
+
+# Signs of a captcha or block page, checked (lowercased) on pages that are not results
+BLOCK_MARKERS = (
+    "captcha",
+    "acesso bloqueado",
+    "acesso negado",
+    "too many requests",
+    "request rejected",
+)
+
+# Maximum number of movements kept per process
+MAX_MOVEMENTS = 5
+
+# Result rows on the eSAJ list page
+RESULT_ROW_SELECTOR = "div.processoDetalhes, tr.fundoClaro, tr.fundoEscuro"
+
+# Pagination of the eSAJ list page
+TOTAL_COUNT_SELECTOR = "span#contadorDeProcessos"
+PAGE_PARAM = "paginaConsulta"
+PAGE_LINK_SELECTOR = f'a[href*="{PAGE_PARAM}="]'
+
+# Process detail page fields and where to find them
+DETAIL_SELECTORS = {
+    "classe": "span#classeProcesso",
+    "area": "div#areaProcesso",
+    "assunto": "span#assuntoProcesso",
+    "data_distribuicao": "div#dataHoraDistribuicaoProcesso",
+    "juiz": "span#juizProcesso",
+    "valor_acao": "div#valorAcaoProcesso",
+}
+
+
+def has_no_results(content: str) -> bool:
+    """Checks for eSAJ's "no results" messages."""
+    return any(marker in content for marker in NO_RESULTS_MARKERS)
+
+
+def is_blocked(content: str) -> bool:
+    """Checks an unrecognised page for captcha or block messages."""
+    content = content.lower()
+    return any(marker in content for marker in BLOCK_MARKERS)
+
+
+def portal_name(link_text: str) -> Optional[str]:
+    """
+    Name in a Portal da Transparência result link, e.g.
+    "Pessoa Física: ***.104.236-** - FULANO DE TAL".
+    """
+    # Split at the last " - " so hyphenated names stay whole
+    separator = " - " if " - " in link_text else "-"
+    if separator not in link_text:
+        return None
+    return link_text.rsplit(separator, 1)[-1].strip() or None
+
+
+def portal_location(page_text: str) -> Optional[str]:
+    """
+    The "Localidade" of a Portal da Transparência person page, from its text.
+    The browser puts the value on the next line (the label is styled as a
+    block); html_tree, which has no CSS, keeps it on the same line.
+    """
+    match = re.search(r"Localidade\s+(.+)", page_text)
+    return match.group(1).strip() if match else None
+
+
+def parties_from_partes(partes: Iterable[str]) -> List[Party]:
+    """Splits detail-page party strings like "Reqte: Name" into (role, name)."""
+    found: List[Party] = []
+    for parte in partes:
+        label, sep, name = parte.partition(":")
+        name = name.strip()
+        if sep and name:
+            party = Party(extractor.canonical_role(label), name)
+            if party not in found:
+                found.append(party)
+    return found
+
+
+def names_from_partes(partes: Iterable[str]) -> Set[str]:
+    """Pulls names out of detail-page party strings like "Reqte: Name"."""
+    return {party.name for party in parties_from_partes(partes)}
+
+
+def party_dicts(parties: Iterable[Party]) -> List[Dict[str, str]]:
+    """JSON form of parties, as returned in the "parties" key of results."""
+    return [party._asdict() for party in parties]
+
+
+def clean_party(type_text: str, name_text: str) -> str:
+    """Formats one row of the parties table."""
+    return f"{type_text.strip()} {extractor.clean_name(name_text)}"
+
+
+def clean_movement(date: str, desc_raw: str) -> str:
+    """Formats one row of the movements table."""
+    # Replace multiple newlines/tabs with a single newline
+    desc_clean = re.sub(r"\n\s*", "\n", desc_raw.strip())
+    # Remove multiple spaces
+    desc_clean = re.sub(r" +", " ", desc_clean)
+    return f"{date.strip()} - {desc_clean}"
+
+
+def build_details(
+    fields: Dict[str, Optional[str]],
+    party_rows: List[List[str]],
+    movement_rows: List[List[str]],
+) -> Dict[str, Any]:
+    """
+    Applies the cleaning rules to raw text pulled from a process detail page.
+
+    Args:
+        fields: Raw text per DETAIL_SELECTORS key, None when the element is missing.
+        party_rows: Cell texts of each row of the parties table.
+        movement_rows: Cell texts of each row of the movements table.
+    """
+    details: Dict[str, Any] = {}
+    for key in DETAIL_SELECTORS:
+        value = fields.get(key)
+        details[key] = value.strip() if value is not None else None
+
+    # Usually 2 columns: Type (Reqte/Reqdo) and Name
+    details["partes"] = [clean_party(row[0], row[1]) for row in party_rows if len(row) >= 2]
+    details["movimentacoes"] = [
+        clean_movement(row[0], row[2]) for row in movement_rows[:MAX_MOVEMENTS] if len(row) >= 3
+    ]
+    return details
+
+
+def build_list_result(
+    rows: List[Dict[str, Any]],
+    links: List[Dict[str, Optional[str]]],
+    degree_name: str,
+    page_url: str,
+) -> Dict[str, Any]:
+    """
+    Turns the raw rows of an eSAJ result list into {count, details, names, parties}.
+
+    Args:
+        rows: One {"link": {"number", "href"} or None, "text"} per result row.
+        links: Every a.linkProcesso on the page as {"number", "href"}.
+        degree_name: Label used in the results ("1º Grau", "2º Grau").
+        page_url: URL of the list page, used to resolve relative links.
+    """
+
+    def process(link: Dict[str, Optional[str]]) -> Dict[str, str]:
+        href = link.get("href")
+        return {
+            "number": (link.get("number") or "").strip(),
+            "degree": degree_name,
+            "link": urljoin(page_url, href) if href else "",
+        }
+
+    details = []
+    parties: List[Party] = []
+    if rows:
+        count = len(rows)
+        for row in rows:
+            if row.get("link"):
+                details.append(process(row["link"]))
+            parties.extend(extractor.parties(row.get("text") or ""))
+    else:
+        # Fallback to counting links
+        count = len(links)
+        details = [process(link) for link in links]
+
+    # Rows were found but none had a link: trust the links instead
+    if not details and links:
+        count = len(links)
+        details = [process(link) for link in links]
+
+    return {
+        "count": count,
+        "details": details,
+        "names": list({party.name for party in parties}),
+        "parties": party_dicts(dict.fromkeys(parties)),
+    }
+
+
+def parse_total(text: Optional[str]) -> Optional[int]:
+    """Reads the process count from the list header ("1.234 Processos encontrados")."""
+    match = re.search(r"\d[\d.]*", text or "")
+    return int(match.group(0).replace(".", "")) if match else None
+
+
+def with_page(url: str, page_number: int) -> str:
+    """Returns url with its paginaConsulta parameter set to page_number."""
+    parts = urlsplit(url)
+    query = [(k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True) if k != PAGE_PARAM]
+    query.append((PAGE_PARAM, str(page_number)))
+    return urlunsplit(parts._replace(query=urlencode(query)))
+
+
+def remaining_page_urls(
+    page_url: str,
+    page_hrefs: List[str],
+    rows_on_page: int,
+    total: Optional[int],
+    max_processes: Optional[int],
+    max_pages: int,
+) -> List[str]:
+    """
+    URLs of the result pages after the first one that are worth fetching.
+
+    The last page comes from the total count when the header shows it, or
+    from the highest page link otherwise, and is capped by max_processes and
+    max_pages.
+    """
+    if not page_hrefs or rows_on_page <= 0:
+        return []
+
+    page_numbers = []
+    for href in page_hrefs:
+        value = dict(parse_qsl(urlsplit(href).query)).get(PAGE_PARAM, "")
+        if value.isdigit():
+            page_numbers.append(int(value))
+
+    last_page = math.ceil(total / rows_on_page) if total else max(page_numbers, default=1)
+    if max_processes:
+        last_page = min(last_page, math.ceil(max_processes / rows_on_page))
+    last_page = min(last_page, max_pages)
+
+    template = urljoin(page_url, page_hrefs[0])
+    return [with_page(template, n) for n in range(2, last_page + 1)]
+
+
+def finish_list_result(
+    result: Dict[str, Any], total: Optional[int], max_processes: Optional[int]
+) -> Dict[str, Any]:
+    """Reports the header's total count and trims details to max_processes."""
+    if total:
+        result["count"] = max(result["count"], total)
+    if max_processes:
+        result["details"] = result["details"][:max_processes]
+    return result
+
+
+def build_paged_result(
+    snapshots: List[Dict[str, Any]],
+    degree_name: str,
+    page_url: str,
+    max_processes: Optional[int] = None,
+    skipped_pages: int = 0,
+) -> Dict[str, Any]:
+    """
+    Merges the snapshots of every fetched list page into one result.
+
+    Each snapshot has "rows" and "links" (see build_list_result) and the first
+    one may carry the raw "total" text of the list header. When skipped_pages
+    result pages could not be read, the result lists fewer processes than the
+    search found and says so in its "errors".
+    """
+    rows = [row for snapshot in snapshots for row in snapshot["rows"]]
+    links = [link for snapshot in snapshots for link in snapshot["links"]]
+    result = build_list_result(rows, links, degree_name, page_url)
+    if skipped_pages:
+        pages = len(snapshots) + skipped_pages
+        result["errors"] = [
+            f"{degree_name}: {skipped_pages} of {pages} result pages could not be read"
+        ]
+    return finish_list_result(result, parse_total(snapshots[0].get("total")), max_processes)
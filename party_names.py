@@ -0,0 +1,112 @@
+"""
+Single-pass extraction of party names and roles from eSAJ text.
+
+Result rows list parties as "Réu: FULANO DE TAL" (sometimes several per
+line, sometimes followed by "Advogado: ..."). All labels are compiled into
+one alternation regex and each name is the text between its label and the
+next label or line break, so a row is scanned once instead of once per label.
+"""
+
+import re
+from typing import Dict, Iterable, List, Mapping, NamedTuple, Set
+
+import config
+
+# Label as printed by eSAJ -> role reported to callers
+DEFAULT_ROLES: Dict[str, str] = {
+    "Reqte": "Requerente",
+    "Reqdo": "Requerido",
+    "Autor": "Autor",
+    "Autora": "Autor",
+    "Réu": "Réu",
+    "Ré": "Réu",
+    "Exectdo": "Executado",
+    "Exeqte": "Exequente",
+    "Exequente": "Exequente",
+    "Agravante": "Agravante",
+    "Agravado": "Agravado",
+    "Averiguado": "Averiguado",
+    "Indiciado": "Indiciado",
+    "Requerente": "Requerente",
+    "Requerido": "Requerido",
+    "Impetrante": "Impetrante",
+    "Impetrado": "Impetrado",
+    "Interessado": "Interessado",
+    "Embargante": "Embargante",
+    "Embargado": "Embargado",
+    "Apelante": "Apelante",
+    "Apelado": "Apelado",
+}
+
+# Labels that end a name without being a party themselves
+STOP_LABELS = ("Advogado", "Advogada", "Advogados")
+
+
+class Party(NamedTuple):
+    role: str
+    name: str
+
+
+def _label_pattern(labels: Iterable[str]) -> str:
+    # Longest first, so "Ré" never shadows "Réu"
+    return "|".join(re.escape(label) for label in sorted(labels, key=len, reverse=True))
+
+
+class PartyNameExtractor:
+    """
+    Finds (role, name) pairs using one precompiled regex built from a role table.
+    """
+
+    def __init__(self, roles: Mapping[str, str] = DEFAULT_ROLES):
+        self.roles = {label.lower(): role for label, role in roles.items()}
+        # Stop labels are matched too: they end the preceding name. The lookahead
+        # rejects anything that is not a whole "word:" before trying the alternation.
+        labels = _label_pattern(list(roles) + list(STOP_LABELS))
+        self._pattern = re.compile(rf"\b(?=\w+[ \t]*:)({labels})[ \t]*:", re.IGNORECASE)
+        self._stop = re.compile(
+            rf"\b(?:{_label_pattern(STOP_LABELS)})[ \t]*:.*", re.IGNORECASE | re.DOTALL
+        )
+
+    def canonical_role(self, label: str) -> str:
+        """Maps a label ("Reqte:", "réu") to its role, or returns it cleaned up."""
+        label = label.strip().rstrip(":").strip()
+        return self.roles.get(label.lower(), label)
+
+    def clean_name(self, name: str) -> str:
+        """Joins wrapped lines and drops a trailing "Advogado: ..." part."""
+        return self._stop.sub("", " ".join(name.split())).strip()
+
+    def parties(self, text: str) -> List[Party]:
+        """All parties in text, in order of appearance, without duplicates."""
+        found: List[Party] = []
+        seen: Set[Party] = set()
+        matches = list(self._pattern.finditer(text))
+        for match, following in zip(matches, matches[1:] + [None]):
+            role = self.roles.get(match.group(1).lower())
+            if role is None:  # a stop label such as "Advogado:"
+                continue
+            end = following.start() if following else len(text)
+            name = text[match.end() : end].split("\n", 1)[0].strip()
+            if not name:
+                continue
+            party = Party(role, name)
+            if party not in seen:
+                seen.add(party)
+                found.append(party)
+        return found
+
+    def names(self, text: str) -> Set[str]:
+        return {party.name for party in self.parties(text)}
+
+
+def build_roles(extra: Iterable[str] = ()) -> Dict[str, str]:
+    """DEFAULT_ROLES plus extra "Label" or "Label=Role" entries."""
+    roles = dict(DEFAULT_ROLES)
+    for entry in extra:
+        label, _, role = entry.partition("=")
+        if label.strip():
+            roles[label.strip()] = role.strip() or label.strip()
+    return roles
+
+
+extractor = PartyNameExtractor(build_roles(config.PARTY_ROLES))
@@ -0,0 +1,142 @@
+"""
+HTTP-only Portal da Transparência person lookup.
+
+The Portal's search page is a form in front of /busca/resultado, which
+returns the result list as plain HTML, and a person's page is plain HTML
+too. A lookup is therefore one GET, plus one for the location, on pooled
+keep-alive connections instead of a browser session. Pages whose markup is
+not recognised raise UnexpectedMarkupError so the caller can fall back to
+Playwright.
+"""
+
+import logging
+from typing import Any, Dict, Optional
+from urllib.parse import urljoin
+
+import httpx
+
+import config
+import metrics
+from esaj_http import UnexpectedMarkupError, limited_get, pooled_client
+from html_tree import parse_html
+from parsing import is_blocked, portal_location, portal_name
+from rate_limit import upstream
+
+logger = logging.getLogger(__name__)
+
+RESULT_ITEM_CLASS = "busca-portal-block-searchs__item"
+
+
+def read_results_page(html: str) -> Optional[Dict[str, Optional[str]]]:
+    """
+    The first result of a /busca/resultado page, as its link "text" and
+    "href", or None when nothing was found.
+
+    Raises:
+        UnexpectedMarkupError: If the page has no result list.
+    """
+    tree = parse_html(html)
+    results = tree.find("ul", id="resultados")
+    if results is None:
+        raise UnexpectedMarkupError("No result list in the Portal search page")
+    for item in results.find_all(cls=RESULT_ITEM_CLASS):
+        link = item.find("a")
+        if link is not None:
+            return {"text": link.text(), "href": link.get("href")}
+    return None
+
+
+class PortalHttpEngine:
+    """
+    Pooled keep-alive client that runs Portal da Transparência lookups over plain HTTP.
+    """
+
+    def __init__(
+        self,
+        base_url: str = config.PORTAL_BASE_URL,
+        client: Optional[httpx.AsyncClient] = None,
+        timeout: float = config.HTTP_TIMEOUT,
+        max_connections: int = config.HTTP_MAX_CONNECTIONS,
+    ):
+        self.base_url = base_url
+        self.timeout = timeout
+        self.max_connections = max_connections
+        self._client = client
+        self.lookups = 0
+        self.fallbacks = 0
+
+    def _get_client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = pooled_client(self.timeout, self.max_connections)
+        return self._client
+
+    async def _fetch(self, client: httpx.AsyncClient, url: str, **kwargs: Any) -> httpx.Response:
+        with metrics.stage("http_fetch"):
+            response = await limited_get(client, url, **kwargs)
+        if response.status_code != 200:
+            raise UnexpectedMarkupError(f"Portal answered HTTP {response.status_code} for {url}")
+        return response
+
+    async def search(self, document: str, location: bool = True) -> Dict[str, Any]:
+        """
+        HTTP counterpart of scraper._search_portal.
+
+        Args:
+            document: CPF in any format.
+            location: Also fetch the person's page for the "Localidade".
+
+        Raises:
+            UnexpectedMarkupError: If a page cannot be parsed; fall back to the browser.
+        """
+        clean_document = "".join(filter(str.isdigit, document))
+        logger.info(f"Querying Portal da Transparência over HTTP for document: {clean_document}")
+        self.lookups += 1
+        client = self._get_client()
+        search_url = f"{self.base_url}/busca/resultado"
+        try:
+            response = await self._fetch(
+                client, search_url, params={"termo": clean_document, "pagina": "1"}
+            )
+            with metrics.stage("list_parse"):
+                try:
+                    item = read_results_page(response.text)
+                except UnexpectedMarkupError:
+                    if is_blocked(response.text):
+                        upstream.backoff(search_url, "blocked")
+                    raise
+            if item is None:
+                logger.info("No results found on Portal da Transparência.")
+                metrics.count_no_results()
+                return {"found": False, "name": None, "location": None}
+
+            found_location = None
+            if location and item["href"]:
+                detail = await self._fetch(client, urljoin(str(response.url), item["href"]))
+                with metrics.stage("detail_extraction"):
+                    found_location = portal_location(parse_html(detail.text).text())
+        except httpx.HTTPError as e:
+            logger.error(f"Error querying Portal da Transparência over HTTP: {e!r}")
+            metrics.count_error()
+            return {"error": str(e) or repr(e)}
+
+        return {
+            "found": True,
+            "name": portal_name(item["text"] or ""),
+            "location": found_location,
+            "source": "Portal da Transparência",
+        }
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "default": config.PORTAL_ENGINE,
+            "lookups": self.lookups,
+            "fallbacks": self.fallbacks,
+        }
+
+
+portal_engine = PortalHttpEngine()
@@ -0,0 +1,80 @@
+"""
+Process-level store of extracted details, keyed by CNJ number.
+
+The same process shows up in searches for many documents (e.g. a criminal
+action with several defendants); its details are extracted once and reused
+until they are older than PROCESS_DETAILS_MAX_AGE.
+"""
+
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional
+
+import config
+from database import get_process_details, save_process_details
+
+logger = logging.getLogger(__name__)
+
+# Keys of extract_details_from_page output; anything else is not stored
+DETAIL_KEYS = (
+    "classe",
+    "area",
+    "assunto",
+    "data_distribuicao",
+    "juiz",
+    "valor_acao",
+    "partes",
+    "movimentacoes",
+)
+
+
+def process_key(number: str) -> str:
+    """Normalizes a CNJ number ("1500000-00.2023.8.26.0050") to its digits."""
+    return "".join(filter(str.isdigit, number or ""))
+
+
+class ProcessStore:
+    """
+    Reads and writes process details, treating old entries as missing.
+    """
+
+    def __init__(self, max_age: float = config.PROCESS_DETAILS_MAX_AGE):
+        self.max_age = max_age
+        self.hits = 0
+        self.misses = 0
+
+    async def get(self, number: str, max_age: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """Returns details for a process fetched within max_age seconds, or None."""
+        max_age = self.max_age if max_age is None else max_age
+        key = process_key(number)
+        if not key or max_age <= 0:
+            return None
+        try:
+            stored = await asyncio.to_thread(get_process_details, key)
+        except Exception as e:
+            logger.warning(f"Could not read stored details of {number}: {e}")
+            stored = None
+        if stored is not None:
+            details, fetched_at = stored
+            if datetime.utcnow() - fetched_at <= timedelta(seconds=max_age):
+                self.hits += 1
+                return details
+        self.misses += 1
+        return None
+
+    async def save(self, number: str, details: Dict[str, Any]):
+        key = process_key(number)
+        if not key:
+            return
+        values = {k: details.get(k) for k in DETAIL_KEYS}
+        try:
+            await asyncio.to_thread(save_process_details, key, values)
+        except Exception as e:
+            logger.warning(f"Could not store details of {number}: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        return {"max_age": self.max_age, "hits": self.hits, "misses": self.misses}
+
+
+process_store = ProcessStore()
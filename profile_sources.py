@@ -0,0 +1,60 @@
+"""
+Concurrent lookups of one document in several sources (POST /profile).
+
+run_sources starts every source at once and yields each one's outcome as
+soon as it finishes. At the deadline the sources still running are yielded
+as "pending" and cancelled; the scrapes behind them are shared through
+singleflight and shielded, so they still finish and fill the caches for the
+next request.
+"""
+
+import asyncio
+import json
+import time
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Optional
+
+Source = Callable[[], Awaitable[Dict[str, Any]]]
+
+
+def _outcome(name: str, task: "asyncio.Task[Dict[str, Any]]", seconds: float) -> Dict[str, Any]:
+    error = task.exception()
+    if error is not None:
+        return {"source": name, "status": "failed", "error": str(error) or repr(error)}
+    return {"source": name, "status": "done", "result": task.result(), "seconds": round(seconds, 3)}
+
+
+async def run_sources(
+    sources: Dict[str, Source], deadline: Optional[float] = None
+) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Runs all sources concurrently, yielding their outcomes in finishing order.
+
+    Each outcome has "source" and "status": "done" with the "result" and its
+    "seconds", "failed" with the "error" a source raised, or "pending" for a
+    source still running after deadline seconds (None waits for all).
+    """
+    started = time.monotonic()
+    names = {asyncio.ensure_future(source()): name for name, source in sources.items()}
+    pending = set(names)
+    try:
+        while pending:
+            timeout = None if deadline is None else deadline - (time.monotonic() - started)
+            if timeout is not None and timeout <= 0:
+                break
+            done, pending = await asyncio.wait(
+                pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED
+            )
+            for task in done:
+                yield _outcome(names[task], task, time.monotonic() - started)
+        for task in pending:
+            yield {"source": names[task], "status": "pending"}
+    finally:
+        # Late sources, or all of them if the client went away
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+
+
+def sse_event(event: str, data: Any) -> str:
+    """One Server-Sent Events message with a JSON payload."""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
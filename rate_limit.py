@@ -0,0 +1,326 @@
+"""
+Adaptive per-host rate limiting for the scraped sites.
+
+Each upstream host (eSAJ, Portal da Transparência) gets a token bucket, which
+caps the request rate, and an AIMD concurrency limit. The limit grows by
+about one per round of healthy responses (no errors, latency under target)
+and is cut by UPSTREAM_BACKOFF on a timeout, a 429/503 or a captcha/block
+page. Cuts are at most one per cooldown, so the burst of failures that one
+overload causes is counted once. A Retry-After also pauses the host.
+
+The configured rates, bursts and max concurrencies are totals for the whole
+deployment: each of the UPSTREAM_PROCESSES processes (the API and the job
+workers) gets an equal share and adapts within it on its own.
+"""
+
+import asyncio
+import collections
+import logging
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Deque, Dict, Optional
+from urllib.parse import urlsplit
+
+import config
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# Weight of the latest response in the error rate (exponential moving average)
+ERROR_RATE_ALPHA = 0.1
+# Error rate above which the limit stops growing and errors count as backoffs
+ERROR_RATE_THRESHOLD = 0.2
+
+# Answers that mean "slow down" rather than "failed"
+THROTTLE_STATUSES = {429, 503}
+
+
+def retry_after(value: Optional[str]) -> Optional[float]:
+    """Seconds of a Retry-After header; HTTP dates are ignored."""
+    try:
+        return max(0.0, float(value)) if value else None
+    except ValueError:
+        return None
+
+
+def process_share(processes: int, rate: float, burst: int, max_concurrency: int) -> Dict[str, Any]:
+    """One process's part of host limits configured as totals across `processes`."""
+    processes = max(1, processes)
+    return {
+        "rate": rate / processes,
+        "burst": max(1, burst // processes),
+        "max_concurrency": max(1, max_concurrency // processes),
+    }
+
+
+class TokenBucket:
+    """
+    Allows `rate` requests per second with bursts of up to `burst`.
+
+    Tokens are reserved ahead: a request that finds the bucket empty takes a
+    future token and waits until it is due, so waiters are served in order.
+    """
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.capacity = max(1, burst)
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+
+    def reserve(self) -> float:
+        """Takes one token. Returns how long to wait before using it."""
+        if self.rate <= 0:
+            return 0.0
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+        self._tokens -= 1
+        return max(0.0, -self._tokens / self.rate)
+
+
+class Permit:
+    """Outcome of one limited request, set by the caller inside the slot."""
+
+    def __init__(self):
+        self.outcome = "ok"
+        self.retry_after: Optional[float] = None
+
+    def throttled(self, retry_after: Optional[float] = None, reason: str = "throttled"):
+        """The site asked us to slow down (429/503, captcha or block page)."""
+        self.outcome = reason
+        self.retry_after = retry_after
+
+    def failed(self):
+        """The request failed for another reason (e.g. a 5xx)."""
+        self.outcome = "error"
+
+
+class HostLimiter:
+    """
+    Token bucket plus AIMD concurrency limit for one host.
+    """
+
+    def __init__(
+        self,
+        host: str,
+        rate: float,
+        burst: int,
+        max_concurrency: int,
+        initial_concurrency: int = config.UPSTREAM_INITIAL_CONCURRENCY,
+        min_concurrency: int = config.UPSTREAM_MIN_CONCURRENCY,
+        latency_target: float = config.UPSTREAM_LATENCY_TARGET,
+        backoff: float = config.UPSTREAM_BACKOFF,
+        cooldown: float = config.UPSTREAM_COOLDOWN,
+        max_pause: float = config.UPSTREAM_MAX_PAUSE,
+    ):
+        self.host = host
+        self.min_concurrency = max(1, min_concurrency)
+        self.max_concurrency = max(self.min_concurrency, max_concurrency)
+        self.limit = float(
+            min(max(initial_concurrency, self.min_concurrency), self.max_concurrency)
+        )
+        self.latency_target = latency_target
+        self.backoff_factor = backoff
+        self.cooldown = cooldown
+        self.max_pause = max_pause
+        self.bucket = TokenBucket(rate, burst)
+        self.in_flight = 0
+        self.error_rate = 0.0
+        self.paused_until = 0.0
+        self._last_cut = float("-inf")
+        # Plain futures rather than an asyncio.Condition, which would bind to one loop
+        self._waiters: Deque[asyncio.Future] = collections.deque()
+        self.requests = 0
+        self.backoffs = 0
+        self.waited = 0.0
+        metrics.UPSTREAM_RATE.set(rate, host=host)
+        self._export()
+
+    def _export(self):
+        metrics.UPSTREAM_LIMIT.set(int(self.limit), host=self.host)
+        metrics.UPSTREAM_IN_FLIGHT.set(self.in_flight, host=self.host)
+
+    def _wake(self):
+        free = int(self.limit) - self.in_flight
+        while free > 0 and self._waiters:
+            waiter = self._waiters.popleft()
+            if waiter.done() or waiter.get_loop().is_closed():
+                continue
+            waiter.set_result(None)
+            free -= 1
+
+    async def acquire(self) -> float:
+        """
+        Waits for a concurrency slot and a token.
+
+        Returns:
+            The seconds spent waiting.
+        """
+        started = time.monotonic()
+        while True:
+            pause = self.paused_until - time.monotonic()
+            if pause > 0:
+                await asyncio.sleep(pause)
+            elif self.in_flight < int(self.limit):
+                break
+            else:
+                waiter = asyncio.get_running_loop().create_future()
+                self._waiters.append(waiter)
+                try:
+                    await waiter
+                except asyncio.CancelledError:
+                    if waiter in self._waiters:
+                        self._waiters.remove(waiter)
+                    else:
+                        # Woken and cancelled at once: pass the wakeup on
+                        self._wake()
+                    raise
+        self.in_flight += 1
+        self._export()
+        delay = self.bucket.reserve()
+        if delay:
+            try:
+                await asyncio.sleep(delay)
+            except asyncio.CancelledError:
+                self.in_flight -= 1
+                self._export()
+                self._wake()
+                raise
+        waited = time.monotonic() - started
+        self.requests += 1
+        self.waited += waited
+        metrics.UPSTREAM_WAIT_SECONDS.observe(waited, host=self.host)
+        return waited
+
+    def backoff(self, reason: str, pause: Optional[float] = None):
+        """Cuts the limit (at most once per cooldown) and optionally pauses the host."""
+        now = time.monotonic()
+        self.backoffs += 1
+        metrics.UPSTREAM_BACKOFFS.inc(host=self.host, reason=reason)
+        if pause:
+            self.paused_until = max(self.paused_until, now + min(pause, self.max_pause))
+        if now - self._last_cut < self.cooldown:
+            return
+        self._last_cut = now
+        previous = int(self.limit)
+        self.limit = max(self.min_concurrency, self.limit * self.backoff_factor)
+        self._export()
+        logger.warning(
+            f"Backing off {self.host} ({reason}): concurrency {previous} -> {int(self.limit)}"
+        )
+
+    def release(self, latency: float, outcome: str = "ok", pause: Optional[float] = None):
+        """Returns a slot and adapts the limit to how the request went."""
+        self.in_flight -= 1
+        if outcome != "cancelled":
+            failed = outcome != "ok"
+            self.error_rate += ERROR_RATE_ALPHA * (failed - self.error_rate)
+            if outcome in ("timeout", "throttled", "blocked"):
+                self.backoff(outcome, pause)
+            elif outcome == "error" and self.error_rate > ERROR_RATE_THRESHOLD:
+                self.backoff("errors")
+            elif (
+                not failed
+                and latency <= self.latency_target
+                and self.error_rate <= ERROR_RATE_THRESHOLD
+            ):
+                # Additive increase: about +1 once every request of a full window succeeded
+                self.limit = min(self.max_concurrency, self.limit + 1 / self.limit)
+        self._export()
+        self._wake()
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[Permit]:
+        """
+        Holds one slot for the block; a timeout or error escaping it counts
+        as a failed request.
+        """
+        await self.acquire()
+        permit = Permit()
+        started = time.monotonic()
+        try:
+            yield permit
+        except asyncio.CancelledError:
+            permit.outcome = "cancelled"
+            raise
+        except Exception as e:
+            permit.outcome = "timeout" if metrics.is_timeout(e) else "error"
+            raise
+        finally:
+            self.release(time.monotonic() - started, permit.outcome, permit.retry_after)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "concurrency_limit": int(self.limit),
+            "max_concurrency": self.max_concurrency,
+            "in_flight": self.in_flight,
+            "waiting": len(self._waiters),
+            "rate": self.bucket.rate,
+            "error_rate": round(self.error_rate, 3),
+            "requests": self.requests,
+            "backoffs": self.backoffs,
+            "throttled_wait_seconds": round(self.waited, 3),
+        }
+
+
+class UpstreamLimiters:
+    """
+    The limiters of the scraped hosts, looked up by request URL. Requests to
+    other hosts are not limited.
+    """
+
+    def __init__(self, enabled: bool = config.RATE_LIMIT_ENABLED):
+        self.enabled = enabled
+        self._limiters: Dict[str, HostLimiter] = {}
+
+    def add(self, base_url: str, **settings: Any) -> HostLimiter:
+        host = urlsplit(base_url).netloc
+        if host not in self._limiters:
+            self._limiters[host] = HostLimiter(host, **settings)
+        return self._limiters[host]
+
+    def for_url(self, url: str) -> Optional[HostLimiter]:
+        if not self.enabled:
+            return None
+        return self._limiters.get(urlsplit(url).netloc)
+
+    @asynccontextmanager
+    async def slot(self, url: str) -> AsyncIterator[Permit]:
+        """Limits one request to url; see HostLimiter.slot."""
+        limiter = self.for_url(url)
+        if limiter is None:
+            yield Permit()
+            return
+        async with limiter.slot() as permit:
+            yield permit
+
+    def backoff(self, url: str, reason: str):
+        """Reports a throttling signal noticed outside a slot (e.g. a block page)."""
+        limiter = self.for_url(url)
+        if limiter is not None:
+            limiter.backoff(reason)
+
+    def stats(self) -> Dict[str, Any]:
+        return {host: limiter.stats() for host, limiter in self._limiters.items()}
+
+
+# Shared instance used by the HTTP engine and the browser scraper
+upstream = UpstreamLimiters()
+upstream.add(
+    config.ESAJ_BASE_URL,
+    **process_share(
+        config.UPSTREAM_PROCESSES,
+        config.ESAJ_RATE,
+        config.ESAJ_BURST,
+        config.ESAJ_MAX_CONCURRENCY,
+    ),
+)
+upstream.add(
+    config.PORTAL_BASE_URL,
+    **process_share(
+        config.UPSTREAM_PROCESSES,
+        config.PORTAL_RATE,
+        config.PORTAL_BURST,
+        config.PORTAL_MAX_CONCURRENCY,
+    ),
+)
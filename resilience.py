@@ -0,0 +1,311 @@
+"""
+Retries, hedged attempts and circuit breaking for scraper lookups.
+
+A lookup is an attempt function returning a result dict, with an "error"
+key when it failed and an "error_kind" (see error_kind). Resilience.run
+retries attempts that failed transiently (timeouts, connection errors, 5xx
+answers) with exponential backoff. Captcha/block pages, 429/503 answers and
+other errors are returned at once: retrying would only add load to a site
+that is refusing us, and the rate limiter backs off instead. When an
+attempt is slower than the HEDGE_PERCENTILE of recent successful runs, a
+duplicate is started and whichever succeeds first wins.
+A circuit breaker per host fails attempts fast after repeated failures,
+then lets one probe through after CIRCUIT_RESET_TIMEOUT.
+
+Exceptions (e.g. browser pool backpressure) are not retried: they mean "not
+now" for the caller rather than "the site failed".
+"""
+
+import asyncio
+import collections
+import logging
+import random
+import time
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional
+
+import httpx
+
+import config
+import metrics
+from rate_limit import THROTTLE_STATUSES
+
+logger = logging.getLogger(__name__)
+
+Attempt = Callable[[], Awaitable[Dict[str, Any]]]
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+_STATE_VALUES = {CLOSED: 0, OPEN: 1, HALF_OPEN: 2}
+
+
+# Error kinds worth another attempt
+TRANSIENT_ERRORS = {"timeout", "connection", "server"}
+
+
+class UpstreamError(Exception):
+    """A site answered with something other than a result page."""
+
+    def __init__(self, message: str, kind: str):
+        super().__init__(message)
+        self.kind = kind  # "blocked", "throttled", "server" or "client"
+
+
+def http_error_kind(status: int) -> str:
+    """Error kind of an HTTP error status."""
+    if status in THROTTLE_STATUSES:
+        return "throttled"
+    return "server" if status >= 500 else "client"
+
+
+def error_kind(error: BaseException) -> str:
+    """
+    Classifies the exception behind a failed lookup: "timeout", "connection",
+    the kind of an UpstreamError, or "other".
+    """
+    if isinstance(error, UpstreamError):
+        return error.kind
+    if metrics.is_timeout(error):
+        return "timeout"
+    # Playwright reports network failures as net::ERR_* messages
+    if isinstance(error, (httpx.TransportError, ConnectionError)) or "net::ERR_" in str(error):
+        return "connection"
+    return "other"
+
+
+def _failed(result: Dict[str, Any]) -> bool:
+    return bool(result.get("error"))
+
+
+def _transient(result: Dict[str, Any]) -> bool:
+    return result.get("error_kind") in TRANSIENT_ERRORS
+
+
+class CircuitBreaker:
+    """
+    Opens after `failure_threshold` consecutive failures; after `reset_timeout`
+    one probe is let through, and its outcome closes or reopens the circuit.
+    """
+
+    def __init__(
+        self,
+        host: str,
+        failure_threshold: int = config.CIRCUIT_FAILURE_THRESHOLD,
+        reset_timeout: float = config.CIRCUIT_RESET_TIMEOUT,
+    ):
+        self.host = host
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_timeout = reset_timeout
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.rejected = 0
+        self._probing = False
+        self._export()
+
+    def _export(self):
+        metrics.CIRCUIT_STATE.set(_STATE_VALUES[self.state], host=self.host)
+
+    def allow(self) -> bool:
+        """Whether an attempt may go out now. Counts the rejection if not."""
+        if self.state == OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+            self.state = HALF_OPEN
+            self._export()
+        if self.state == CLOSED or (self.state == HALF_OPEN and not self._probing):
+            self._probing = self.state == HALF_OPEN
+            return True
+        self.rejected += 1
+        metrics.CIRCUIT_REJECTIONS.inc(host=self.host)
+        return False
+
+    def record(self, ok: bool):
+        self._probing = False
+        if ok:
+            self.failures = 0
+            if self.state != CLOSED:
+                logger.info(f"Circuit for {self.host} closed")
+            self.state = CLOSED
+        else:
+            self.failures += 1
+            if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != OPEN:
+                    logger.warning(f"Circuit for {self.host} opened after {self.failures} failures")
+                self.state = OPEN
+                self.opened_at = time.monotonic()
+        self._export()
+
+    def release(self):
+        """Ends an attempt that neither succeeded nor failed (e.g. it raised)."""
+        self._probing = False
+
+    def stats(self) -> Dict[str, Any]:
+        return {"state": self.state, "failures": self.failures, "rejected": self.rejected}
+
+
+class LatencyTracker:
+    """Durations of recent successful attempts, for the hedging threshold."""
+
+    def __init__(
+        self,
+        window: int = config.HEDGE_WINDOW,
+        percentile: float = config.HEDGE_PERCENTILE,
+        min_samples: int = config.HEDGE_MIN_SAMPLES,
+    ):
+        self.samples: Deque[float] = collections.deque(maxlen=max(1, window))
+        self.percentile = percentile
+        self.min_samples = max(1, min_samples)
+
+    def observe(self, seconds: float):
+        self.samples.append(seconds)
+
+    def threshold(self) -> Optional[float]:
+        """The percentile of recent durations; None until there are enough."""
+        if len(self.samples) < self.min_samples:
+            return None
+        ordered = sorted(self.samples)
+        index = min(len(ordered) - 1, int(len(ordered) * self.percentile / 100))
+        return ordered[index]
+
+
+class Resilience:
+    """
+    Runs lookups with retries, hedging and per-host circuit breakers.
+    """
+
+    def __init__(
+        self,
+        attempts: int = config.RETRY_ATTEMPTS,
+        backoff: float = config.RETRY_BACKOFF,
+        hedge: bool = config.HEDGE_ENABLED,
+        hedge_min_delay: float = config.HEDGE_MIN_DELAY,
+    ):
+        self.attempts = max(1, attempts)
+        self.backoff = backoff
+        self.hedge = hedge
+        self.hedge_min_delay = hedge_min_delay
+        self.breakers: Dict[str, CircuitBreaker] = {}
+        self.trackers: Dict[str, LatencyTracker] = {}
+        self.retries = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+
+    def breaker(self, host: str) -> CircuitBreaker:
+        if host not in self.breakers:
+            self.breakers[host] = CircuitBreaker(host)
+        return self.breakers[host]
+
+    def tracker(self, key: str) -> LatencyTracker:
+        if key not in self.trackers:
+            self.trackers[key] = LatencyTracker()
+        return self.trackers[key]
+
+    def hedge_delay(self, key: str) -> Optional[float]:
+        if not self.hedge:
+            return None
+        threshold = self.tracker(key).threshold()
+        return max(threshold, self.hedge_min_delay) if threshold is not None else None
+
+    async def _timed(self, key: str, attempt: Attempt) -> Dict[str, Any]:
+        started = time.monotonic()
+        result = await attempt()
+        if not _failed(result):
+            self.tracker(key).observe(time.monotonic() - started)
+        return result
+
+    async def _hedged(self, key: str, attempt: Attempt) -> Dict[str, Any]:
+        """
+        Runs one attempt, adding a duplicate if it outlasts the hedge delay.
+        The first success wins and the other attempt is cancelled.
+        """
+        primary = asyncio.ensure_future(self._timed(key, attempt))
+        tasks = [primary]
+        try:
+            delay = self.hedge_delay(key)
+            if delay is None:
+                return await primary
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            if done:
+                return primary.result()
+
+            self.hedges += 1
+            hedge = asyncio.ensure_future(self._timed(key, attempt))
+            tasks.append(hedge)
+            pending = set(tasks)
+            result: Optional[Dict[str, Any]] = None
+            error: Optional[BaseException] = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is not None:
+                        error = error or task.exception()
+                    elif not _failed(task.result()):
+                        winner = "hedge" if task is hedge else "primary"
+                        if winner == "hedge":
+                            self.hedge_wins += 1
+                        metrics.HEDGES.inc(winner=winner, **metrics.current_labels())
+                        return task.result()
+                    else:
+                        result = task.result()
+            metrics.HEDGES.inc(winner="none", **metrics.current_labels())
+            if result is None:
+                raise error  # type: ignore
+            return result
+        finally:
+            # The losing attempt, or both if the caller was cancelled
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def run(self, host: str, key: str, attempt: Attempt) -> Dict[str, Any]:
+        """
+        Runs attempt until it succeeds, fails with an error that is not
+        transient, the attempts run out or the host's circuit is open.
+
+        Args:
+            host: Site the attempt talks to; one circuit breaker per host.
+            key: What is measured for hedging (e.g. degree and engine).
+
+        Returns:
+            The first successful result, or the last failed one with the
+            number of attempts added to its error.
+        """
+        breaker = self.breaker(host)
+        errors: List[str] = []
+        result: Dict[str, Any] = {}
+        for number in range(self.attempts):
+            if number:
+                self.retries += 1
+                metrics.RETRIES.inc(**metrics.current_labels())
+                pause = self.backoff * 2 ** (number - 1)
+                await asyncio.sleep(pause * random.uniform(1.0, 1.5))
+            if not breaker.allow():
+                errors.append(f"circuit open for {host}")
+                break
+            try:
+                result = await self._hedged(key, attempt)
+            except BaseException:
+                breaker.release()
+                raise
+            breaker.record(not _failed(result))
+            if not _failed(result):
+                return result
+            errors.append(str(result["error"]))
+            logger.warning(f"Attempt {number + 1} of {key} failed: {result['error']}")
+            if not _transient(result):
+                break
+
+        summary = errors[-1]
+        if len(errors) > 1:
+            summary += f" (after {len(errors)} attempts; earlier: {'; '.join(errors[:-1])})"
+        return {"count": 0, "details": [], "names": [], **result, "error": summary}
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "retries": self.retries,
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "hedge_delays": {key: self.hedge_delay(key) for key in self.trackers},
+            "circuits": {host: breaker.stats() for host, breaker in self.breakers.items()},
+        }
+
+
+# Shared instance used by the degree searches
+resilience = Resilience()
@@ -0,0 +1,240 @@
+"""
+Retention of the request log.
+
+Rows older than RETENTION_DAYS are streamed, in batches, into gzip-compressed
+JSONL files partitioned by day (archive/requests-YYYY-MM-DD.jsonl.gz), then
+deleted from SQLite, which is then vacuumed incrementally. import_archive
+puts archived rows back. The same runs delete finished jobs submitted more
+than JOB_RETENTION_DAYS ago.
+
+    python retention.py archive [--days N]
+    python retention.py import archive/requests-2024-01-*.jsonl.gz
+"""
+
+import argparse
+import asyncio
+import gzip
+import json
+import logging
+import os
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional
+
+import config
+from database import (
+    delete_requests,
+    fetch_requests_before,
+    import_request_records,
+    incremental_vacuum,
+    init_db,
+    purge_finished_jobs,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def archive_path(archive_dir: str, day: str) -> str:
+    return os.path.join(archive_dir, f"requests-{day}.jsonl.gz")
+
+
+def append_records(archive_dir: str, records: List[Dict[str, Any]]) -> List[str]:
+    """
+    Appends records to the archive file of their day and syncs it to disk.
+
+    Each call adds a gzip member to the file; gzip readers treat the members
+    as one stream.
+
+    Returns:
+        The paths written.
+    """
+    by_day: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+    for record in records:
+        by_day[record["timestamp"][:10]].append(record)
+
+    os.makedirs(archive_dir, exist_ok=True)
+    paths = []
+    for day, day_records in sorted(by_day.items()):
+        path = archive_path(archive_dir, day)
+        with open(path, "ab") as raw:
+            with gzip.GzipFile(fileobj=raw, mode="ab") as gz:
+                for record in day_records:
+                    gz.write(json.dumps(record, ensure_ascii=False).encode() + b"\n")
+            raw.flush()
+            os.fsync(raw.fileno())
+        paths.append(path)
+    return paths
+
+
+def read_archive(path: str) -> Iterable[Dict[str, Any]]:
+    """Yields the records of an archive file one line at a time."""
+    with gzip.open(path, "rt", encoding="utf-8") as lines:
+        for line in lines:
+            if line.strip():
+                yield json.loads(line)
+
+
+def import_archive(path: str, batch_size: int = config.RETENTION_BATCH_SIZE) -> Dict[str, int]:
+    """
+    Restores an archive file into the requests table, streaming it in batches.
+
+    Rows already present are skipped, so importing twice is harmless; see
+    import_request_records for rows whose id was reused.
+
+    Returns:
+        {"imported": rows inserted, "rekeyed": how many of them got a new id}.
+    """
+    totals = {"imported": 0, "rekeyed": 0}
+    batch: List[Dict[str, Any]] = []
+
+    def flush():
+        for key, value in import_request_records(batch).items():
+            totals[key] += value
+
+    for record in read_archive(path):
+        batch.append(record)
+        if len(batch) >= batch_size:
+            flush()
+            batch = []
+    flush()
+    if totals["rekeyed"]:
+        logger.warning(f"{path}: {totals['rekeyed']} rows had their id taken and got a new one")
+    return totals
+
+
+class Retention:
+    """
+    Moves old request log rows to archive files, on demand or periodically.
+    """
+
+    def __init__(
+        self,
+        max_age_days: float = config.RETENTION_DAYS,
+        archive_dir: str = config.ARCHIVE_DIR,
+        batch_size: int = config.RETENTION_BATCH_SIZE,
+        vacuum_pages: int = config.RETENTION_VACUUM_PAGES,
+        interval: float = config.RETENTION_INTERVAL,
+        job_max_age_days: float = config.JOB_RETENTION_DAYS,
+    ):
+        self.max_age_days = max_age_days
+        self.job_max_age_days = job_max_age_days
+        self.archive_dir = archive_dir
+        self.batch_size = max(1, batch_size)
+        self.vacuum_pages = vacuum_pages
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+        self.runs = 0
+        self.archived = 0
+        self.jobs_purged = 0
+        self.last_run: Optional[str] = None
+        self.last_error: Optional[str] = None
+
+    def run(self, now: Optional[datetime] = None) -> Dict[str, Any]:
+        """
+        Archives every row older than max_age_days, one batch per transaction,
+        and deletes finished jobs older than job_max_age_days.
+
+        A batch is deleted only after its archive file has been synced, so a
+        crash can at worst archive some rows twice, never lose them.
+        """
+        now = now or datetime.utcnow()
+        jobs_purged = self.purge_jobs(now)
+        cutoff = now - timedelta(days=self.max_age_days)
+        archived = 0
+        files = set()
+        while self.max_age_days > 0:
+            records = fetch_requests_before(cutoff, self.batch_size)
+            if not records:
+                break
+            files.update(append_records(self.archive_dir, records))
+            delete_requests([record["id"] for record in records])
+            archived += len(records)
+
+        vacuum = incremental_vacuum(self.vacuum_pages) if archived else {}
+        self.runs += 1
+        self.archived += archived
+        self.last_run = datetime.utcnow().isoformat()
+        if archived:
+            logger.info(f"Archived {archived} request log rows older than {cutoff.isoformat()}")
+        return {"archived": archived, "files": sorted(files), "jobs_purged": jobs_purged, **vacuum}
+
+    def purge_jobs(self, now: datetime) -> int:
+        """Deletes finished jobs older than job_max_age_days, one batch per transaction."""
+        if self.job_max_age_days <= 0:
+            return 0
+        cutoff = now - timedelta(days=self.job_max_age_days)
+        purged = 0
+        while True:
+            deleted = purge_finished_jobs(cutoff, self.batch_size)
+            purged += deleted
+            if deleted < self.batch_size:
+                break
+        self.jobs_purged += purged
+        if purged:
+            logger.info(f"Deleted {purged} finished jobs submitted before {cutoff.isoformat()}")
+        return purged
+
+    async def _loop(self):
+        while True:
+            try:
+                await asyncio.to_thread(self.run)
+                self.last_error = None
+            except Exception as e:
+                self.last_error = str(e)
+                logger.error(f"Retention run failed: {e}")
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        """Schedules periodic runs. Does nothing when both retentions are disabled."""
+        if (self.max_age_days > 0 or self.job_max_age_days > 0) and self._task is None:
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.max_age_days > 0,
+            "max_age_days": self.max_age_days,
+            "runs": self.runs,
+            "archived": self.archived,
+            "job_max_age_days": self.job_max_age_days,
+            "jobs_purged": self.jobs_purged,
+            "last_run": self.last_run,
+            "last_error": self.last_error,
+        }
+
+
+# Shared instance scheduled by the app lifespan
+retention = Retention()
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Archive or restore request log rows.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    archive = commands.add_parser("archive", help="move old rows to archive files now")
+    archive.add_argument("--days", type=float, default=config.RETENTION_DAYS or None)
+    restore = commands.add_parser("import", help="restore rows from archive files")
+    restore.add_argument("paths", nargs="+")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    init_db()
+    if args.command == "archive":
+        if not args.days:
+            parser.error("--days is required when RETENTION_DAYS is not set")
+        print(json.dumps(Retention(max_age_days=args.days).run()))
+    else:
+        for path in args.paths:
+            totals = import_archive(path)
+            print(f"{path}: {totals['imported']} rows imported ({totals['rekeyed']} with a new id)")
+
+
+if __name__ == "__main__":
+    main()
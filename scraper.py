@@ -1,16 +1,140 @@
-from playwright.async_api import async_playwright
-import logging
-import re
 import asyncio
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+
+import config
+import metrics
+from browser_pool import pool
+from debug_artifacts import debug_artifacts
+from esaj_http import UnexpectedMarkupError, http_engine
+from parsing import (
+    BLOCK_MARKERS,
+    DETAIL_SELECTORS,
+    MAX_MOVEMENTS,
+    NO_RESULTS_MARKERS,
+    PAGE_LINK_SELECTOR,
+    RESULT_ROW_SELECTOR,
+    TOTAL_COUNT_SELECTOR,
+    build_details,
+    build_paged_result,
+    parse_total,
+    parties_from_partes,
+    party_dicts,
+    portal_location,
+    portal_name,
+    remaining_page_urls,
+)
+from portal_http import portal_engine
+from process_store import process_store
+from rate_limit import THROTTLE_STATUSES, retry_after, upstream
+from resilience import UpstreamError, error_kind, http_error_kind, resilience
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Everything search_degree needs from a result page, in one page.evaluate call
+LIST_PAGE_JS = """
+([rowSelector, noResultsMarkers, totalSelector, pageLinkSelector, blockMarkers]) => {
+    const link = (a) => ({ number: a.innerText, href: a.getAttribute("href") });
+    const numero = document.querySelector("span#numeroProcesso");
+    const total = document.querySelector(totalSelector);
+    const html = document.documentElement.outerHTML;
+    return {
+        noResults: noResultsMarkers.some((marker) => html.includes(marker)),
+        blocked: blockMarkers.some((marker) => html.toLowerCase().includes(marker)),
+        numero: numero ? numero.innerText : null,
+        rows: Array.from(document.querySelectorAll(rowSelector), (row) => {
+            const a = row.querySelector("a.linkProcesso");
+            return { link: a ? link(a) : null, text: row.innerText };
+        }),
+        links: Array.from(document.querySelectorAll("a.linkProcesso"), link),
+        total: total ? total.innerText : null,
+        pageLinks: Array.from(
+            document.querySelectorAll(pageLinkSelector), (a) => a.getAttribute("href")
+        ),
+    };
+}
+"""
+
+LIST_PAGE_ARGS = [
+    RESULT_ROW_SELECTOR,
+    NO_RESULTS_MARKERS,
+    TOTAL_COUNT_SELECTOR,
+    PAGE_LINK_SELECTOR,
+    BLOCK_MARKERS,
+]
+
+# Which known outcome the result page shows, once its DOM is fully parsed: the
+# detail page of a single process, a result list or a "no results" message
+OUTCOME_JS = """
+([rowSelector, noResultsMarkers]) => {
+    if (document.readyState === "loading" || !document.body) return null;
+    if (document.querySelector("span#numeroProcesso")) return "detail";
+    if (document.querySelector(rowSelector) || document.querySelector("a.linkProcesso")) {
+        return "list";
+    }
+    const text = document.body.textContent;
+    return noResultsMarkers.some((marker) => text.includes(marker)) ? "no_results" : null;
+}
+"""
+
+OUTCOME_ARGS = [RESULT_ROW_SELECTOR, NO_RESULTS_MARKERS]
+
+# Milliseconds between OUTCOME_JS checks
+OUTCOME_POLL_INTERVAL = 100
+
+# Raw text of a process detail page, in one page.evaluate call
+DETAIL_PAGE_JS = """
+([selectors, maxMovements]) => {
+    const cells = (selector, limit) => {
+        const table = document.querySelector(selector);
+        if (!table) return [];
+        let rows = Array.from(table.querySelectorAll("tr"));
+        if (limit) rows = rows.slice(0, limit);
+        return rows.map((tr) => Array.from(tr.querySelectorAll("td"), (td) => td.innerText));
+    };
+    const fields = {};
+    for (const [key, selector] of Object.entries(selectors)) {
+        const el = document.querySelector(selector);
+        fields[key] = el ? el.innerText : null;
+    }
+    return {
+        fields,
+        partes: cells("table#tablePartesPrincipais"),
+        movimentacoes: cells("tbody#tabelaTodasMovimentacoes", maxMovements),
+    };
+}
+"""
+
+
+async def goto(page, url, **kwargs):
+    """
+    page.goto through the host's rate limiter; 429/503 answers make it back off.
+    """
+    async with upstream.slot(url) as permit:
+        response = await page.goto(url, **kwargs)
+        if response is not None and response.status in THROTTLE_STATUSES:
+            permit.throttled(retry_after(response.headers.get("retry-after")))
+    return response
+
 
-async def search_degree(page, url, document, degree_name):
+async def wait_for_outcome(page, timeout: float = config.RESULT_WAIT_TIMEOUT) -> str:
+    """
+    Waits until the result page shows one of the known outcomes and returns
+    it ("detail", "list" or "no_results"), without waiting for the network
+    to go idle. The check runs again after the search navigates.
+    """
+    handle = await page.wait_for_function(
+        OUTCOME_JS, arg=OUTCOME_ARGS, polling=OUTCOME_POLL_INTERVAL, timeout=timeout * 1000
+    )
+    return str(await handle.json_value())
+
+
+async def search_degree(page, url, document, degree_name, max_processes=None):
     """
     Helper function to search a specific degree (1st or 2nd).
+    Stops paginating once max_processes processes are listed.
     """
     try:
         # Clean document (keep only numbers)
@@ -19,63 +143,64 @@ async def search_degree(page, url, document, degree_name):
             f"Navigating to TJSP {degree_name} for document: {document} "
             f"(cleaned: {clean_document})"
         )
-        await page.goto(url, timeout=60000)
+        with metrics.stage("goto"):
+            response = await goto(page, url, timeout=60000)
+        if response is not None and response.status >= 400:
+            raise UpstreamError(
+                f"{degree_name} answered HTTP {response.status}", http_error_kind(response.status)
+            )
 
-        # Select "Documento da Parte" in the dropdown
-        await page.select_option("select#cbPesquisa", value="DOCPARTE")
+        with metrics.stage("form"):
+            # Select "Documento da Parte" in the dropdown
+            await page.select_option("select#cbPesquisa", value="DOCPARTE")
 
-        # Wait for the input field to be visible
-        await page.wait_for_selector("input#campo_DOCPARTE")
+            # Wait for the input field to be visible
+            await page.wait_for_selector("input#campo_DOCPARTE")
 
-        # Fill the document
-        await page.fill("input#campo_DOCPARTE", clean_document)
+            # Fill the document
+            await page.fill("input#campo_DOCPARTE", clean_document)
 
-        # Click Search
-        # Button ID might differ between degrees
-        if "cposg" in url:  # 2nd Degree
-            await page.click("input#pbConsultar")
-        else:  # 1st Degree
-            await page.click("input#botaoConsultarProcessos")
+            # Click Search
+            # Button ID might differ between degrees
+            if "cposg" in url:  # 2nd Degree
+                await page.click("input#pbConsultar")
+            else:  # 1st Degree
+                await page.click("input#botaoConsultarProcessos")
 
-        # Wait for results or "no results" message
+        # Wait for results, a detail page or the "no results" message
         try:
-            await page.wait_for_load_state("networkidle", timeout=20000)
-        except Exception:
-            # Capture screenshot for debugging
-            await page.screenshot(path=f"error_screenshot_{degree_name}.png")
-            logger.warning(
-                f"Timeout waiting for networkidle in {degree_name}. "
-                f"Saved error_screenshot_{degree_name}.png"
-            )
-            pass
+            with metrics.stage("results_wait"):
+                await wait_for_outcome(page)
+        except Exception as e:
+            # Unknown page (e.g. a captcha): keep a sampled snapshot and read what is there
+            path = await debug_artifacts.capture(page, degree_name)
+            saved = f" Saved {path}" if path else ""
+            logger.warning(f"No known result in {degree_name}: {e}.{saved}")
+
+        # Read the whole result page in a single round trip
+        with metrics.stage("list_parse"):
+            snapshot = await page.evaluate(LIST_PAGE_JS, LIST_PAGE_ARGS)
 
         # Check for "No results" message
-        content = await page.content()
-        if (
-            "Não existem processos" in content
-            or "Nenhum processo foi encontrado" in content
-            or "Não existem informações disponíveis para os parâmetros informados" in content
-        ):
+        if snapshot["noResults"]:
             logger.info(f"No records found in {degree_name}.")
+            metrics.count_no_results()
             return {"count": 0, "details": [], "names": []}
 
         # Check if we were redirected to a specific process detail page
         # This happens when there is only one result
-        single_process_element = await page.query_selector("span#numeroProcesso")
-        if single_process_element:
-            proc_num = (await single_process_element.inner_text()).strip()
+        proc_num = (snapshot["numero"] or "").strip()
+        if proc_num:
             logger.info(f"Redirected to detail page for process {proc_num} in {degree_name}")
 
-            # Extract full details from the page
-            full_details = await extract_details_from_page(page)
+            # Extract full details from the page, unless they were stored recently
+            full_details = await process_store.get(proc_num)
+            if full_details is None:
+                full_details = await extract_details_from_page(page)
+                await process_store.save(proc_num, full_details)
 
-            # Extract names from parties list for the top-level names list
-            found_names = set()
-            for parte in full_details.get("partes", []):
-                # parte string is like "Reqte: Name"
-                parts = parte.split(":")
-                if len(parts) > 1:
-                    found_names.add(parts[1].strip())
+            # Extract names and roles from parties list for the top-level lists
+            parties = parties_from_partes(full_details.get("partes", []))
 
             return {
                 "count": 1,
@@ -87,184 +212,124 @@ async def search_degree(page, url, document, degree_name):
                         **full_details,  # Unpack all extracted details
                     }
                 ],
-                "names": list(found_names),
+                "names": list({party.name for party in parties}),
+                "parties": party_dicts(parties),
             }
 
-        # Extract process items
-        process_items = await page.query_selector_all(
-            "div.processoDetalhes, tr.fundoClaro, tr.fundoEscuro"
+        # A captcha or block page instead of results: slow down and report it,
+        # rather than returning it as a clean "0 records"
+        if snapshot.get("blocked") and not snapshot["rows"] and not snapshot["links"]:
+            upstream.backoff(url, "blocked")
+            raise UpstreamError(f"{degree_name} answered with a captcha or block page", "blocked")
+
+        # Follow pagination: fetch the remaining list pages concurrently
+        extra_urls = remaining_page_urls(
+            page.url,
+            snapshot["pageLinks"],
+            len(snapshot["rows"]) or len(snapshot["links"]),
+            parse_total(snapshot["total"]),
+            max_processes,
+            config.PAGINATION_MAX_PAGES,
         )
-
-        count = 0
-        details = []
-        found_names = set()
-
-        if not process_items:
-            # Fallback to counting links
-            process_links = await page.query_selector_all("a.linkProcesso")
-            count = len(process_links)
-            for link in process_links:
-                text = await link.inner_text()
-                href = await link.get_attribute("href")
-                full_link = f"https://esaj.tjsp.jus.br{href}" if href else ""
-                details.append({"number": text.strip(), "degree": degree_name, "link": full_link})
+        if extra_urls:
+            with metrics.stage("pagination"):
+                snapshots = [snapshot] + await fetch_list_pages(
+                    page.context, extra_urls, degree_name
+                )
         else:
-            count = len(process_items)
-            for item in process_items:
-                # Extract process number
-                link = await item.query_selector("a.linkProcesso")
-                if link:
-                    proc_num = (await link.inner_text()).strip()
-                    href = await link.get_attribute("href")
-                    full_link = f"https://esaj.tjsp.jus.br{href}" if href else ""
-                    details.append(
-                        {"number": proc_num, "degree": degree_name, "link": full_link}
-                    )
-
-                # Extract text to find names
-                text = await item.inner_text()
-                lines = text.split("\n")
-                for line in lines:
-                    line = line.strip()
-                    prefixes = [
-                        "Reqte:",
-                        "Reqdo:",
-                        "Autor:",
-                        "Réu:",
-                        "Exectdo:",
-                        "Exequente:",
-                        "Agravante:",
-                        "Agravado:",
-                        "Averiguado:",
-                        "Indiciado:",
-                        "Requerente:",
-                        "Requerido:",
-                        "Impetrante:",
-                        "Impetrado:",
-                        "Interessado:",
-                        "Embargante:",
-                        "Embargado:",
-                        "Apelante:",
-                        "Apelado:",
-                    ]
-                    for prefix in prefixes:
-                        if prefix.lower() in line.lower():
-                            parts = re.split(f"{prefix}", line, flags=re.IGNORECASE)
-                            if len(parts) > 1:
-                                name_part = parts[1].strip()
-                                if name_part:
-                                    # Clean up common suffixes
-                                    name_part = name_part.split("Advogado:")[0].strip()
-                                    found_names.add(name_part)
-
-        # Fallback: If process_items were found but no details were extracted
-        if not details and count > 0:
-            logger.warning(
-                f"Process items found ({count}) but no details extracted. "
-                "Trying direct link extraction."
+            snapshots = [snapshot]
+
+        with metrics.stage("list_parse"):
+            result = build_paged_result(
+                snapshots,
+                degree_name,
+                page.url,
+                max_processes,
+                skipped_pages=1 + len(extra_urls) - len(snapshots),
             )
-            process_links = await page.query_selector_all("a.linkProcesso")
-            if process_links:
-                count = len(process_links)  # Update count to match links
-                for link in process_links:
-                    text = await link.inner_text()
-                    href = await link.get_attribute("href")
-                    full_link = f"https://esaj.tjsp.jus.br{href}" if href else ""
-                    details.append(
-                        {"number": text.strip(), "degree": degree_name, "link": full_link}
-                    )
-
-        logger.info(f"Found {count} records in {degree_name}. Names: {list(found_names)}")
-        return {"count": count, "details": details, "names": list(found_names)}
+        logger.info(f"Found {result['count']} records in {degree_name}. Names: {result['names']}")
+        return result
 
     except Exception as e:
         logger.error(f"Error during scraping {degree_name}: {e}")
-        return {"error": str(e), "count": 0, "details": [], "names": []}
+        metrics.count_error()
+        return {
+            "error": str(e),
+            "error_kind": error_kind(e),
+            "count": 0,
+            "details": [],
+            "names": [],
+        }
 
 
-async def extract_details_from_page(page):
+async def fetch_list_pages(context, urls, degree_name):
     """
-    Extracts full details from a process detail page.
+    Opens the remaining result pages concurrently and snapshots each one. Every
+    page is taken from the pool, so it holds a slot of its own, and starts with
+    the cookies of the search's context (the eSAJ session). Pages that fail, or
+    find no free slot, are left out; the caller reports them as skipped.
     """
-    details = {}
+    semaphore = asyncio.Semaphore(config.PAGINATION_CONCURRENCY)
+    cookies = await context.cookies()
 
-    # Helper to get text safely
-    async def get_text(selector):
-        try:
-            el = await page.query_selector(selector)
-            return (await el.inner_text()).strip() if el else None
-        except Exception:
-            return None
-
-    details["classe"] = await get_text("span#classeProcesso")
-    details["area"] = await get_text("div#areaProcesso")
-    details["assunto"] = await get_text("span#assuntoProcesso")
-    details["data_distribuicao"] = await get_text("div#dataHoraDistribuicaoProcesso")
-    details["juiz"] = await get_text("span#juizProcesso")
-    details["valor_acao"] = await get_text("div#valorAcaoProcesso")
-
-    # Extract Parties
-    parties = []
-    try:
-        table_parts = await page.query_selector("table#tablePartesPrincipais")
-        if table_parts:
-            rows = await table_parts.query_selector_all("tr")
-            for row in rows:
-                # Usually 2 columns: Type (Reqte/Reqdo) and Name
-                cols = await row.query_selector_all("td")
-                if len(cols) >= 2:
-                    type_text = (await cols[0].inner_text()).strip()
-                    # Name often has extra whitespace or newlines
-                    name_text = (await cols[1].inner_text()).replace("\n", " ").strip()
-                    # Clean up name (remove "Advogado: ...")
-                    name_clean = name_text.split("Advogado:")[0].strip()
-                    parties.append(f"{type_text} {name_clean}")
-    except Exception as e:
-        logger.warning(f"Error extracting parties: {e}")
-    details["partes"] = parties
+    async def fetch(url):
+        async with semaphore:
+            try:
+                async with pool.context() as extra_context:
+                    await extra_context.add_cookies(cookies)
+                    page = await extra_context.new_page()
+                    await goto(page, url, timeout=60000, wait_until="domcontentloaded")
+                    return await page.evaluate(LIST_PAGE_JS, LIST_PAGE_ARGS)
+            except Exception as e:
+                logger.warning(f"Skipping {degree_name} result page {url}: {e}")
+                return None
 
-    # Extract Movements (latest 5)
-    movements = []
-    try:
-        table_moves = await page.query_selector("tbody#tabelaTodasMovimentacoes")
-        if table_moves:
-            rows = await table_moves.query_selector_all("tr")
-            for i, row in enumerate(rows):
-                if i >= 5:
-                    break  # Limit to 5
-                cols = await row.query_selector_all("td")
-                if len(cols) >= 3:
-                    date = (await cols[0].inner_text()).strip()
-                    desc_raw = (await cols[2].inner_text()).strip()
-                    # Clean up excessive whitespace/newlines
-                    # Replace multiple newlines/tabs with a single newline
-                    desc_clean = re.sub(r"\n\s*", "\n", desc_raw)
-                    # Remove multiple spaces
-                    desc_clean = re.sub(r" +", " ", desc_clean)
-                    movements.append(f"{date} - {desc_clean}")
-    except Exception as e:
-        logger.warning(f"Error extracting movements: {e}")
-    details["movimentacoes"] = movements
+    if urls:
+        logger.info(f"Fetching {len(urls)} more result pages in {degree_name}")
+    snapshots = await asyncio.gather(*(fetch(url) for url in urls))
+    return [snapshot for snapshot in snapshots if snapshot is not None]
 
-    return details
 
+async def extract_details_from_page(page):
+    """
+    Extracts full details from a process detail page.
+    """
+    with metrics.stage("detail_extraction"):
+        try:
+            raw = await page.evaluate(DETAIL_PAGE_JS, [DETAIL_SELECTORS, MAX_MOVEMENTS])
+        except Exception as e:
+            logger.warning(f"Error extracting process details: {e}")
+            raw = {"fields": {}, "partes": [], "movimentacoes": []}
+        return build_details(raw["fields"], raw["partes"], raw["movimentacoes"])
 
-async def search_portal_transparencia(document: str):
+
+async def search_portal_transparencia(
+    document: str, fields: Optional[List[str]] = None, engine: Optional[str] = None
+):
     """
     Searches for person data on Portal da Transparência by CPF.
     Returns Name and Location.
+
+    Args:
+        document: CPF in any format.
+        fields: "name" and/or "location"; leaving out "location" skips the
+            person's page. Defaults to both.
+        engine: "http" or "browser"; defaults to config.PORTAL_ENGINE.
     """
-    async with async_playwright() as p:
-        browser = await p.chromium.launch(headless=True)
-        # Use a standard User-Agent to avoid blocking
-        user_agent = (
-            "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) "
-            "AppleWebKit/537.36 (KHTML, like Gecko) "
-            "Chrome/120.0.0.0 Safari/537.36"
-        )
-        context = await browser.new_context(user_agent=user_agent)
-        page = await context.new_page()
+    location = fields is None or "location" in fields
+    engine = engine or config.PORTAL_ENGINE
+    with metrics.labels(source="portal", degree=""):
+        if engine == "http":
+            try:
+                return await portal_engine.search(document, location)
+            except UnexpectedMarkupError as e:
+                portal_engine.fallbacks += 1
+                logger.warning(f"Falling back to browser for Portal da Transparência: {e}")
+        return await _search_portal(document, location)
 
+
+async def _search_portal(document: str, with_location: bool = True):
+    async with pool.page() as page:
         try:
             # Clean document (keep only numbers)
             clean_document = "".join(filter(str.isdigit, document))
@@ -274,42 +339,46 @@ async def search_portal_transparencia(document: str):
             )
 
             # Correct URL based on subagent findings
-            await page.goto(
-                "https://portaldatransparencia.gov.br/busca/",
-                timeout=60000,
-                wait_until="domcontentloaded",
-            )
-
-            # Wait for search box or search button
-            # Sometimes the search box is hidden behind a button
-            try:
-                await page.wait_for_selector("button.bt-search", timeout=5000)
-                await page.click("button.bt-search")
-            except Exception:
-                pass  # Button might not exist or be needed
-
-            # Wait for search box
-            await page.wait_for_selector("input#termo", timeout=20000)
-
-            # Type CPF
-            await page.fill("input#termo", clean_document)
-            # await page.wait_for_timeout(500) # Removed for performance
+            with metrics.stage("goto"):
+                await goto(
+                    page,
+                    f"{config.PORTAL_BASE_URL}/busca/",
+                    timeout=60000,
+                    wait_until="domcontentloaded",
+                )
 
-            # Click Search Button explicitly
-            # The button is inside the form
-            search_btn = await page.query_selector("form#form-busca button[type='submit']")
-            if search_btn:
-                await search_btn.click()
-            else:
-                await page.press("input#termo", "Enter")
+            with metrics.stage("form"):
+                # Wait for search box or search button
+                # Sometimes the search box is hidden behind a button
+                try:
+                    await page.wait_for_selector("button.bt-search", timeout=5000)
+                    await page.click("button.bt-search")
+                except Exception:
+                    pass  # Button might not exist or be needed
+
+                # Wait for search box
+                await page.wait_for_selector("input#termo", timeout=20000)
+
+                # Type CPF
+                await page.fill("input#termo", clean_document)
+                # await page.wait_for_timeout(500) # Removed for performance
+
+                # Click Search Button explicitly
+                # The button is inside the form
+                search_btn = await page.query_selector("form#form-busca button[type='submit']")
+                if search_btn:
+                    await search_btn.click()
+                else:
+                    await page.press("input#termo", "Enter")
 
             # Wait for results
             # The result usually appears in a box "Resultado da busca"
             try:
                 # Wait for at least one item in results (it's a div, not li)
-                await page.wait_for_selector(
-                    "ul#resultados div.busca-portal-block-searchs__item", timeout=20000
-                )
+                with metrics.stage("results_wait"):
+                    await page.wait_for_selector(
+                        "ul#resultados div.busca-portal-block-searchs__item", timeout=20000
+                    )
             except Exception:
                 logger.warning("Timeout waiting for results items.")
 
@@ -325,43 +394,40 @@ async def search_portal_transparencia(document: str):
 
             if not link_element:
                 logger.info("No results found on Portal da Transparência.")
+                metrics.count_no_results()
                 return {"found": False, "name": None, "location": None}
 
             # Extract Name from the link text first (it's usually there)
             # Text: "Pessoa Física: ***.104.236-** - MICHELLE FARIA DE OLIVEIRA"
-            link_text = await link_element.inner_text()
-            name = None
-            if "-" in link_text:
-                name = link_text.split("-")[-1].strip()
+            name = portal_name(await link_element.inner_text())
 
-            # Get href to navigate to details for Location
-            href = await link_element.get_attribute("href")
+            # Get href to navigate to details for Location, unless only the name is wanted
+            href = await link_element.get_attribute("href") if with_location else None
+            location = None
             if href:
                 # Construct absolute URL to avoid relative path issues
                 # href is likely "busca/pessoa-fisica/..."
-                # Base is "https://portaldatransparencia.gov.br/"
+                # Base is config.PORTAL_BASE_URL
                 if not href.startswith("/"):
                     href = "/" + href
 
                 # If href starts with /busca/ and we are at /busca/,
                 # it might be fine if we use root domain
-                target_url = f"https://portaldatransparencia.gov.br{href}"
+                target_url = f"{config.PORTAL_BASE_URL}{href}"
                 logger.info(f"Navigating to detail page: {target_url}")
 
-                await page.goto(target_url, timeout=60000, wait_until="domcontentloaded")
+                with metrics.stage("goto"):
+                    await goto(page, target_url, timeout=60000, wait_until="domcontentloaded")
 
                 # Extract Location from detail page
                 # We need to find where "Localidade" is.
                 # Usually in a definition list or similar.
                 # We'll search the body text for "Localidade"
-                content_text = await page.inner_text("body")
+                with metrics.stage("detail_extraction"):
+                    content_text = await page.inner_text("body")
 
-                # Regex for Location
                 # "Localidade\nSÃO PAULO"
-                loc_match = re.search(r"Localidade\s*\n\s*(.+)", content_text)
-                location = None
-                if loc_match:
-                    location = loc_match.group(1).strip()
+                location = portal_location(content_text)
 
             return {
                 "found": True,
@@ -372,51 +438,194 @@ async def search_portal_transparencia(document: str):
 
         except Exception as e:
             logger.error(f"Error scraping Portal da Transparência: {e}")
+            metrics.count_error()
             return {"error": str(e)}
-        finally:
-            await browser.close()
 
 
-async def search_tjsp(document: str):
+async def _search_degree_pooled(url, document, degree_name, max_processes=None):
     """
-    Searches for criminal records on TJSP eSAJ (1st and 2nd Degree) by CPF/CNPJ.
-    Returns aggregated results.
+    Runs search_degree on a page borrowed from the shared browser pool.
     """
-    async with async_playwright() as p:
-        browser = await p.chromium.launch(headless=True)
+    async with pool.page() as page:
+        return await search_degree(page, url, document, degree_name, max_processes)
 
-        # Run searches concurrently
-        page1 = await browser.new_page()
-        page2 = await browser.new_page()
 
-        task1 = search_degree(
-            page1, "https://esaj.tjsp.jus.br/cpopg/open.do", document, "1º Grau"
-        )
-        task2 = search_degree(
-            page2, "https://esaj.tjsp.jus.br/cposg/open.do", document, "2º Grau"
-        )
+async def _search_degree_with_engine(system, document, degree_name, engine, max_processes=None):
+    """
+    Runs one degree search on the chosen engine, falling back to the browser
+    when the HTTP engine does not recognise the page. Failed searches are
+    retried and slow ones hedged.
+    """
+    with metrics.labels(source="tjsp", degree=degree_name):
+
+        async def attempt():
+            if engine == "http":
+                try:
+                    return await http_engine.search_degree(
+                        system, document, degree_name, max_processes
+                    )
+                except UnexpectedMarkupError as e:
+                    http_engine.fallbacks += 1
+                    logger.warning(f"Falling back to browser for {degree_name}: {e}")
+            return await _search_degree_pooled(
+                f"{config.ESAJ_BASE_URL}/{system}/open.do", document, degree_name, max_processes
+            )
 
-        results = await asyncio.gather(task1, task2)
+        # Retried, hedged and circuit-broken; see resilience.py
+        return await resilience.run(config.ESAJ_BASE_URL, f"{system}/{engine}", attempt)
 
-        await browser.close()
 
-        # Aggregate results
-        total_count = 0
-        all_details = []
-        all_names = set()
-        errors = []
+# eSAJ systems searched for each document, and the degree each one covers
+TJSP_DEGREES = {"cpopg": "1º Grau", "cposg": "2º Grau"}
 
-        for res in results:
-            if "error" in res and res["error"]:
-                errors.append(res["error"])
 
-            total_count += res.get("count", 0)
-            all_details.extend(res.get("details", []))
-            all_names.update(res.get("names", []))
+async def search_tjsp_degree(
+    system: str, document: str, engine: Optional[str] = None, max_processes: Optional[int] = None
+):
+    """
+    Searches one TJSP degree ("cpopg" or "cposg", see TJSP_DEGREES); the
+    arguments are those of search_tjsp.
+    """
+    engine = engine or config.SEARCH_ENGINE
+    return await _search_degree_with_engine(
+        system, document, TJSP_DEGREES[system], engine, max_processes
+    )
 
-        final_result = {"count": total_count, "details": all_details, "names": list(all_names)}
 
-        if errors:
-            final_result["errors"] = errors
+async def search_tjsp(
+    document: str, engine: Optional[str] = None, max_processes: Optional[int] = None
+):
+    """
+    Searches for criminal records on TJSP eSAJ (1st and 2nd Degree) by CPF/CNPJ.
+    Returns aggregated results.
 
-        return final_result
+    Args:
+        document: CPF/CNPJ in any format.
+        engine: "http" or "browser"; defaults to config.SEARCH_ENGINE.
+        max_processes: Per-degree cap on listed processes; limits pagination.
+    """
+    # Run searches concurrently
+    results = await asyncio.gather(
+        *(search_tjsp_degree(system, document, engine, max_processes) for system in TJSP_DEGREES),
+        return_exceptions=True,
+    )
+
+    # Surface pool backpressure to the caller instead of a partial result
+    degree_results: List[Dict[str, Any]] = []
+    for res in results:
+        if isinstance(res, BaseException):
+            raise res
+        degree_results.append(res)
+
+    # Aggregate results
+    total_count = 0
+    all_details = []
+    all_names = set()
+    all_parties: List[Dict[str, str]] = []
+    errors = []
+
+    for res in degree_results:
+        if "error" in res and res["error"]:
+            errors.append(res["error"])
+        # Result pages that could not be read: the degree's list is incomplete
+        errors.extend(res.get("errors", []))
+
+        total_count += res.get("count", 0)
+        all_details.extend(res.get("details", []))
+        all_names.update(res.get("names", []))
+        all_parties.extend(p for p in res.get("parties", []) if p not in all_parties)
+
+    final_result = {
+        "count": total_count,
+        "details": all_details,
+        "names": list(all_names),
+        "parties": all_parties,
+    }
+
+    if errors:
+        final_result["errors"] = errors
+
+    return final_result
+
+
+async def fetch_process_details(link, engine=None, number=None, max_age=None):
+    """
+    Extracts the detail fields of one process from its show.do link.
+    Recently stored details for the process number are used without navigating;
+    max_age overrides PROCESS_DETAILS_MAX_AGE for what counts as recent.
+    """
+    if number:
+        stored = await process_store.get(number, max_age)
+        if stored is not None:
+            return stored
+
+    engine = engine or config.SEARCH_ENGINE
+    details = None
+    degree_name = "2º Grau" if "/cposg/" in link else "1º Grau"
+    with metrics.labels(source="tjsp", degree=degree_name):
+        if engine == "http":
+            try:
+                details = await http_engine.fetch_details(link)
+            except UnexpectedMarkupError as e:
+                http_engine.fallbacks += 1
+                logger.warning(f"Falling back to browser for process details: {e}")
+        if details is None:
+            async with pool.page() as page:
+                with metrics.stage("goto"):
+                    await goto(page, link, timeout=60000, wait_until="domcontentloaded")
+                details = await extract_details_from_page(page)
+
+    if number:
+        await process_store.save(number, details)
+    return details
+
+
+async def enrich_processes(
+    processes: List[Dict[str, Any]],
+    engine: Optional[str] = None,
+    concurrency: int = config.ENRICH_CONCURRENCY,
+    budget: float = config.ENRICH_TIME_BUDGET,
+    max_age: Optional[float] = None,
+) -> Tuple[List[Dict[str, Any]], Dict[str, int]]:
+    """
+    Visits the link of every list-only process to fill in its details.
+    Stored details are reused as in fetch_process_details.
+
+    At most `concurrency` detail pages are fetched at a time. Whatever has not
+    finished when the time budget runs out is cancelled and left as it was, so
+    the caller gets a partial enrichment instead of a timeout.
+
+    Returns:
+        (processes, status): copies of the processes, enriched where possible,
+        and the number of enriched, failed and pending processes.
+    """
+    processes = [dict(process) for process in processes]
+    todo = [p for p in processes if p.get("link") and "partes" not in p]
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def enrich(process):
+        async with semaphore:
+            try:
+                details = await fetch_process_details(
+                    process["link"], engine, process.get("number"), max_age
+                )
+                process.update(details)
+                return True
+            except Exception as e:
+                logger.warning(f"Could not enrich process {process.get('number')}: {e}")
+                return False
+
+    status = {"enriched": 0, "failed": 0, "pending": 0}
+    tasks = [asyncio.ensure_future(enrich(process)) for process in todo]
+    if tasks:
+        done, pending = await asyncio.wait(tasks, timeout=budget)
+        for task in pending:
+            task.cancel()
+        # Let cancelled tasks close their pages before returning
+        await asyncio.gather(*pending, return_exceptions=True)
+        status["enriched"] = sum(1 for task in done if task.result())
+        status["failed"] = len(done) - status["enriched"]
+        status["pending"] = len(pending)
+        if pending:
+            logger.warning(f"Enrichment budget of {budget}s exhausted; {len(pending)} pending")
+    return processes, status
@@ -1,10 +1,18 @@
+import pytest
 from fastapi.testclient import TestClient
 from main import app
 from unittest.mock import patch, AsyncMock
+from cache import person_cache, search_cache
 
 client = TestClient(app)
 
 
+@pytest.fixture(autouse=True)
+def clear_caches():
+    search_cache.clear()
+    person_cache.clear()
+
+
 def test_read_root():
     response = client.get("/")
     assert response.status_code == 200
@@ -19,6 +27,7 @@ def test_get_status():
     data = response.json()
     assert data["status"] == "online"
     assert "total_requests_processed" in data
+    assert data["coalescing"]["search"]["coalesced"] >= 0
 
 
 @patch("main.search_tjsp", new_callable=AsyncMock)
@@ -108,3 +117,133 @@ def test_formatting_logic():
 
         assert response.status_code == 200
         assert response.json()["document"] == formatted_cpf
+
+
+@patch("main.search_tjsp", new_callable=AsyncMock)
+def test_search_pool_saturated(mock_search):
+    from browser_pool import PoolSaturatedError
+
+    mock_search.side_effect = PoolSaturatedError("No browser slot available")
+
+    response = client.post("/search", json={"document": "123.456.789-00"})
+
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "5"
+
+
+@patch("main.search_tjsp", new_callable=AsyncMock)
+def test_search_served_from_cache(mock_search):
+    mock_search.return_value = {"count": 0, "details": [], "names": []}
+
+    first = client.post("/search", json={"document": "12345678900"})
+    second = client.post("/search", json={"document": "123.456.789-00"})
+
+    assert mock_search.await_count == 1
+    assert first.json()["cached"] is False
+    assert second.json()["cached"] is True
+    assert second.json()["cached_at"] is not None
+
+
+@patch("main.search_tjsp", new_callable=AsyncMock)
+def test_search_cache_bypass(mock_search):
+    mock_search.return_value = {"count": 0, "details": [], "names": []}
+
+    client.post("/search", json={"document": "123.456.789-00"})
+    no_cache = client.post("/search", json={"document": "123.456.789-00", "no_cache": True})
+    too_old = client.post("/search", json={"document": "123.456.789-00", "max_age": 0})
+
+    assert mock_search.await_count == 3
+    assert no_cache.json()["cached"] is False
+    assert too_old.json()["cached"] is False
+
+
+@patch("main.search_tjsp", new_callable=AsyncMock)
+def test_search_batch_streams_ndjson(mock_search):
+    import json
+
+    async def fake_search(document, **kwargs):
+        if document.startswith("999"):
+            return {"error": "Timeout error"}
+        return {"count": 0, "details": [], "names": []}
+
+    mock_search.side_effect = fake_search
+
+    response = client.post(
+        "/search/batch?concurrency=2",
+        json={"documents": ["12345678900", "99999999999", "11222333000181"]},
+    )
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    items = {item["document"]: item for item in map(json.loads, response.text.splitlines())}
+    assert items["123.456.789-00"]["status"] == "success"
+    assert items["11.222.333/0001-81"]["records_count"] == 0
+    assert items["999.999.999-99"] == {
+        "document": "999.999.999-99",
+        "status": "failed",
+        "error": "Timeout error",
+    }
+
+
+@patch("main.search_tjsp", new_callable=AsyncMock)
+def test_search_batch_file_upload(mock_search):
+    mock_search.return_value = {"count": 0, "details": [], "names": []}
+
+    response = client.post(
+        "/search/batch",
+        files={"file": ("documents.txt", b"12345678900\n\n98765432100\n", "text/plain")},
+    )
+
+    assert response.status_code == 200
+    assert len(response.text.splitlines()) == 2
+    assert mock_search.await_count == 2
+
+
+def test_search_batch_rejects_bad_body():
+    response = client.post("/search/batch", json={"documents": "12345678900"})
+    assert response.status_code == 400
+
+    response = client.post("/search/batch", content=b"", headers={"Content-Type": "text/plain"})
+    assert response.status_code == 400
+
+    response = client.post(
+        "/search/batch", content=b"\xff\xfe1\x002\x00", headers={"Content-Type": "text/plain"}
+    )
+    assert response.status_code == 400
+
+    response = client.post("/search/batch", files={"file": ("documents.txt", b"\xe9\n")})
+    assert response.status_code == 400
+
+
+@patch("main.search_tjsp", new_callable=AsyncMock)
+def test_search_max_processes(mock_search):
+    mock_search.return_value = {"count": 0, "details": [], "names": []}
+
+    capped = client.post("/search", json={"document": "12345678900", "max_processes": 10})
+    full = client.post("/search", json={"document": "12345678900"})
+
+    assert mock_search.await_args_list[0].kwargs["max_processes"] == 10
+    assert mock_search.await_args_list[1].kwargs["max_processes"] is None
+    assert capped.json()["cached"] is False
+    assert full.json()["cached"] is False  # a capped result never answers a full search
+    assert client.post("/search", json={"document": "1", "max_processes": 0}).status_code == 422
+
+
+@patch("main.enrich_processes", new_callable=AsyncMock)
+@patch("main.search_tjsp", new_callable=AsyncMock)
+def test_search_enrich(mock_search, mock_enrich):
+    listed = {"number": "1500000-00.2023.8.26.0050", "degree": "1º Grau", "link": "http://x"}
+    mock_search.return_value = {"count": 1, "details": [listed], "names": []}
+    mock_enrich.return_value = (
+        [{**listed, "classe": "Ação Penal", "partes": ["Réu: Fulano"]}],
+        {"enriched": 1, "failed": 0, "pending": 0},
+    )
+
+    response = client.post(
+        "/search", json={"document": "12345678900", "enrich": True, "enrich_budget": 5}
+    )
+
+    data = response.json()
+    assert mock_enrich.await_args.kwargs["budget"] == 5
+    assert data["processes"][0]["classe"] == "Ação Penal"
+    assert data["enrichment"] == {"enriched": 1, "failed": 0, "pending": 0}
@@ -0,0 +1,47 @@
+import asyncio
+
+import pytest
+
+from batch import parse_document_list, run_bounded
+
+
+def test_run_bounded_caps_concurrency_and_yields_as_completed():
+    async def scenario():
+        in_flight = 0
+        peak = 0
+
+        async def work(delay):
+            nonlocal in_flight, peak
+            in_flight += 1
+            peak = max(peak, in_flight)
+            await asyncio.sleep(delay)
+            in_flight -= 1
+            return delay
+
+        results = [r async for r in run_bounded([0.05, 0.01, 0.02, 0.01], work, 2)]
+        return peak, results
+
+    peak, results = asyncio.run(scenario())
+
+    assert peak == 2
+    assert sorted(results) == [0.01, 0.01, 0.02, 0.05]
+    assert results[-1] == 0.05  # the slow item does not hold back the others
+
+
+def test_run_bounded_propagates_unhandled_errors():
+    async def scenario():
+        async def work(item):
+            raise RuntimeError(item)
+
+        return [r async for r in run_bounded(["boom"], work, 1)]
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(scenario())
+
+
+def test_parse_document_list():
+    assert parse_document_list(" 123 \n\n456\n", is_json=False) == ["123", "456"]
+    assert parse_document_list('["123", " "]', is_json=True) == ["123"]
+    assert parse_document_list('{"documents": ["123"]}', is_json=True) == ["123"]
+    with pytest.raises(ValueError):
+        parse_document_list('{"documents": [1]}', is_json=True)
@@ -0,0 +1,77 @@
+import asyncio
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+
+from browser_pool import BrowserPool, PoolSaturatedError
+
+
+def fake_browser():
+    browser = MagicMock()
+    browser.new_context = AsyncMock(return_value=AsyncMock())
+    browser.close = AsyncMock()
+    return browser
+
+
+def make_pool(max_concurrency, acquire_timeout, max_uses=0):
+    pool = BrowserPool(
+        max_concurrency=max_concurrency, acquire_timeout=acquire_timeout, max_uses=max_uses
+    )
+    pool._launch = AsyncMock(side_effect=lambda: fake_browser())  # type: ignore
+    return pool
+
+
+def test_pool_rejects_when_saturated():
+    async def scenario():
+        pool = make_pool(max_concurrency=1, acquire_timeout=0.05)
+        async with pool.context():
+            assert pool.stats()["in_use"] == 1
+            with pytest.raises(PoolSaturatedError):
+                async with pool.context():
+                    pass
+        assert pool.stats()["in_use"] == 0
+        assert pool.stats()["rejected"] == 1
+
+    asyncio.run(scenario())
+
+
+def test_pool_queues_until_slot_frees():
+    async def scenario():
+        pool = make_pool(max_concurrency=1, acquire_timeout=1.0)
+        order = []
+
+        async def worker(name):
+            async with pool.context():
+                order.append(name)
+                await asyncio.sleep(0.01)
+
+        await asyncio.gather(worker("a"), worker("b"))
+        assert order == ["a", "b"]
+
+    asyncio.run(scenario())
+
+
+def test_browser_recycled_after_max_uses_once_drained():
+    async def scenario():
+        pool = make_pool(max_concurrency=4, acquire_timeout=1.0, max_uses=2)
+        async with pool.context():
+            first = pool.current.browser
+            async with pool.context():
+                # Second use retires it; it stays open for the pages in flight
+                assert pool.current is None
+                assert pool.stats()["draining"] == 1
+            async with pool.context():
+                second = pool.current.browser
+            first.close.assert_not_awaited()
+        await asyncio.sleep(0)
+        first.close.assert_awaited_once()
+        assert second is not first
+        assert pool.stats()["draining"] == 0
+        assert pool.stats()["launches"] == 2
+        assert pool.stats()["recycles"] == {"uses": 1}
+
+        assert pool.recycle("memory")
+        await pool.stop()
+        second.close.assert_awaited_once()
+
+    asyncio.run(scenario())
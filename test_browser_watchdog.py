@@ -0,0 +1,103 @@
+import asyncio
+import os
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from browser_pool import BrowserPool
+from browser_watchdog import MB, PAGE_SIZE, BrowserWatchdog, ProcessInfo, read_processes
+
+OWN_PID = 100
+
+
+def table(*rows):
+    return {pid: ProcessInfo(pid, ppid, name, rss_mb * MB, pid) for pid, ppid, name, rss_mb in rows}
+
+
+# This process -> Playwright driver -> Chromium and its renderers, plus a job
+# worker process with a browser of its own
+PROCESSES = [
+    (OWN_PID, 1, "python", 80),
+    (200, OWN_PID, "node", 40),
+    (300, 200, "chrome", 100),
+    (301, 300, "chrome", 300),
+    (302, 300, "chrome", 200),
+    (400, OWN_PID, "python", 80),
+    (401, 400, "node", 40),
+    (402, 401, "headless_shell", 900),
+]
+
+
+def make_pool():
+    pool = BrowserPool(max_concurrency=2, acquire_timeout=1.0, max_uses=0)
+    browser = MagicMock()
+    browser.new_context = AsyncMock(return_value=AsyncMock())
+    browser.close = AsyncMock()
+    pool._launch = AsyncMock(return_value=browser)  # type: ignore
+    return pool
+
+
+def test_read_processes(tmp_path):
+    for pid, stat, statm in [
+        ("42", "42 (headless shell) S 7 42 42 0 -1 " + "0 " * 13 + "987 0 0", "100 25 0"),
+        ("43", "garbage", ""),
+    ]:
+        (tmp_path / pid).mkdir()
+        (tmp_path / pid / "stat").write_text(stat)
+        (tmp_path / pid / "statm").write_text(statm)
+    (tmp_path / "self").mkdir()
+
+    processes = read_processes(str(tmp_path))
+    assert list(processes) == [42]
+    assert processes[42].name == "headless shell"
+    assert processes[42].ppid == 7
+    assert processes[42].started == 987
+    assert processes[42].rss == 25 * PAGE_SIZE
+    assert read_processes(str(tmp_path / "missing")) == {}
+
+    if os.path.isdir("/proc"):
+        assert read_processes()[os.getpid()].ppid == os.getppid()
+
+
+def test_memory_is_tracked_and_large_browsers_recycled():
+    async def scenario():
+        pool = make_pool()
+        watchdog = BrowserWatchdog(pool, max_rss_mb=500)
+        async with pool.context():
+            watchdog.inspect(table(*PROCESSES), own_pid=OWN_PID)
+            retired = pool.stats()["draining"]
+        await pool.stop()
+        return watchdog, retired
+
+    watchdog, retired = asyncio.run(scenario())
+    stats = watchdog.stats()
+    # The worker's browser is not counted
+    assert stats["rss_mb"] == 600
+    assert stats["current_browser_rss_mb"] == 600
+    assert stats["peak_rss_mb"] == 600
+    assert retired == 1
+
+
+def test_fresh_browser_is_not_recycled():
+    async def scenario():
+        pool = make_pool()
+        await pool._get_browser()
+        watchdog = BrowserWatchdog(pool, max_rss_mb=500)
+        watchdog.inspect(table(*PROCESSES), own_pid=OWN_PID)
+        return pool.stats()
+
+    stats = asyncio.run(scenario())
+    assert stats["recycles"] == {}
+
+
+def test_orphans_are_killed():
+    watchdog = BrowserWatchdog(make_pool(), max_rss_mb=0)
+    watchdog.inspect(table(*PROCESSES), own_pid=OWN_PID)
+
+    # The browser crashed: its renderers were reparented to init
+    crashed = [row for row in PROCESSES if row[0] != 300]
+    crashed = [(pid, 1 if ppid == 300 else ppid, name, rss) for pid, ppid, name, rss in crashed]
+    with patch("browser_watchdog.os.kill") as kill:
+        watchdog.inspect(table(*crashed), own_pid=OWN_PID)
+    assert sorted(call.args[0] for call in kill.call_args_list) == [301, 302]
+    assert watchdog.stats()["orphans_killed"] == 2
+    assert watchdog.stats()["rss_mb"] == 0
+    assert watchdog.stats()["peak_rss_mb"] == 600
@@ -0,0 +1,71 @@
+import asyncio
+import time
+import uuid
+
+from cache import EMPTY, ERROR, POSITIVE, ResultCache, classify
+from database import get_cached_result, save_cached_result
+
+
+def test_classify():
+    assert classify({"count": 2, "details": [], "names": []}) == POSITIVE
+    assert classify({"count": 0, "details": [], "names": []}) == EMPTY
+    assert classify({"error": "Timeout"}) == ERROR
+    assert classify({"count": 1, "errors": ["Timeout"]}) == ERROR
+    assert classify({"found": True, "name": "Fulano"}) == POSITIVE
+
+
+def test_lru_eviction():
+    async def scenario():
+        cache = ResultCache("test", max_entries=2, persistent=False)
+        await cache.set("a", {"count": 1})
+        await cache.set("b", {"count": 1})
+        assert await cache.get("a") is not None  # "a" becomes most recent
+        await cache.set("c", {"count": 1})
+        assert await cache.get("b") is None
+        assert await cache.get("a") is not None
+        assert cache.stats()["evictions"] == 1
+
+    asyncio.run(scenario())
+
+
+def test_ttl_per_kind():
+    async def scenario():
+        cache = ResultCache("test", ttl_positive=60, ttl_error=60, persistent=False)
+        entry = await cache.set("a", {"error": "Timeout"})
+        assert entry.kind == ERROR
+        assert await cache.get("a") is not None
+
+        cache.ttls[ERROR] = 0.5
+        entry.stored_at = time.time() - 1
+        assert await cache.get("a") is None
+
+    asyncio.run(scenario())
+
+
+def test_persistent_tier_survives_restart():
+    async def scenario():
+        namespace = f"test-{uuid.uuid4()}"
+        await ResultCache(namespace, persistent=True).set("a", {"count": 3})
+
+        restarted = ResultCache(namespace, persistent=True)
+        entry = await restarted.get("a")
+        assert entry is not None
+        assert entry.value == {"count": 3}
+
+    asyncio.run(scenario())
+
+
+def test_persistent_tier_is_pruned():
+    async def scenario():
+        namespace = f"test-{uuid.uuid4()}"
+        save_cached_result(namespace, "expired", ERROR, {"error": "Timeout"}, time.time() - 120)
+        cache = ResultCache(namespace, ttl_error=60, persistent=True, persistent_max_entries=2)
+        for key in ("a", "b", "c"):
+            await cache.set(key, {"count": 1})  # the first write prunes the expired row
+        await cache.prune(force=True)  # then "a" is one row too many
+
+        stored = {key: get_cached_result(namespace, key) for key in ("expired", "a", "b", "c")}
+        assert [key for key, row in stored.items() if row is not None] == ["b", "c"]
+        assert cache.stats()["pruned"] == 2
+
+    asyncio.run(scenario())
@@ -0,0 +1,53 @@
+from datetime import datetime
+
+from database import (
+    _stat_deltas,
+    get_request_stats,
+    get_total_requests,
+    insert_request_logs,
+    request_log_row,
+)
+
+
+def test_stat_deltas_per_status_day_and_degree():
+    processes = [
+        {"number": "1", "degree": "1º Grau"},
+        {"number": "2", "degree": "1º Grau"},
+        {"number": "3", "degree": "2º Grau"},
+    ]
+    rows = [
+        request_log_row("a", "success", 3, processes, ["FULANO"]),
+        request_log_row("b", "failed"),
+    ]
+    rows[1]["timestamp"] = datetime(2024, 1, 2, 10)
+    deltas = _stat_deltas(rows)
+
+    assert deltas[("all", "")] == {"requests": 2, "success": 1, "failed": 1, "records": 3}
+    assert deltas[("status", "failed")] == {"requests": 1, "failed": 1, "records": 0}
+    assert deltas[("day", "2024-01-02")]["requests"] == 1
+    assert deltas[("degree", "1º Grau")] == {"requests": 1, "records": 2}
+    assert deltas[("degree", "2º Grau")] == {"requests": 1, "records": 1}
+
+
+def test_stats_are_updated_with_the_log_insert():
+    before = get_request_stats()
+    insert_request_logs(
+        [
+            request_log_row("a", "success", 4, [{"number": "1", "degree": "2º Grau"}]),
+            request_log_row("b", "success", 0),
+            request_log_row("c", "failed"),
+        ]
+    )
+    after = get_request_stats()
+
+    assert after["total"] - before["total"] == 3
+    assert after["success"] - before["success"] == 2
+    assert after["failed"] - before["failed"] == 1
+    assert get_total_requests() == after["total"]
+    today = datetime.utcnow().date().isoformat()
+    assert (
+        after["by_day"][today]["requests"] - before["by_day"].get(today, {}).get("requests", 0) == 3
+    )
+    degree_before = before["by_degree"].get("2º Grau", {"requests": 0, "processes": 0})
+    assert after["by_degree"]["2º Grau"]["requests"] - degree_before["requests"] == 1
+    assert after["by_degree"]["2º Grau"]["processes"] - degree_before["processes"] == 1
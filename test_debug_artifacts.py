@@ -0,0 +1,45 @@
+import asyncio
+from unittest.mock import AsyncMock, MagicMock
+
+from debug_artifacts import DebugArtifacts
+
+
+def fake_page(html="<html></html>"):
+    page = MagicMock()
+    page.content = AsyncMock(return_value=html)
+    page.screenshot = AsyncMock(return_value=b"\x89PNG")
+    return page
+
+
+def test_artifacts_are_uniquely_named_and_pruned(tmp_path):
+    artifacts = DebugArtifacts(str(tmp_path), sample_rate=1.0, min_interval=0.0, max_files=3)
+
+    async def scenario():
+        return [await artifacts.capture(fake_page(f"<p>{n}</p>"), "1º Grau") for n in range(5)]
+
+    paths = asyncio.run(scenario())
+    assert len(set(paths)) == 5
+    assert all(path.startswith(str(tmp_path / "1_Grau-")) for path in paths)
+    assert len(list(tmp_path.iterdir())) == 3
+    assert (tmp_path / paths[-1].split("/")[-1]).read_text() == "<p>4</p>"
+
+
+def test_screenshot_is_optional(tmp_path):
+    artifacts = DebugArtifacts(str(tmp_path), min_interval=0.0, screenshot=True)
+    path = asyncio.run(artifacts.capture(fake_page(), "portal"))
+    assert sorted(p.suffix for p in tmp_path.iterdir()) == [".html", ".png"]
+    assert path.endswith(".html")
+
+
+def test_sampling_and_failures(tmp_path):
+    assert (
+        asyncio.run(DebugArtifacts(str(tmp_path), sample_rate=0.0).capture(fake_page(), "x"))
+        is None
+    )
+
+    artifacts = DebugArtifacts(str(tmp_path), min_interval=0.0)
+    page = fake_page()
+    page.content = AsyncMock(side_effect=RuntimeError("Target closed"))
+    assert asyncio.run(artifacts.capture(page, "x")) is None
+    assert artifacts.stats()["failed"] == 1
+    assert list(tmp_path.iterdir()) == []
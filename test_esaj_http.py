@@ -0,0 +1,224 @@
+import asyncio
+from unittest.mock import AsyncMock, patch
+
+import httpx
+import pytest
+
+import scraper
+from esaj_http import EsajHttpEngine, UnexpectedMarkupError, parse_search_page
+from html_tree import parse_html
+
+LIST_PAGE = """
+<html><body>
+<div id="listagemDeProcessos">
+  <ul>
+    <li><div class="processoDetalhes">
+      <a class="linkProcesso" href="/cpopg/show.do?processo.codigo=AAA">
+        1500000-00.2023.8.26.0050</a>
+      <div class="nomeParte">Réu: FULANO DE TAL</div>
+    </div></li>
+    <li><div class="processoDetalhes">
+      <a class="linkProcesso" href="/cpopg/show.do?processo.codigo=BBB">
+        1500001-00.2023.8.26.0050</a>
+      <div>Indiciado: FULANO DE TAL Advogado: Beltrano</div>
+    </div></li>
+  </ul>
+</div>
+</body></html>
+"""
+
+DETAIL_PAGE = """
+<html><body>
+<span id="numeroProcesso">1500000-00.2023.8.26.0050</span>
+<span id="classeProcesso">Ação Penal - Procedimento Ordinário</span>
+<div id="areaProcesso"><span>Criminal</span></div>
+<span id="juizProcesso">Juiz Teste</span>
+<table id="tablePartesPrincipais">
+  <tr><td><span>Autor:</span></td><td>Justiça Pública</td></tr>
+  <tr><td><span>Réu:</span></td><td>Fulano de Tal<br>Advogado: Beltrano</td></tr>
+</table>
+<table><tbody id="tabelaTodasMovimentacoes">
+  <tr><td>02/01/2023</td><td></td><td>Recebida a denúncia
+      Decisão</td></tr>
+  <tr><td>01/01/2023</td><td></td><td>Distribuído</td></tr>
+</tbody></table>
+</body></html>
+"""
+
+
+def test_parse_no_results():
+    html = "<html><body>Não existem informações disponíveis para os parâmetros informados."
+    result = parse_search_page(html, "1º Grau", "https://esaj.tjsp.jus.br/cpopg/search.do")
+    assert result == {"count": 0, "details": [], "names": []}
+
+
+def test_parse_list_page():
+    result = parse_search_page(LIST_PAGE, "1º Grau", "https://esaj.tjsp.jus.br/cpopg/search.do")
+
+    assert result["count"] == 2
+    assert result["details"][0] == {
+        "number": "1500000-00.2023.8.26.0050",
+        "degree": "1º Grau",
+        "link": "https://esaj.tjsp.jus.br/cpopg/show.do?processo.codigo=AAA",
+    }
+    assert result["names"] == ["FULANO DE TAL"]
+
+
+def test_parse_detail_page():
+    url = "https://esaj.tjsp.jus.br/cpopg/show.do?processo.codigo=AAA"
+    result = parse_search_page(DETAIL_PAGE, "1º Grau", url)
+
+    assert result["count"] == 1
+    process = result["details"][0]
+    assert process["number"] == "1500000-00.2023.8.26.0050"
+    assert process["link"] == url
+    assert process["area"] == "Criminal"
+    assert process["assunto"] is None
+    assert process["partes"] == ["Autor: Justiça Pública", "Réu: Fulano de Tal"]
+    assert process["movimentacoes"] == [
+        "02/01/2023 - Recebida a denúncia Decisão",
+        "01/01/2023 - Distribuído",
+    ]
+    assert sorted(result["names"]) == ["Fulano de Tal", "Justiça Pública"]
+
+
+def test_text_collapses_wrapped_markup():
+    html = """
+    <div class="nomeParte">
+      <span>Réu:</span>
+      <span>FULANO
+         DE TAL</span><br>
+      <span>Advogado:</span> Beltrano
+    </div>
+    <div>Indiciado:\xa0CICLANO</div>
+    """
+    assert parse_html(html).text() == "Réu: FULANO DE TAL\nAdvogado: Beltrano\nIndiciado: CICLANO"
+
+
+def test_parse_list_page_with_wrapped_names():
+    html = LIST_PAGE.replace(
+        '<div class="nomeParte">Réu: FULANO DE TAL</div>',
+        """<div class="nomeParte">
+        <span>Réu:</span>
+        <span>FULANO
+          DE TAL</span>
+      </div>""",
+    )
+    result = parse_search_page(html, "1º Grau", "https://esaj.tjsp.jus.br/cpopg/search.do")
+    assert result["names"] == ["FULANO DE TAL"]
+
+
+def test_parse_unexpected_markup():
+    with pytest.raises(UnexpectedMarkupError):
+        parse_search_page("<html><form id='captcha'></form></html>", "1º Grau", "url")
+
+
+def test_engine_reuses_session():
+    requests = []
+
+    def handler(request):
+        requests.append(request)
+        if request.url.path.endswith("open.do"):
+            return httpx.Response(200, headers={"Set-Cookie": "JSESSIONID=abc; Path=/"})
+        return httpx.Response(200, text=LIST_PAGE)
+
+    async def scenario():
+        client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        engine = EsajHttpEngine(client=client)
+        await engine.search_degree("cpopg", "123.456.789-00", "1º Grau")
+        result = await engine.search_degree("cpopg", "123.456.789-00", "1º Grau")
+        await engine.close()
+        return result
+
+    result = asyncio.run(scenario())
+
+    assert result["count"] == 2
+    assert [r.url.path for r in requests] == [
+        "/cpopg/open.do",
+        "/cpopg/search.do",
+        "/cpopg/search.do",
+    ]
+    assert requests[1].url.params["dadosConsulta.valorConsulta"] == "12345678900"
+    assert requests[2].headers["Cookie"] == "JSESSIONID=abc"
+
+
+def test_search_tjsp_falls_back_to_browser():
+    browser_result = {"count": 0, "details": [], "names": []}
+    with (
+        patch.object(
+            scraper.http_engine, "search_degree", AsyncMock(side_effect=UnexpectedMarkupError("x"))
+        ),
+        patch.object(scraper, "_search_degree_pooled", AsyncMock(return_value=browser_result)) as b,
+    ):
+        result = asyncio.run(scraper.search_tjsp("12345678900", engine="http"))
+
+    assert b.await_count == 2
+    assert result == {"count": 0, "details": [], "names": [], "parties": []}
+
+
+def test_remaining_page_urls():
+    from parsing import remaining_page_urls
+
+    url = "https://esaj.tjsp.jus.br/cpopg/search.do?cbPesquisa=DOCPARTE"
+    hrefs = ["/cpopg/trocarPagina.do?paginaConsulta=2&conversationId="]
+
+    urls = remaining_page_urls(url, hrefs, 25, 60, None, 10)
+    assert urls == [
+        "https://esaj.tjsp.jus.br/cpopg/trocarPagina.do?conversationId=&paginaConsulta=2",
+        "https://esaj.tjsp.jus.br/cpopg/trocarPagina.do?conversationId=&paginaConsulta=3",
+    ]
+    assert len(remaining_page_urls(url, hrefs, 25, 60, 30, 10)) == 1  # max_processes
+    assert remaining_page_urls(url, hrefs, 25, 600, None, 2) == urls[:1]  # max_pages
+    assert remaining_page_urls(url, [], 25, 60, None, 10) == []
+
+
+def test_engine_fetches_remaining_pages():
+    def page(numbers, extra=""):
+        rows = "".join(
+            f'<tr class="fundoClaro"><td><a class="linkProcesso" href="/p/{n}">{n}</a></td></tr>'
+            for n in numbers
+        )
+        return f"<html><body>{extra}<table>{rows}</table></body></html>"
+
+    first = page(
+        ["1", "2"],
+        '<span id="contadorDeProcessos">3 Processos encontrados</span>'
+        '<a href="/cpopg/trocarPagina.do?paginaConsulta=2">2</a>',
+    )
+
+    def handler(request):
+        if request.url.path.endswith("trocarPagina.do"):
+            return httpx.Response(200, text=page(["3"]))
+        return httpx.Response(200, text=first)
+
+    async def scenario():
+        engine = EsajHttpEngine(client=httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+        return await engine.search_degree("cpopg", "123", "1º Grau")
+
+    result = asyncio.run(scenario())
+    assert result["count"] == 3
+    assert [d["number"] for d in result["details"]] == ["1", "2", "3"]
+    assert "errors" not in result
+
+
+def test_engine_reports_skipped_pages():
+    first = (
+        '<html><body><span id="contadorDeProcessos">3 Processos encontrados</span>'
+        '<a href="/cpopg/trocarPagina.do?paginaConsulta=2">2</a><table>'
+        '<tr class="fundoClaro"><td><a class="linkProcesso" href="/p/1">1</a></td></tr>'
+        '<tr class="fundoClaro"><td><a class="linkProcesso" href="/p/2">2</a></td></tr>'
+        "</table></body></html>"
+    )
+
+    def handler(request):
+        if request.url.path.endswith("trocarPagina.do"):
+            return httpx.Response(500)
+        return httpx.Response(200, text=first)
+
+    async def scenario():
+        engine = EsajHttpEngine(client=httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+        return await engine.search_degree("cpopg", "123", "1º Grau")
+
+    result = asyncio.run(scenario())
+    assert [d["number"] for d in result["details"]] == ["1", "2"]
+    assert result["errors"] == ["1º Grau: 1 of 2 result pages could not be read"]
@@ -0,0 +1,123 @@
+import uuid
+from datetime import datetime, timedelta
+from unittest.mock import patch
+
+from fastapi.testclient import TestClient
+
+import database
+from database import (
+    RequestLog,
+    RequestName,
+    RequestProcess,
+    SessionLocal,
+    _backfill_request_children,
+    insert_request_logs,
+    request_log_row,
+)
+from main import app
+
+client = TestClient(app)
+
+
+def log_rows(document, count, start):
+    rows = []
+    for i in range(count):
+        row = request_log_row(
+            document,
+            "success" if i % 2 == 0 else "failed",
+            1,
+            [{"number": f"{i:07d}-00.2023.8.26.0050", "degree": "1º Grau"}],
+            [f"NAME {i}"],
+        )
+        row["timestamp"] = start + timedelta(minutes=i)
+        rows.append(row)
+    insert_request_logs(rows)
+
+
+def test_history_keyset_pagination_and_filters():
+    document = f"hist-{uuid.uuid4()}"
+    start = datetime(2024, 3, 1, 12)
+    log_rows(document, 5, start)
+
+    page = client.get("/history", params={"document": document, "limit": 2}).json()
+    assert [item["names"] for item in page["items"]] == [["NAME 4"], ["NAME 3"]]
+    assert page["items"][0]["processes"] == [
+        {"number": "0000004-00.2023.8.26.0050", "degree": "1º Grau"}
+    ]
+
+    seen = [item["id"] for item in page["items"]]
+    while page["next_cursor"]:
+        page = client.get(
+            "/history", params={"document": document, "limit": 2, "cursor": page["next_cursor"]}
+        ).json()
+        seen += [item["id"] for item in page["items"]]
+    assert len(seen) == len(set(seen)) == 5
+
+    failed = client.get("/history", params={"document": document, "status": "failed"}).json()
+    assert len(failed["items"]) == 2
+
+    ranged = client.get(
+        "/history",
+        params={
+            "document": document,
+            "since": (start + timedelta(minutes=1)).isoformat(),
+            "until": (start + timedelta(minutes=3)).isoformat() + "Z",
+        },
+    ).json()
+    assert [item["names"] for item in ranged["items"]] == [["NAME 2"], ["NAME 1"]]
+
+    by_process = client.get("/history", params={"process": "00000030020238260050"}).json()
+    assert document in {item["document"] for item in by_process["items"]}
+
+
+def test_history_rejects_bad_cursor():
+    response = client.get("/history", params={"cursor": "not-a-cursor"})
+    assert response.status_code == 400
+
+
+def test_composite_index_exists():
+    indexes = {index.name for index in RequestLog.__table__.indexes}
+    assert "ix_requests_document_timestamp" in indexes
+    db = SessionLocal()
+    try:
+        plan = db.connection().exec_driver_sql(
+            "EXPLAIN QUERY PLAN SELECT * FROM requests WHERE document = 'x' "
+            "ORDER BY timestamp DESC"
+        )
+        assert "ix_requests_document_timestamp" in " ".join(str(row) for row in plan)
+    finally:
+        db.close()
+
+
+def test_children_backfill_runs_once_in_batches():
+    document = f"hist-{uuid.uuid4()}"
+    log_rows(document, 5, datetime(2024, 3, 1, 12))
+
+    def clear_children():
+        db = SessionLocal()
+        try:
+            db.query(RequestProcess).delete()
+            db.query(RequestName).delete()
+            db.commit()
+        finally:
+            db.close()
+
+    def children():
+        db = SessionLocal()
+        try:
+            return db.query(RequestProcess).count(), db.query(RequestName).count()
+        finally:
+            db.close()
+
+    # A database logged before the child tables existed
+    clear_children()
+    with database.engine.begin() as conn:
+        conn.exec_driver_sql("PRAGMA user_version=0")
+    with patch("database.BACKFILL_BATCH_SIZE", 2):
+        _backfill_request_children()
+    assert children() == (5, 5)
+
+    # Recorded as done: empty child tables are not refilled on the next start
+    clear_children()
+    _backfill_request_children()
+    assert children() == (0, 0)
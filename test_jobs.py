@@ -0,0 +1,201 @@
+import asyncio
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import AsyncMock, patch
+
+import httpx
+from fastapi.testclient import TestClient
+
+import config
+from cache import search_cache
+from database import claim_job, create_job, finish_job, get_job
+from jobs import JobPool, JobWorker, deliver_webhook, job_view, new_job_id, webhook_target_error
+from main import app, execute_job
+from retention import Retention
+
+client = TestClient(app)
+
+
+async def echo_job(job):
+    # Top-level so spawned worker processes can unpickle it
+    return {"document": job["document"], "worker": job["worker"]}
+
+
+def run_until_done(job_id, handler=execute_job):
+    async def drain():
+        worker = JobWorker(handler, "test-worker")
+        while await worker.run_once():
+            pass
+
+    asyncio.run(drain())
+    return client.get(f"/jobs/{job_id}").json()
+
+
+@patch("main.search_tjsp", new_callable=AsyncMock)
+def test_search_job(mock_search):
+    search_cache.clear()
+    mock_search.return_value = {"count": 0, "details": [], "names": []}
+
+    response = client.post("/jobs", json={"document": "98765432100", "no_cache": True})
+    assert response.status_code == 202
+    job = response.json()
+    assert job["status"] == "queued"
+    assert job["document"] == "987.654.321-00"
+
+    job = run_until_done(job["id"])
+    assert job["status"] == "done"
+    assert job["result"]["records_count"] == 0
+    assert job["result"]["status"] == "success"
+    assert job["started_at"] and job["finished_at"]
+
+
+@patch("main.search_portal_transparencia", new_callable=AsyncMock)
+def test_failed_person_job(mock_search):
+    mock_search.return_value = {"error": "portal down"}
+
+    job = client.post("/jobs", json={"document": "98765432199", "kind": "person"}).json()
+    job = run_until_done(job["id"])
+    assert job["status"] == "failed"
+    assert job["error"] == "portal down"
+    assert job["result"] is None
+
+
+def test_job_validation():
+    assert client.get("/jobs/missing").status_code == 404
+    assert client.post("/jobs", json={"document": " "}).status_code == 400
+    response = client.post("/jobs", json={"document": "1", "webhook": "ftp://x"})
+    assert response.status_code == 422
+
+
+def test_webhooks_to_internal_hosts_are_refused(monkeypatch):
+    for webhook in (
+        "http://127.0.0.1:8080/hook",
+        "http://localhost/hook",
+        "http://169.254.169.254/latest/meta-data",
+        "http://10.0.0.5/hook",
+        "http://[::1]/hook",
+    ):
+        response = client.post("/jobs", json={"document": "1", "webhook": webhook})
+        assert response.status_code == 400, webhook
+    assert webhook_target_error("http://93.184.216.34/hook") is None
+
+    # Allowed hosts skip the address check
+    monkeypatch.setattr(config, "JOB_WEBHOOK_ALLOWED_HOSTS", ["127.0.0.1"])
+    assert webhook_target_error("http://127.0.0.1:8080/hook") is None
+
+    # Delivery checks again: nothing is sent to a host that now resolves privately
+    job = create_job(new_job_id(), "search", "x", {}, webhook="http://10.0.0.5/hook")
+    hook_client = AsyncMock()
+    status = asyncio.run(deliver_webhook(job, hook_client))
+    assert status == "webhook host 10.0.0.5 is not a public address"
+    hook_client.post.assert_not_called()
+
+
+def test_job_counts_and_purge(tmp_path):
+    running, done, queued = [create_job(new_job_id(), "search", "x", {})["id"] for _ in range(3)]
+    assert claim_job("w")["id"] == running
+    finish_job(done, result={})
+
+    assert client.get("/status").json()["jobs"]["queue"] == {"queued": 1, "running": 1}
+    assert client.get("/jobs").json() == {"jobs": {"queued": 1, "running": 1, "done": 1}}
+
+    retention = Retention(max_age_days=0, archive_dir=str(tmp_path), job_max_age_days=1)
+    result = retention.run(now=datetime.utcnow() + timedelta(days=2))
+    assert result["jobs_purged"] == 1
+    assert get_job(done) is None
+    assert get_job(running) and get_job(queued)
+
+
+def test_claim_is_exclusive():
+    ids = [create_job(new_job_id(), "search", "x", {})["id"] for _ in range(5)]
+    with ThreadPoolExecutor(8) as executor:
+        claimed = list(executor.map(lambda n: claim_job(f"w{n}"), range(8)))
+    claimed_ids = [job["id"] for job in claimed if job]
+    assert len(claimed_ids) == len(set(claimed_ids))
+    assert set(ids) <= set(claimed_ids)
+    assert get_job(ids[0])["status"] == "running"
+
+
+def test_webhook_retries(monkeypatch):
+    monkeypatch.setattr(config, "JOB_WEBHOOK_ALLOWED_HOSTS", ["hook.test"])
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        return httpx.Response(503 if len(calls) == 1 else 200)
+
+    job = create_job(new_job_id(), "search", "x", {}, webhook="http://hook.test/jobs")
+
+    async def scenario():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as hook_client:
+            with patch("jobs.asyncio.sleep", new_callable=AsyncMock):
+                return await deliver_webhook(job, hook_client)
+
+    assert asyncio.run(scenario()) == "delivered"
+    assert len(calls) == 2
+    assert calls[1].read() == httpx.Response(200, json=job_view(job)).read()
+
+
+@contextmanager
+def webhook_receiver():
+    """A local HTTP endpoint recording the JSON bodies POSTed to it."""
+    received = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            received.append(json.loads(self.rfile.read(int(self.headers["Content-Length"]))))
+            self.send_response(204)
+            self.end_headers()
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f"http://127.0.0.1:{server.server_port}/jobs", received
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_worker_processes(monkeypatch):
+    # Worker processes cannot see patches made here: their webhooks go to a local
+    # receiver, which they accept through the environment
+    monkeypatch.setenv("JOB_WEBHOOK_ALLOWED_HOSTS", "127.0.0.1")
+    with webhook_receiver() as (webhook, received):
+        webhooks = [webhook, webhook, None, None]
+        ids = [
+            create_job(new_job_id(), "search", f"doc-{n}", {}, webhook=hook)["id"]
+            for n, hook in enumerate(webhooks)
+        ]
+
+        async def scenario():
+            pool = JobPool(workers=2, concurrency=1, poll_interval=0.05)
+            pool.start(echo_job)
+            try:
+                deadline = time.monotonic() + 60
+                while time.monotonic() < deadline:
+                    jobs = [get_job(job_id) for job_id in ids]
+                    if all(job["status"] == "done" for job in jobs) and all(
+                        job["webhook_status"] for job in jobs[:2]
+                    ):
+                        return jobs, pool.stats()
+                    await asyncio.sleep(0.1)
+                raise AssertionError("jobs not finished")
+            finally:
+                await pool.stop()
+
+        jobs, stats = asyncio.run(scenario())
+
+    assert stats["alive"] == 2
+    assert [job["result"]["document"] for job in jobs] == [f"doc-{n}" for n in range(4)]
+    assert all(job["result"]["worker"].startswith("worker-") for job in jobs)
+    assert [job["webhook_status"] for job in jobs] == ["delivered", "delivered", None, None]
+    assert sorted(body["document"] for body in received) == ["doc-0", "doc-1"]
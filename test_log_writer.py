@@ -0,0 +1,49 @@
+import uuid
+from unittest.mock import patch
+
+from database import SessionLocal, RequestLog
+from log_writer import LogWriter
+
+
+def rows_for(document):
+    db = SessionLocal()
+    try:
+        return db.query(RequestLog).filter_by(document=document).all()
+    finally:
+        db.close()
+
+
+def test_rows_are_written_in_batches_and_drained_on_stop():
+    writer = LogWriter(batch_size=3, flush_interval=0.05, max_queue=100)
+    document = f"test-{uuid.uuid4()}"
+    for i in range(7):
+        writer.log(document, "success", i, [{"number": str(i)}], ["FULANO"])
+    writer.stop()
+
+    rows = rows_for(document)
+    assert len(rows) == 7
+    assert sorted(row.records_count for row in rows) == list(range(7))
+    stats = writer.stats()
+    assert stats["written"] == 7
+    assert stats["batches"] >= 3
+    assert stats["queue_depth"] == 0
+
+
+def test_full_queue_drops_rows():
+    writer = LogWriter(max_queue=1)
+    with patch.object(writer, "_ensure_started"):  # no thread draining the queue
+        assert writer.log("a", "success") is True
+        assert writer.log("b", "success") is False
+    assert writer.stats()["dropped"] == 1
+    assert writer.stats()["queue_depth"] == 1
+
+
+def test_failed_insert_is_counted():
+    writer = LogWriter(batch_size=10, flush_interval=0.01)
+    with patch("log_writer.insert_request_logs", side_effect=RuntimeError("locked")):
+        writer.log("a", "failed")
+        writer.log("b", "failed")
+        writer.flush()
+    writer.stop()
+    assert writer.stats()["failed"] == 2
+    assert writer.stats()["written"] == 0
@@ -0,0 +1,73 @@
+import asyncio
+from unittest.mock import patch
+
+import pytest
+from fastapi.testclient import TestClient
+
+import metrics
+from main import app
+from metrics import Counter, Histogram
+
+client = TestClient(app)
+
+
+def test_histogram_renders_cumulative_buckets():
+    histogram = Histogram("t_seconds", "Test.", ("stage",), buckets=(0.1, 1.0))
+    histogram.observe(0.05, stage="a")
+    histogram.observe(0.5, stage="a")
+    histogram.observe(5, stage="a")
+    text = histogram.render()
+
+    assert "# TYPE t_seconds histogram" in text
+    assert 't_seconds_bucket{stage="a",le="0.1"} 1' in text
+    assert 't_seconds_bucket{stage="a",le="1"} 2' in text
+    assert 't_seconds_bucket{stage="a",le="+Inf"} 3' in text
+    assert 't_seconds_count{stage="a"} 3' in text
+
+
+def test_counter_escapes_label_values():
+    counter = Counter("t_total", "Test.", ("degree",))
+    counter.inc(degree='1º "Grau"')
+    assert 't_total{degree="1º \\"Grau\\""} 1' in counter.render()
+
+
+def test_stage_labels_timeouts_and_breakdown():
+    async def timed():
+        with metrics.labels(source="tjsp", degree="2º Grau"):
+            with metrics.stage("form"):
+                await asyncio.sleep(0)
+            with pytest.raises(asyncio.TimeoutError):
+                with metrics.stage("networkidle"):
+                    raise asyncio.TimeoutError()
+
+    before = metrics.TIMEOUTS.value(stage="networkidle", source="tjsp", degree="2º Grau")
+    with metrics.collect_timings() as timings:
+        asyncio.run(timed())
+
+    assert [t["stage"] for t in timings] == ["form", "networkidle"]
+    assert timings[0]["source"] == "tjsp" and timings[0]["degree"] == "2º Grau"
+    after = metrics.TIMEOUTS.value(stage="networkidle", source="tjsp", degree="2º Grau")
+    assert after == before + 1
+
+
+def test_search_timings_and_metrics_endpoint():
+    async def fake_search(document, **kwargs):
+        with metrics.labels(source="tjsp", degree="1º Grau"):
+            with metrics.stage("goto"):
+                pass
+            metrics.count_no_results()
+        return {"count": 0, "details": [], "names": []}
+
+    with patch("main.search_tjsp", side_effect=fake_search):
+        response = client.post("/search", json={"document": "111.222.333-44", "timings": True})
+        plain = client.post("/search", json={"document": "111.222.333-45"})
+
+    timings = response.json()["timings"]
+    assert timings[0]["stage"] == "goto" and timings[0]["degree"] == "1º Grau"
+    assert plain.json()["timings"] is None
+
+    text = client.get("/metrics").text
+    assert 'scraper_stage_seconds_count{stage="goto",source="tjsp",degree="1º Grau"}' in text
+    assert 'scraper_no_results_total{source="tjsp",degree="1º Grau"}' in text
+    assert 'api_request_seconds_count{method="POST",path="/search",status="200"}' in text
+    assert 'app_state{component="browser_pool",field="in_use"}' in text
@@ -0,0 +1,31 @@
+from party_names import Party, PartyNameExtractor, build_roles, extractor
+
+
+def test_parties_with_roles_and_lawyer_suffix():
+    text = (
+        "1500000-00.2023.8.26.0050\nRéu: FULANO DE TAL Advogado: Beltrano\nAutora: Justiça Pública"
+    )
+    assert extractor.parties(text) == [
+        Party("Réu", "FULANO DE TAL"),
+        Party("Autor", "Justiça Pública"),
+    ]
+
+
+def test_several_labels_on_one_line_and_no_duplicates():
+    text = "Reqte: MARIA Reqdo: JOÃO\nreqte: MARIA"
+    assert extractor.parties(text) == [Party("Requerente", "MARIA"), Party("Requerido", "JOÃO")]
+
+
+def test_labels_inside_words_are_ignored():
+    # "Autor:" must not match inside "Coautor:" and "Ré:" must not shadow "Réu:"
+    assert extractor.names("Coautor: ALGUÉM\nRéu: FULANO") == {"FULANO"}
+
+
+def test_custom_roles():
+    custom = PartyNameExtractor(build_roles(["Vítima", "Assistente=Assistente de Acusação"]))
+    assert custom.parties("Vítima: A\nAssistente: B") == [
+        Party("Vítima", "A"),
+        Party("Assistente de Acusação", "B"),
+    ]
+    assert custom.canonical_role("Reqte:") == "Requerente"
+    assert custom.canonical_role(" Testemunha: ") == "Testemunha"
@@ -0,0 +1,117 @@
+import asyncio
+from unittest.mock import AsyncMock, patch
+
+import httpx
+from fastapi.testclient import TestClient
+
+import scraper
+from cache import person_cache
+from main import app
+from parsing import portal_name
+from portal_http import PortalHttpEngine
+
+RESULTS_PAGE = """
+<html><body><ul id="resultados">
+  <li><div class="busca-portal-block-searchs__item">
+    <a href="/busca/pessoa-fisica/123-fulano">Pessoa Física: ***.104.236-** - ANA-MARIA SILVA</a>
+  </div></li>
+</ul></body></html>
+"""
+
+PERSON_PAGE = """
+<html><body><section>
+  <div><strong>Nome</strong>
+  <span>ANA-MARIA SILVA</span></div>
+  <div><strong>Localidade</strong>
+  <span>SÃO PAULO - SP</span></div>
+</section></body></html>
+"""
+
+
+def lookup(handler, location=True):
+    requests = []
+
+    def recording(request):
+        requests.append(request)
+        return handler(request)
+
+    async def scenario():
+        client = httpx.AsyncClient(transport=httpx.MockTransport(recording))
+        engine = PortalHttpEngine(base_url="https://portal.test", client=client)
+        try:
+            return await engine.search("123.456.789-00", location)
+        finally:
+            await engine.close()
+
+    return asyncio.run(scenario()), requests
+
+
+def portal(request):
+    if request.url.path == "/busca/resultado":
+        return httpx.Response(200, text=RESULTS_PAGE)
+    return httpx.Response(200, text=PERSON_PAGE)
+
+
+def test_name_and_location():
+    result, requests = lookup(portal)
+    assert result == {
+        "found": True,
+        "name": "ANA-MARIA SILVA",
+        "location": "SÃO PAULO - SP",
+        "source": "Portal da Transparência",
+    }
+    assert requests[0].url.params["termo"] == "12345678900"
+    assert requests[1].url == "https://portal.test/busca/pessoa-fisica/123-fulano"
+
+
+def test_name_only_skips_the_person_page():
+    result, requests = lookup(portal, location=False)
+    assert result["name"] == "ANA-MARIA SILVA"
+    assert result["location"] is None
+    assert len(requests) == 1
+
+
+def test_not_found():
+    result, _ = lookup(lambda request: httpx.Response(200, text='<ul id="resultados"></ul>'))
+    assert result == {"found": False, "name": None, "location": None}
+
+
+def test_portal_name():
+    assert portal_name("Pessoa Física: ***.104.236-** - FULANO DE TAL") == "FULANO DE TAL"
+    assert portal_name("FULANO") is None
+
+
+@patch("scraper._search_portal", new_callable=AsyncMock)
+def test_unexpected_markup_falls_back_to_browser(mock_browser):
+    mock_browser.return_value = {"found": False, "name": None, "location": None}
+    engine = PortalHttpEngine(
+        base_url="https://portal.test",
+        client=httpx.AsyncClient(
+            transport=httpx.MockTransport(lambda request: httpx.Response(200, text="<p>?</p>"))
+        ),
+    )
+    with patch("scraper.portal_engine", engine):
+        result = asyncio.run(
+            scraper.search_portal_transparencia("12345678900", fields=["name"], engine="http")
+        )
+    assert result["found"] is False
+    assert engine.fallbacks == 1
+    mock_browser.assert_awaited_once_with("12345678900", False)
+
+
+@patch("main.search_portal_transparencia", new_callable=AsyncMock)
+def test_full_lookup_answers_name_only_requests(mock_search):
+    person_cache.clear()
+    mock_search.return_value = {"found": True, "name": "FULANO", "location": "SP"}
+    client = TestClient(app)
+
+    client.post("/search-person", json={"document": "12345678955"})
+    response = client.post("/search-person", json={"document": "12345678955", "fields": ["name"]})
+    assert response.json()["cached"] is True
+    assert mock_search.await_count == 1
+
+    # A name-only result does not answer a request for the location
+    client.post("/search-person", json={"document": "12345678966", "fields": ["name"]})
+    client.post("/search-person", json={"document": "12345678966"})
+    assert mock_search.await_count == 3
+    assert mock_search.await_args_list[1].kwargs["fields"] == ["name"]
@@ -0,0 +1,49 @@
+import asyncio
+import uuid
+from datetime import datetime, timedelta
+from unittest.mock import AsyncMock, patch
+
+import scraper
+from database import save_process_details
+from process_store import ProcessStore, process_key
+
+
+def unique_number():
+    return f"{uuid.uuid4().int % 10**7:07d}-00.2023.8.26.0050"
+
+
+def test_process_key_ignores_formatting():
+    assert process_key("1500000-00.2023.8.26.0050") == "15000000020238260050"
+
+
+def test_store_round_trip_and_staleness():
+    async def scenario():
+        store = ProcessStore(max_age=3600)
+        number = unique_number()
+        assert await store.get(number) is None
+
+        await store.save(number, {"classe": "Ação Penal", "partes": [], "link": "ignored"})
+        details = await store.get(number.replace("-", "").replace(".", ""))
+        assert details["classe"] == "Ação Penal"
+        assert "link" not in details
+
+        stale = unique_number()
+        save_process_details(process_key(stale), {"classe": "x"}, datetime.utcnow() - timedelta(2))
+        assert await store.get(stale) is None
+        return store.stats()
+
+    stats = asyncio.run(scenario())
+    assert stats["hits"] == 1
+    assert stats["misses"] == 2
+
+
+def test_fetch_process_details_reads_store_before_navigating():
+    number = unique_number()
+    details = {"classe": "Ação Penal", "partes": ["Réu: Fulano"]}
+
+    with patch.object(scraper.http_engine, "fetch_details", AsyncMock(return_value=details)) as f:
+        first = asyncio.run(scraper.fetch_process_details("http://x", "http", number))
+        second = asyncio.run(scraper.fetch_process_details("http://x", "http", number))
+
+    assert f.await_count == 1
+    assert first["classe"] == second["classe"] == "Ação Penal"
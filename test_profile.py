@@ -0,0 +1,107 @@
+import asyncio
+import json
+from unittest.mock import patch
+
+from fastapi.testclient import TestClient
+
+from cache import person_cache, search_cache
+from main import app
+
+client = TestClient(app)
+
+
+def fake_sources(portal_delay=0.0, degree_delays=None, failing=()):
+    degree_delays = degree_delays or {}
+
+    async def portal(document, fields=None, engine=None):
+        await asyncio.sleep(portal_delay)
+        return {"name": "FULANO DE TAL", "document": document}
+
+    async def degree(system, document, engine=None, max_processes=None):
+        await asyncio.sleep(degree_delays.get(system, 0.0))
+        if system in failing:
+            return {"error": "Timeout error", "count": 0, "details": [], "names": []}
+        number = f"{system}-1"
+        return {
+            "count": 1,
+            "details": [{"number": number, "degree": system, "link": f"http://x/{number}"}],
+            "names": ["FULANO DE TAL"],
+        }
+
+    return (
+        patch("main.search_portal_transparencia", side_effect=portal),
+        patch("main.search_tjsp_degree", side_effect=degree),
+    )
+
+
+def clear_caches():
+    search_cache.clear()
+    person_cache.clear()
+
+
+def test_profile_runs_sources_concurrently():
+    clear_caches()
+    portal, degree = fake_sources(portal_delay=0.3, degree_delays={"cpopg": 0.3, "cposg": 0.3})
+    with portal as mock_portal, degree as mock_degree:
+        response = client.post("/profile", json={"document": "12345678900"})
+
+    assert response.status_code == 200
+    body = response.json()
+    assert body["status"] == "complete"
+    assert list(body["sources"]) == ["portal", "tjsp_1", "tjsp_2"]
+    assert body["sources"]["portal"]["result"]["data"]["name"] == "FULANO DE TAL"
+    assert body["sources"]["tjsp_2"]["result"]["processes"][0]["number"] == "cposg-1"
+    # Started together: each source finished in about one delay, not the sum
+    assert all(source["seconds"] < 0.6 for source in body["sources"].values())
+    assert mock_portal.await_count == 1
+    assert mock_degree.await_count == 2
+
+
+def test_profile_deadline_leaves_slow_sources_pending():
+    clear_caches()
+    portal, degree = fake_sources(portal_delay=2.0, failing=("cposg",))
+    with portal, degree:
+        body = client.post("/profile", json={"document": "12345678901", "deadline": 0.3}).json()
+
+    assert body["status"] == "partial"
+    assert body["sources"]["portal"]["status"] == "pending"
+    assert body["sources"]["tjsp_1"]["status"] == "done"
+    assert body["sources"]["tjsp_2"] == {
+        "source": "tjsp_2",
+        "status": "failed",
+        "result": None,
+        "error": "Timeout error",
+        "seconds": None,
+    }
+
+
+def test_profile_streams_sources_as_they_finish():
+    clear_caches()
+    portal, degree = fake_sources(degree_delays={"cpopg": 0.2, "cposg": 0.4})
+    with portal, degree:
+        response = client.post(
+            "/profile",
+            json={"document": "12345678902"},
+            headers={"Accept": "text/event-stream"},
+        )
+
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = [
+        (block.split("\n")[0][len("event: ") :], json.loads(block.split("\n")[1][len("data: ") :]))
+        for block in response.text.strip().split("\n\n")
+    ]
+    assert [event for event, _ in events] == ["source", "source", "source", "done"]
+    assert [data["source"] for _, data in events[:3]] == ["portal", "tjsp_1", "tjsp_2"]
+    assert events[-1][1] == {"document": "123.456.789-02", "status": "complete"}
+
+
+def test_profile_degrees_are_cached():
+    clear_caches()
+    portal, degree = fake_sources()
+    with portal, degree as mock_degree:
+        client.post("/profile", json={"document": "12345678903"})
+        body = client.post("/profile", json={"document": "12345678903"}).json()
+
+    assert mock_degree.await_count == 2
+    assert body["sources"]["tjsp_1"]["result"]["cached"] is True
+    assert client.post("/profile", json={"document": " "}).status_code == 400
@@ -0,0 +1,127 @@
+import asyncio
+import time
+from unittest.mock import patch
+
+import httpx
+import pytest
+
+import metrics
+from esaj_http import EsajHttpEngine, UnexpectedMarkupError
+from rate_limit import HostLimiter, TokenBucket, UpstreamLimiters, process_share, retry_after
+
+
+def limiter(**settings):
+    defaults = dict(
+        host="test.local",
+        rate=0,
+        burst=1,
+        max_concurrency=8,
+        initial_concurrency=2,
+        min_concurrency=1,
+        latency_target=1.0,
+        backoff=0.5,
+        cooldown=60.0,
+    )
+    return HostLimiter(**{**defaults, **settings})
+
+
+def test_token_bucket():
+    bucket = TokenBucket(rate=10, burst=2)
+    assert bucket.reserve() == 0
+    assert bucket.reserve() == 0
+    assert bucket.reserve() == pytest.approx(0.1, abs=0.02)
+    assert TokenBucket(rate=0, burst=1).reserve() == 0
+
+
+def test_retry_after():
+    assert retry_after("3") == 3.0
+    assert retry_after("Wed, 21 Oct 2015 07:28:00 GMT") is None
+    assert retry_after(None) is None
+
+
+def test_limits_are_split_between_processes():
+    # The API plus two job workers share the configured totals
+    assert process_share(3, rate=6.0, burst=10, max_concurrency=16) == {
+        "rate": 2.0,
+        "burst": 3,
+        "max_concurrency": 5,
+    }
+    assert process_share(3, rate=2.0, burst=2, max_concurrency=2)["max_concurrency"] == 1
+    assert process_share(0, rate=5.0, burst=10, max_concurrency=16)["rate"] == 5.0
+
+
+def test_concurrency_is_capped():
+    host = limiter(initial_concurrency=2)
+    peak = 0
+
+    async def request():
+        nonlocal peak
+        async with host.slot():
+            peak = max(peak, host.in_flight)
+            await asyncio.sleep(0.01)
+
+    async def scenario():
+        await asyncio.gather(*(request() for _ in range(6)))
+
+    asyncio.run(scenario())
+    assert peak == 2
+    assert host.in_flight == 0
+
+
+def test_aimd():
+    host = limiter(initial_concurrency=2)
+
+    async def scenario():
+        for _ in range(10):
+            async with host.slot():
+                pass
+        grown = host.limit
+        for _ in range(2):
+            with pytest.raises(asyncio.TimeoutError):
+                async with host.slot():
+                    raise asyncio.TimeoutError()
+        return grown
+
+    grown = asyncio.run(scenario())
+    assert grown > 4
+    # Two timeouts within the cooldown cut the limit once
+    assert host.limit == pytest.approx(grown * 0.5)
+    assert host.backoffs == 2
+    assert metrics.UPSTREAM_BACKOFFS.value(host="test.local", reason="timeout") >= 2
+
+
+def test_slow_responses_do_not_grow_the_limit():
+    host = limiter(latency_target=0.0)
+
+    async def scenario():
+        for _ in range(5):
+            async with host.slot():
+                await asyncio.sleep(0.001)
+
+    asyncio.run(scenario())
+    assert host.limit == 2
+
+
+def test_http_engine_backs_off_on_429():
+    upstream = UpstreamLimiters()
+    host = upstream.add("https://esaj.test", rate=0, burst=1, max_concurrency=8, cooldown=0)
+
+    def handler(request):
+        if request.url.path.endswith("open.do"):
+            return httpx.Response(200)
+        return httpx.Response(429, headers={"Retry-After": "0.05"})
+
+    async def scenario():
+        client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        engine = EsajHttpEngine(base_url="https://esaj.test", client=client)
+        with pytest.raises(UnexpectedMarkupError):
+            await engine.search_degree("cpopg", "123", "1º Grau")
+        await engine.close()
+
+    limit = host.limit
+    with patch("esaj_http.upstream", upstream):
+        asyncio.run(scenario())
+
+    assert host.limit < limit
+    assert host.paused_until > time.monotonic() - 1
+    assert "upstream_concurrency_limit" in metrics.registry.render()
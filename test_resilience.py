@@ -0,0 +1,176 @@
+import asyncio
+import time
+from unittest.mock import AsyncMock, patch
+
+import httpx
+from fastapi.testclient import TestClient
+
+import metrics
+from cache import search_cache
+from main import app
+from resilience import (
+    OPEN,
+    CircuitBreaker,
+    LatencyTracker,
+    Resilience,
+    UpstreamError,
+    error_kind,
+    http_error_kind,
+)
+from scraper import _search_degree_with_engine
+
+client = TestClient(app)
+
+
+def resilience(**settings):
+    defaults = dict(attempts=3, backoff=0.0, hedge=True, hedge_min_delay=0.0)
+    return Resilience(**{**defaults, **settings})
+
+
+def test_retry_recovers():
+    layer = resilience()
+    outcomes = [
+        {"error": "Timeout error", "error_kind": "timeout"},
+        {"count": 1, "details": [], "names": []},
+    ]
+
+    async def attempt():
+        return outcomes.pop(0)
+
+    result = asyncio.run(layer.run("https://site.test", "cpopg/http", attempt))
+    assert result["count"] == 1
+    assert "error" not in result
+    assert layer.retries == 1
+
+
+def test_retries_exhausted():
+    layer = resilience()
+    calls = []
+
+    async def attempt():
+        calls.append(1)
+        return {"error": f"failure {len(calls)}", "error_kind": "server"}
+
+    result = asyncio.run(layer.run("https://site.test", "cpopg/http", attempt))
+    assert len(calls) == 3
+    assert result["count"] == 0
+    assert result["error"] == "failure 3 (after 3 attempts; earlier: failure 1; failure 2)"
+
+
+def test_blocked_and_client_errors_are_not_retried():
+    layer = resilience()
+    for kind in ("blocked", "throttled", "client", "other"):
+        attempt = AsyncMock(return_value={"error": "refused", "error_kind": kind})
+        result = asyncio.run(layer.run("https://site.test", "cpopg/browser", attempt))
+        assert attempt.await_count == 1
+        assert result["error"] == "refused"
+    assert layer.retries == 0
+
+
+def test_error_kind():
+    assert error_kind(asyncio.TimeoutError()) == "timeout"
+    assert error_kind(httpx.ConnectError("refused")) == "connection"
+    assert error_kind(Exception("net::ERR_CONNECTION_RESET at https://site.test")) == "connection"
+    assert error_kind(UpstreamError("captcha", "blocked")) == "blocked"
+    assert error_kind(ValueError("bad page")) == "other"
+    assert [http_error_kind(status) for status in (429, 503, 500, 404)] == [
+        "throttled",
+        "throttled",
+        "server",
+        "client",
+    ]
+
+
+def test_latency_tracker():
+    tracker = LatencyTracker(window=10, percentile=90, min_samples=3)
+    tracker.observe(1.0)
+    tracker.observe(2.0)
+    assert tracker.threshold() is None
+    for seconds in range(3, 11):
+        tracker.observe(float(seconds))
+    assert tracker.threshold() == 10.0
+
+
+def test_hedge_wins_over_slow_attempt():
+    layer = resilience(attempts=1)
+    layer.trackers["cpopg/http"] = LatencyTracker(window=10, percentile=95, min_samples=3)
+    for _ in range(3):
+        layer.trackers["cpopg/http"].observe(0.01)
+    calls = []
+    cancelled = []
+
+    async def attempt():
+        calls.append(1)
+        if len(calls) == 1:
+            try:
+                await asyncio.sleep(5)
+            except asyncio.CancelledError:
+                cancelled.append(1)
+                raise
+        return {"count": len(calls), "details": [], "names": []}
+
+    started = time.monotonic()
+    with metrics.labels(source="tjsp", degree="1º Grau"):
+        result = asyncio.run(layer.run("https://site.test", "cpopg/http", attempt))
+    assert time.monotonic() - started < 1
+    assert result["count"] == 2
+    assert cancelled == [1]
+    assert layer.hedges == layer.hedge_wins == 1
+    assert metrics.HEDGES.value(source="tjsp", degree="1º Grau", winner="hedge") >= 1
+
+
+def test_circuit_breaker():
+    breaker = CircuitBreaker("site.test", failure_threshold=2, reset_timeout=0.05)
+    assert breaker.allow()
+    breaker.record(False)
+    assert breaker.allow()
+    breaker.record(False)
+    assert breaker.state == OPEN
+    assert not breaker.allow()
+
+    time.sleep(0.06)
+    # Half open: one probe at a time
+    assert breaker.allow()
+    assert not breaker.allow()
+    breaker.record(True)
+    assert breaker.state == "closed"
+    assert breaker.rejected == 2
+
+
+def test_open_circuit_fails_fast():
+    layer = resilience(attempts=1)
+    layer.breakers["https://site.test"] = CircuitBreaker("site.test", failure_threshold=1)
+    attempt = AsyncMock(return_value={"error": "Connection refused"})
+
+    asyncio.run(layer.run("https://site.test", "cpopg/http", attempt))
+    result = asyncio.run(layer.run("https://site.test", "cpopg/http", attempt))
+    assert attempt.await_count == 1
+    assert result["error"] == "circuit open for https://site.test"
+    assert layer.stats()["circuits"]["https://site.test"]["state"] == OPEN
+
+
+@patch("scraper.http_engine.search_degree", new_callable=AsyncMock)
+def test_degree_search_is_retried(mock_degree):
+    mock_degree.side_effect = [
+        {"error": "Timeout error", "error_kind": "timeout"},
+        {"count": 1, "details": [{"number": "1"}], "names": []},
+    ]
+    with patch("scraper.resilience", resilience()):
+        result = asyncio.run(_search_degree_with_engine("cpopg", "123", "1º Grau", "http"))
+    assert result["count"] == 1
+    assert mock_degree.await_count == 2
+
+
+@patch("main.search_tjsp", new_callable=AsyncMock)
+def test_search_reports_degree_errors(mock_search):
+    search_cache.clear()
+    mock_search.return_value = {
+        "count": 0,
+        "details": [],
+        "names": [],
+        "errors": ["2º Grau: Timeout error (after 2 attempts; earlier: Timeout error)"],
+    }
+    response = client.post("/search", json={"document": "55544433322", "no_cache": True})
+    assert response.status_code == 200
+    assert response.json()["errors"] == mock_search.return_value["errors"]
+    assert "resilience" in client.get("/status").json()
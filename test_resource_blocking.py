@@ -0,0 +1,55 @@
+import asyncio
+from unittest.mock import AsyncMock, MagicMock
+
+from resource_blocking import ResourceBlocker
+
+
+def make_blocker(**kwargs):
+    options = {
+        "resource_types": ["image", "font"],
+        "domains": ["google-analytics.com"],
+        "allowlist": [],
+        "enabled": True,
+    }
+    options.update(kwargs)
+    return ResourceBlocker(**options)
+
+
+def test_blocks_types_and_tracker_domains():
+    blocker = make_blocker()
+
+    assert blocker.should_block("https://esaj.tjsp.jus.br/logo.png", "image")
+    assert blocker.should_block("https://ssl.google-analytics.com/ga.js", "script")
+    assert not blocker.should_block("https://esaj.tjsp.jus.br/cpopg/search.do", "document")
+    assert not blocker.should_block("https://notgoogle-analytics.com/x.js", "script")
+
+    stats = blocker.stats()
+    assert stats["blocked_requests"] == 2
+    assert stats["blocked_by_type"] == {"image": 1}
+    assert stats["blocked_by_domain"] == {"google-analytics.com": 1}
+
+
+def test_allowlist_overrides():
+    blocker = make_blocker(allowlist=["esaj.tjsp.jus.br/captcha"])
+    assert not blocker.should_block("https://esaj.tjsp.jus.br/captcha/img.png", "image")
+
+
+def test_route_handler_aborts_or_continues():
+    blocker = make_blocker()
+
+    def route_for(url, resource_type):
+        route = MagicMock()
+        route.request.url = url
+        route.request.resource_type = resource_type
+        route.abort = AsyncMock()
+        route.continue_ = AsyncMock()
+        return route
+
+    image = route_for("https://esaj.tjsp.jus.br/logo.png", "image")
+    page = route_for("https://esaj.tjsp.jus.br/cpopg/open.do", "document")
+    asyncio.run(blocker._handle(image))
+    asyncio.run(blocker._handle(page))
+
+    image.abort.assert_awaited_once()
+    page.continue_.assert_awaited_once()
+    assert blocker.stats()["allowed_requests"] == 1
@@ -0,0 +1,113 @@
+import gzip
+import json
+import uuid
+from datetime import datetime, timedelta
+
+from database import (
+    RequestLog,
+    SessionLocal,
+    get_history,
+    import_request_records,
+    insert_request_logs,
+    request_log_row,
+)
+from retention import Retention, archive_path, import_archive
+
+
+def count_rows(document):
+    db = SessionLocal()
+    try:
+        return db.query(RequestLog).filter_by(document=document).count()
+    finally:
+        db.close()
+
+
+def test_old_rows_are_archived_by_day_and_can_be_restored(tmp_path):
+    document = f"ret-{uuid.uuid4()}"
+    old = datetime(2000, 1, 1, 23, 30)
+    rows = []
+    for i in range(5):
+        row = request_log_row(
+            document, "success", 1, [{"number": f"{i:07d}-00.2023.8.26.0050"}], ["FULANO"]
+        )
+        row["timestamp"] = old + timedelta(hours=i)  # 2000-01-01 and 2000-01-02
+        rows.append(row)
+    insert_request_logs(rows)
+
+    retention = Retention(max_age_days=30, archive_dir=str(tmp_path), batch_size=2)
+    result = retention.run(now=datetime(2000, 6, 1))
+
+    assert result["archived"] == 5
+    assert result["free_pages"] >= 0
+    assert count_rows(document) == 0
+    first_day = archive_path(str(tmp_path), "2000-01-01")
+    assert first_day in result["files"]
+    with gzip.open(first_day, "rt") as lines:
+        records = [json.loads(line) for line in lines if document in line]
+    assert len(records) == 1
+    assert records[0]["names"] == ["FULANO"]
+
+    restored = sum(import_archive(path)["imported"] for path in result["files"])
+    assert restored == 5
+    assert count_rows(document) == 5
+    # Child rows are rebuilt, so history filters work again
+    items, _ = get_history(document=document, process="0000003-00.2023.8.26.0050")
+    assert len(items) == 1
+    # Importing again skips rows already present
+    assert sum(import_archive(path)["imported"] for path in result["files"]) == 0
+
+
+def test_import_after_new_rows_keeps_every_record(tmp_path):
+    archived_document = f"ret-{uuid.uuid4()}"
+    rows = [request_log_row(archived_document, "success") for _ in range(3)]
+    for i, row in enumerate(rows):
+        row["timestamp"] = datetime(2000, 1, 1) + timedelta(minutes=i)
+    insert_request_logs(rows)
+    result = Retention(max_age_days=30, archive_dir=str(tmp_path)).run(now=datetime(2000, 6, 1))
+    assert result["archived"] == 3
+
+    # The archived rows were the newest: their ids must not be handed out again
+    new_document = f"ret-{uuid.uuid4()}"
+    insert_request_logs([request_log_row(new_document, "success") for _ in range(3)])
+
+    totals = import_archive(result["files"][0])
+    assert totals == {"imported": 3, "rekeyed": 0}
+    assert count_rows(archived_document) == 3
+    assert count_rows(new_document) == 3
+
+
+def test_import_rekeys_records_whose_id_was_reused():
+    # A table created before AUTOINCREMENT may have given an archived id to a new row
+    document = f"ret-{uuid.uuid4()}"
+    insert_request_logs([request_log_row(f"ret-{uuid.uuid4()}", "success")])
+    db = SessionLocal()
+    try:
+        taken_id = db.query(RequestLog.id).scalar()
+    finally:
+        db.close()
+    record = {
+        "id": taken_id,
+        "timestamp": "2000-01-01T00:00:00",
+        "document": document,
+        "status": "success",
+        "records_count": 1,
+        "details": [{"number": "0000001-00.2023.8.26.0050", "degree": "1º Grau"}],
+        "names": ["FULANO"],
+    }
+
+    assert import_request_records([record]) == {"imported": 1, "rekeyed": 1}
+    assert count_rows(document) == 1
+    items, _ = get_history(process="0000001-00.2023.8.26.0050")
+    assert [item["document"] for item in items] == [document]
+    # The re-keyed row is recognised on the next import
+    assert import_request_records([record]) == {"imported": 0, "rekeyed": 0}
+
+
+def test_recent_rows_stay(tmp_path):
+    document = f"ret-{uuid.uuid4()}"
+    row = request_log_row(document, "success")
+    row["timestamp"] = datetime(2000, 5, 20)
+    insert_request_logs([row])
+    result = Retention(max_age_days=30, archive_dir=str(tmp_path)).run(now=datetime(2000, 6, 1))
+    assert result["archived"] == 0
+    assert count_rows(document) == 1
@@ -0,0 +1,196 @@
+import asyncio
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from browser_pool import BrowserPool
+from scraper import extract_details_from_page, search_degree
+
+
+def fake_page(*snapshots, url="https://esaj.tjsp.jus.br/cpopg/search.do"):
+    page = MagicMock()
+    for name in ("goto", "select_option", "wait_for_selector", "fill", "click"):
+        setattr(page, name, AsyncMock())
+    page.goto.return_value = MagicMock(status=200)
+    outcome = MagicMock()
+    outcome.json_value = AsyncMock(return_value="list")
+    page.wait_for_function = AsyncMock(return_value=outcome)
+    page.evaluate = AsyncMock(side_effect=list(snapshots))
+    page.url = url
+    return page
+
+
+def test_search_degree_list_page_in_one_round_trip():
+    snapshot = {
+        "noResults": False,
+        "numero": None,
+        "rows": [
+            {
+                "link": {"number": " 1500000-00.2023.8.26.0050 ", "href": "/cpopg/show.do?c=A"},
+                "text": "1500000-00.2023.8.26.0050\nRéu: FULANO DE TAL",
+            },
+            {"link": None, "text": "Indiciado: CICLANO Advogado: Beltrano"},
+        ],
+        "links": [{"number": "1500000-00.2023.8.26.0050", "href": "/cpopg/show.do?c=A"}],
+        "total": None,
+        "pageLinks": [],
+    }
+    page = fake_page(snapshot)
+
+    result = asyncio.run(search_degree(page, "https://x/cpopg/open.do", "123", "1º Grau"))
+
+    assert page.evaluate.await_count == 1
+    assert result["count"] == 2
+    assert result["details"] == [
+        {
+            "number": "1500000-00.2023.8.26.0050",
+            "degree": "1º Grau",
+            "link": "https://esaj.tjsp.jus.br/cpopg/show.do?c=A",
+        }
+    ]
+    assert sorted(result["names"]) == ["CICLANO", "FULANO DE TAL"]
+
+
+def test_search_degree_no_results():
+    page = fake_page(
+        {"noResults": True, "numero": None, "rows": [], "links": [], "total": None, "pageLinks": []}
+    )
+    result = asyncio.run(search_degree(page, "https://x/cpopg/open.do", "123", "1º Grau"))
+    assert result == {"count": 0, "details": [], "names": []}
+
+
+def test_extract_details_applies_cleaning_rules():
+    raw = {
+        "fields": {"classe": " Ação Penal ", "area": "Criminal", "assunto": None},
+        "partes": [["Réu: ", "Fulano\nde Tal\nAdvogado: Beltrano"], ["sem nome"]],
+        "movimentacoes": [["01/01/2023", "", "Recebida\n   a  denúncia"]],
+    }
+    details = asyncio.run(extract_details_from_page(fake_page(raw)))
+
+    assert details["classe"] == "Ação Penal"
+    assert details["assunto"] is None
+    assert details["juiz"] is None
+    assert details["partes"] == ["Réu: Fulano de Tal"]
+    assert details["movimentacoes"] == ["01/01/2023 - Recebida\na denúncia"]
+
+
+def test_search_degree_follows_pagination():
+    def list_page(numbers, total=None, page_links=()):
+        return {
+            "noResults": False,
+            "numero": None,
+            "rows": [
+                {"link": {"number": n, "href": f"/cpopg/show.do?c={n}"}, "text": ""}
+                for n in numbers
+            ],
+            "links": [{"number": n, "href": f"/cpopg/show.do?c={n}"} for n in numbers],
+            "total": total,
+            "pageLinks": list(page_links),
+        }
+
+    page = fake_page(
+        list_page(
+            ["1", "2"], "5 Processos encontrados", ["/cpopg/trocarPagina.do?paginaConsulta=2"]
+        )
+    )
+    extra = {
+        "https://esaj.tjsp.jus.br/cpopg/trocarPagina.do?paginaConsulta=2": list_page(["3", "4"]),
+        "https://esaj.tjsp.jus.br/cpopg/trocarPagina.do?paginaConsulta=3": list_page(["5"]),
+    }
+
+    def new_extra_page():
+        extra_page = MagicMock()
+        extra_page.goto = AsyncMock(side_effect=lambda url, **kw: setattr(extra_page, "u", url))
+        extra_page.evaluate = AsyncMock(side_effect=lambda *a: extra[extra_page.u])
+        return extra_page
+
+    contexts = []
+
+    def new_extra_context(**kwargs):
+        context = AsyncMock()
+        context.new_page = AsyncMock(side_effect=lambda: new_extra_page())
+        contexts.append(context)
+        return context
+
+    # The extra pages come from the pool, each in a context with the search's session
+    session = [{"name": "JSESSIONID", "value": "abc", "domain": "esaj.tjsp.jus.br", "path": "/"}]
+    page.context.cookies = AsyncMock(return_value=session)
+    browser = MagicMock()
+    browser.new_context = AsyncMock(side_effect=new_extra_context)
+    pool = BrowserPool(max_concurrency=2, acquire_timeout=1.0, max_uses=0)
+    pool._launch = AsyncMock(return_value=browser)  # type: ignore
+
+    with patch("scraper.pool", pool):
+        result = asyncio.run(search_degree(page, "https://x/cpopg/open.do", "123", "1º Grau"))
+    assert result["count"] == 5
+    assert [d["number"] for d in result["details"]] == ["1", "2", "3", "4", "5"]
+    assert pool.stats()["current_uses"] == 2
+    assert all(context.add_cookies.await_args.args == (session,) for context in contexts)
+
+    page.evaluate = AsyncMock(
+        side_effect=[
+            list_page(
+                ["1", "2"], "5 Processos encontrados", ["/cpopg/trocarPagina.do?paginaConsulta=2"]
+            )
+        ]
+    )
+    with patch("scraper.pool", pool):
+        capped = asyncio.run(search_degree(page, "https://x/cpopg/open.do", "123", "1º Grau", 3))
+    assert capped["count"] == 5
+    assert [d["number"] for d in capped["details"]] == ["1", "2", "3"]
+
+
+def test_enrich_processes_returns_partial_results_within_budget():
+    import scraper
+
+    async def fake_details(link, engine=None, number=None, max_age=None):
+        if link == "slow":
+            await asyncio.sleep(5)
+        if link == "broken":
+            raise RuntimeError("boom")
+        return {"classe": f"classe {link}", "partes": []}
+
+    processes = [
+        {"number": "1", "link": "fast"},
+        {"number": "2", "link": "slow"},
+        {"number": "3", "link": "broken"},
+        {"number": "4", "link": "done", "partes": ["Réu: X"]},  # already has details
+    ]
+    with patch.object(scraper, "fetch_process_details", side_effect=fake_details):
+        enriched, status = asyncio.run(
+            scraper.enrich_processes(processes, concurrency=3, budget=0.1)
+        )
+
+    assert status == {"enriched": 1, "failed": 1, "pending": 1}
+    assert enriched[0]["classe"] == "classe fast"
+    assert "classe" not in enriched[1]
+    assert "classe" not in processes[0]  # the input (e.g. a cached result) is untouched
+
+
+def test_search_degree_unknown_page_saves_sampled_snapshot(tmp_path):
+    from debug_artifacts import DebugArtifacts
+
+    artifacts = DebugArtifacts(str(tmp_path), sample_rate=1.0, min_interval=60.0)
+    blocked = {
+        "noResults": False,
+        "blocked": True,
+        "numero": None,
+        "rows": [],
+        "links": [],
+        "total": None,
+        "pageLinks": [],
+    }
+    results = []
+    with patch("scraper.debug_artifacts", artifacts):
+        for _ in range(2):
+            page = fake_page(blocked)
+            page.wait_for_function = AsyncMock(side_effect=TimeoutError("Timeout 20000ms"))
+            page.content = AsyncMock(return_value="<html>captcha</html>")
+            results.append(
+                asyncio.run(search_degree(page, "https://x/cpopg/open.do", "123", "1º Grau"))
+            )
+
+    assert all("captcha" in result["error"] for result in results)
+    # Rate-limited: one snapshot for both timeouts, as HTML rather than a screenshot
+    assert [path.suffix for path in tmp_path.iterdir()] == [".html"]
+    assert artifacts.stats()["saved"] == 1
+    assert artifacts.stats()["skipped"] == 1
+    page.screenshot.assert_not_called()
@@ -0,0 +1,65 @@
+import asyncio
+
+import pytest
+
+from singleflight import SingleFlight
+
+
+def test_concurrent_calls_share_one_task():
+    async def scenario():
+        flight = SingleFlight()
+        calls = 0
+
+        async def scrape():
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.01)
+            return {"count": calls}
+
+        results = await asyncio.gather(*(flight.do("doc", scrape) for _ in range(5)))
+
+        assert calls == 1
+        assert all(r == {"count": 1} for r in results)
+        assert flight.stats() == {"in_flight": 0, "executed": 1, "coalesced": 4}
+
+        # Once finished, the next call runs again
+        await flight.do("doc", scrape)
+        assert calls == 2
+
+    asyncio.run(scenario())
+
+
+def test_errors_reach_every_waiter():
+    async def scenario():
+        flight = SingleFlight()
+
+        async def scrape():
+            await asyncio.sleep(0.01)
+            raise RuntimeError("boom")
+
+        results = await asyncio.gather(
+            flight.do("doc", scrape), flight.do("doc", scrape), return_exceptions=True
+        )
+        assert all(isinstance(r, RuntimeError) for r in results)
+
+    asyncio.run(scenario())
+
+
+def test_cancelled_waiter_does_not_cancel_shared_task():
+    async def scenario():
+        flight = SingleFlight()
+
+        async def scrape():
+            await asyncio.sleep(0.02)
+            return "done"
+
+        impatient = asyncio.ensure_future(flight.do("doc", scrape))
+        patient = asyncio.ensure_future(flight.do("doc", scrape))
+        await asyncio.sleep(0)
+        impatient.cancel()
+
+        assert await patient == "done"
+        with pytest.raises(asyncio.CancelledError):
+            await impatient
+
+    asyncio.run(scenario())
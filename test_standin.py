@@ -0,0 +1,75 @@
+import asyncio
+import os
+import sys
+
+import pytest
+
+from esaj_http import EsajHttpEngine
+from portal_http import PortalHttpEngine
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmarks"))
+
+from standin import PAGINATED_TOTAL, start_standin  # noqa: E402
+
+
+@pytest.fixture(scope="module")
+def base_url():
+    server, url = start_standin()
+    yield url
+    server.shutdown()
+
+
+def search(base_url, system, document):
+    async def scenario():
+        engine = EsajHttpEngine(base_url=base_url)
+        try:
+            return await engine.search_degree(system, document, "1º Grau")
+        finally:
+            await engine.close()
+
+    return asyncio.run(scenario())
+
+
+@pytest.mark.parametrize("system", ["cpopg", "cposg"])
+def test_fixtures_parse(base_url, system):
+    assert search(base_url, system, "123.456.789-00")["count"] == 0
+
+    single = search(base_url, system, "123.456.789-01")
+    assert single["count"] == 1
+    assert single["details"][0]["number"] == "1500123-45.2023.8.26.0050"
+    assert single["details"][0]["area"] == "Criminal"
+    assert {"role": "Réu", "name": "FULANO DE TAL"} in single["parties"]
+
+    listed = search(base_url, system, "123.456.789-02")
+    assert listed["count"] == 3
+    assert listed["details"][0]["link"].startswith(f"{base_url}/{system}/show.do")
+
+    paginated = search(base_url, system, "123.456.789-03")
+    assert paginated["count"] == PAGINATED_TOTAL
+    assert len({process["number"] for process in paginated["details"]}) == PAGINATED_TOTAL
+
+
+def test_fixture_detail_page(base_url):
+    async def scenario():
+        engine = EsajHttpEngine(base_url=base_url)
+        try:
+            return await engine.fetch_details(f"{base_url}/cpopg/show.do?processo.codigo=X")
+        finally:
+            await engine.close()
+
+    details = asyncio.run(scenario())
+    assert details["movimentacoes"][0].startswith("12/05/2023 - Audiência Designada")
+
+
+def test_fixture_portal(base_url):
+    async def scenario():
+        engine = PortalHttpEngine(base_url=base_url)
+        try:
+            return [await engine.search(document) for document in ("12345678900", "12345678901")]
+        finally:
+            await engine.close()
+
+    missing, found = asyncio.run(scenario())
+    assert missing == {"found": False, "name": None, "location": None}
+    assert found["name"] == "FULANO DE TAL"
+    assert found["location"] == "SÃO PAULO - SP"
@@ -0,0 +1,173 @@
+import asyncio
+import uuid
+from datetime import datetime, timedelta
+from unittest.mock import AsyncMock, patch
+
+from fastapi.testclient import TestClient
+
+from database import add_watch, due_watches, list_watches
+from main import app
+from watchlist import WatchlistScheduler, build_snapshot, diff_snapshots
+
+client = TestClient(app)
+
+
+def process(number, movements=None):
+    listed = {"number": number, "degree": "1º Grau", "link": f"https://x/{number}"}
+    if movements is not None:
+        listed["movimentacoes"] = movements
+    return listed
+
+
+def test_diff_snapshots():
+    old = build_snapshot([process("111", ["01/01 - A"]), process("222", ["01/01 - B"])])
+    new = build_snapshot(
+        [process("111", ["03/01 - C", "02/01 - D", "01/01 - A"]), process("333", ["X"])]
+    )
+    changes = {change["kind"]: change for change in diff_snapshots(old, new)}
+
+    assert changes["movement"]["process"] == "111"
+    assert changes["movement"]["payload"]["new_movements"] == ["03/01 - C", "02/01 - D"]
+    assert changes["process_added"]["process"] == "333"
+    assert changes["process_removed"]["process"] == "222"
+
+
+def test_missing_details_keep_previous_movement():
+    old = build_snapshot([process("111", ["01/01 - A"])])
+    new = build_snapshot([process("111")], previous=old)
+    assert diff_snapshots(old, new) == []
+
+
+def test_scheduler_records_only_changes():
+    document = f"watch-{uuid.uuid4()}"
+    now = datetime.utcnow()
+    add_watch(document, None, now - timedelta(seconds=1))
+    results = [
+        {"count": 1, "details": [process("111", ["01/01 - A"])], "names": []},
+        {"count": 1, "details": [process("111", ["01/01 - A"])], "names": []},
+        {
+            "count": 2,
+            "details": [process("111", ["02/01 - B", "01/01 - A"]), process("222", ["X"])],
+            "names": [],
+        },
+    ]
+    scheduler = WatchlistScheduler(
+        interval=60, jitter=0.5, search=AsyncMock(side_effect=results), concurrency=2
+    )
+
+    async def passthrough(processes, **kwargs):
+        return processes, {}
+
+    with patch("watchlist.enrich_processes", side_effect=passthrough):
+        baseline = asyncio.run(scheduler.check({"document": document, "snapshot": None}))
+        watch = next(w for w in list_watches() if w["document"] == document)
+        unchanged = asyncio.run(scheduler.check(watch))
+        watch = next(w for w in list_watches() if w["document"] == document)
+        changed = asyncio.run(scheduler.check(watch))
+
+    assert baseline == [] and unchanged == []
+    assert {change["kind"] for change in changed} == {"movement", "process_added"}
+    # Next check lands within the jittered interval
+    assert 29 <= (watch["next_check_at"] - watch["last_checked_at"]).total_seconds() <= 91
+    assert document not in {w["document"] for w in due_watches(datetime.utcnow(), 1000)}
+
+    feed = client.get("/watchlist/changes", params={"document": document}).json()
+    assert [item["kind"] for item in feed["items"]] == ["movement", "process_added"]
+    later = client.get("/watchlist/changes", params={"after": feed["next_after"]}).json()
+    assert all(item["document"] != document for item in later["items"])
+
+
+def test_failed_check_keeps_snapshot():
+    document = f"watch-{uuid.uuid4()}"
+    add_watch(document, None, datetime.utcnow())
+    scheduler = WatchlistScheduler(
+        search=AsyncMock(return_value={"count": 0, "details": [], "errors": ["timeout"]})
+    )
+    assert asyncio.run(scheduler.check({"document": document, "snapshot": {"1": {}}})) == []
+    watch = next(w for w in list_watches() if w["document"] == document)
+    assert watch["last_error"] == "timeout"
+    assert watch["snapshot"] is None
+    assert scheduler.stats()["failures"] == 1
+
+
+def test_partial_result_is_a_failed_check():
+    document = f"watch-{uuid.uuid4()}"
+    add_watch(document, None, datetime.utcnow())
+    previous = build_snapshot([process("111"), process("222")])
+    degree_results = {
+        "cpopg": {
+            "count": 2,
+            "details": [process("111")],
+            "names": [],
+            "errors": ["1º Grau: 1 of 2 result pages could not be read"],
+        },
+        "cposg": {"count": 0, "details": [], "names": []},
+    }
+
+    async def degree_search(system, *args):
+        return degree_results[system]
+
+    scheduler = WatchlistScheduler()
+    with patch("scraper.search_tjsp_degree", side_effect=degree_search):
+        changes = asyncio.run(scheduler.check({"document": document, "snapshot": previous}))
+    assert changes == []
+    watch = next(w for w in list_watches() if w["document"] == document)
+    assert watch["last_error"] == "1º Grau: 1 of 2 result pages could not be read"
+    assert scheduler.stats()["failures"] == 1
+
+
+def test_watchlist_api():
+    response = client.post("/watchlist", json={"document": "12345678900", "interval": 3600})
+    assert response.status_code == 200
+    assert response.json()["document"] == "123.456.789-00"
+    assert "123.456.789-00" in {w["document"] for w in client.get("/watchlist").json()}
+
+    assert client.delete("/watchlist/123.456.789-00").status_code == 200
+    assert client.delete("/watchlist/12345678900").status_code == 404
+
+
+def test_details_only_for_new_changed_or_due_processes():
+    document = f"watch-{uuid.uuid4()}"
+    add_watch(document, None, datetime.utcnow())
+    listed = [process("111"), process("222")]
+    results = [
+        {"count": 2, "details": listed, "names": []},
+        {"count": 2, "details": listed, "names": []},
+        {"count": 3, "details": listed + [process("333")], "names": []},
+    ]
+    scheduler = WatchlistScheduler(
+        interval=3600,
+        jitter=0.0,
+        movement_interval=86400,
+        detail_max_age=600,
+        search=AsyncMock(side_effect=results),
+    )
+    enriched = []
+
+    async def fake_enrich(processes, **kwargs):
+        enriched.append(([p["number"] for p in processes], kwargs["max_age"]))
+        return [{**p, "movimentacoes": [f"{p['number']} - A"]} for p in processes], {}
+
+    def latest_watch():
+        return next(w for w in list_watches() if w["document"] == document)
+
+    with patch("watchlist.enrich_processes", side_effect=fake_enrich):
+        asyncio.run(scheduler.check({"document": document, "snapshot": None}))
+        unchanged = asyncio.run(scheduler.check(latest_watch()))
+        added = asyncio.run(scheduler.check(latest_watch()))
+
+        # A day later the movements of every listed process are due again
+        watch = latest_watch()
+        for entry in watch["snapshot"].values():
+            entry["movements_checked_at"] = (datetime.utcnow() - timedelta(days=1)).isoformat()
+        scheduler._search = AsyncMock(return_value=results[-1])
+        asyncio.run(scheduler.check(watch))
+
+    assert unchanged == []
+    assert [change["kind"] for change in added] == ["process_added"]
+    assert enriched == [
+        (["111", "222"], 600),
+        (["333"], 600),
+        (["111", "222", "333"], 600),
+    ]
+    assert scheduler.stats()["details_skipped"] == 4
@@ -0,0 +1,292 @@
+"""
+Watchlist monitoring: periodic re-checks of registered documents.
+
+Each check runs the list search first and compares the listed processes
+(numbers and row fields) with the stored snapshot. Detail pages are only
+visited for processes that are new or whose row changed, and for the others
+every WATCHLIST_MOVEMENT_INTERVAL, to compare their latest movement; an
+unchanged document between movement checks costs the list search alone.
+Only the differences are recorded, as a change feed.
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import random
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+import config
+from batch import run_bounded
+from cache import search_cache
+from database import due_watches, save_watch_check
+from process_store import DETAIL_KEYS, process_key
+from scraper import enrich_processes, search_tjsp
+from singleflight import search_flight
+
+logger = logging.getLogger(__name__)
+
+
+def row_digest(process: Dict[str, Any]) -> str:
+    """Fingerprint of a process as the result list shows it, without detail fields."""
+    row = {k: v for k, v in process.items() if k not in DETAIL_KEYS}
+    return hashlib.sha1(json.dumps(row, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def build_snapshot(
+    processes: List[Dict[str, Any]],
+    previous: Optional[Dict[str, Any]] = None,
+    fetched: Optional[Dict[str, Dict[str, Any]]] = None,
+    now: Optional[datetime] = None,
+) -> Dict[str, Any]:
+    """
+    Reduces a search result to what is compared between checks.
+
+    Movements come from the process itself or from its entry in fetched
+    (details read during this check, by process key). Processes without
+    either keep their previous latest movement, so a skipped or slow detail
+    page is not reported as a change.
+    """
+    previous = previous or {}
+    fetched = fetched or {}
+    checked_at = (now or datetime.utcnow()).isoformat()
+    snapshot = {}
+    for process in processes:
+        key = process_key(process.get("number", ""))
+        if not key:
+            continue
+        detailed = fetched.get(key, process)
+        if "movimentacoes" in detailed:
+            movements = detailed["movimentacoes"] or []
+            latest = movements[0] if movements else None
+            movements_checked_at = checked_at
+        else:
+            movements = []
+            latest = previous.get(key, {}).get("latest_movement")
+            movements_checked_at = previous.get(key, {}).get("movements_checked_at")
+        snapshot[key] = {
+            "number": process.get("number"),
+            "degree": process.get("degree"),
+            "row": row_digest(process),
+            "latest_movement": latest,
+            "movements_checked_at": movements_checked_at,
+            "movements": movements,
+        }
+    return snapshot
+
+
+def diff_snapshots(old: Dict[str, Any], new: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Lists added and removed processes and processes with new movements."""
+    changes = []
+    for key, process in new.items():
+        if key not in old:
+            changes.append(
+                {
+                    "kind": "process_added",
+                    "process": process["number"],
+                    "payload": {
+                        "degree": process["degree"],
+                        "latest_movement": process["latest_movement"],
+                    },
+                }
+            )
+            continue
+        before = old[key].get("latest_movement")
+        after = process["latest_movement"]
+        if before and after and before != after:
+            # Movements are listed newest first: keep those above the old latest one
+            movements = process.get("movements") or [after]
+            if before in movements:
+                movements = movements[: movements.index(before)]
+            changes.append(
+                {
+                    "kind": "movement",
+                    "process": process["number"],
+                    "payload": {"previous": before, "new_movements": movements},
+                }
+            )
+    for key, process in old.items():
+        if key not in new:
+            changes.append(
+                {
+                    "kind": "process_removed",
+                    "process": process["number"],
+                    "payload": {"degree": process["degree"]},
+                }
+            )
+    return changes
+
+
+def _stored(snapshot: Dict[str, Any]) -> Dict[str, Any]:
+    # Only the latest movement is needed for the next comparison
+    return {
+        key: {k: v for k, v in process.items() if k != "movements"}
+        for key, process in snapshot.items()
+    }
+
+
+class WatchlistScheduler:
+    """
+    Re-checks due documents with at most `concurrency` checks in flight.
+
+    Checks are spread out by jitter: each next check is scheduled at the
+    interval plus or minus `jitter` times the interval.
+    """
+
+    def __init__(
+        self,
+        interval: float = config.WATCHLIST_INTERVAL,
+        jitter: float = config.WATCHLIST_JITTER,
+        concurrency: int = config.WATCHLIST_CONCURRENCY,
+        poll_interval: float = config.WATCHLIST_POLL_INTERVAL,
+        detail_budget: float = config.WATCHLIST_DETAIL_BUDGET,
+        movement_interval: float = config.WATCHLIST_MOVEMENT_INTERVAL,
+        detail_max_age: float = config.WATCHLIST_DETAIL_MAX_AGE,
+        search: Optional[Callable[[str], Awaitable[Dict[str, Any]]]] = None,
+    ):
+        self.interval = interval
+        self.jitter = jitter
+        self.concurrency = max(1, concurrency)
+        self.poll_interval = poll_interval
+        self.detail_budget = detail_budget
+        self.movement_interval = movement_interval
+        self.detail_max_age = detail_max_age
+        self._search = search
+        self._task: Optional[asyncio.Task] = None
+        self.checks = 0
+        self.failures = 0
+        self.changes = 0
+        self.details_read = 0
+        self.details_skipped = 0
+
+    def next_check(self, now: datetime, interval: Optional[float] = None) -> datetime:
+        interval = interval or self.interval
+        spread = random.uniform(-self.jitter, self.jitter) if self.jitter else 0.0
+        return now + timedelta(seconds=interval * (1 + spread))
+
+    async def search(self, document: str) -> Dict[str, Any]:
+        """Runs the list search, shared with API requests for the same document."""
+        if self._search is not None:
+            return await self._search(document)
+
+        async def scrape():
+            result = await search_tjsp(document)
+            await search_cache.set(document, result)
+            return result
+
+        return await search_flight.do(document, scrape)
+
+    def needs_details(
+        self, process: Dict[str, Any], previous: Optional[Dict[str, Any]], now: datetime
+    ) -> bool:
+        """
+        Whether a listed process's detail page is visited on this check: it is
+        new (or this is the first check), its row changed, or its movements are
+        due. Jitter is allowed for, so a check landing early still reads them.
+        """
+        if "movimentacoes" in process:
+            return False  # the search already returned its details
+        before = (previous or {}).get(process_key(process.get("number", "")))
+        if before is None or before.get("row") != row_digest(process):
+            return True
+        checked_at = before.get("movements_checked_at")
+        if not checked_at:
+            return True
+        elapsed = (now - datetime.fromisoformat(checked_at)).total_seconds()
+        return elapsed >= self.movement_interval * (1 - self.jitter)
+
+    async def check(self, watch: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """
+        Checks one watched document and stores the result.
+
+        Returns:
+            The changes found; empty on the first check, which only records
+            the baseline.
+        """
+        document = watch["document"]
+        now = datetime.utcnow()
+        next_check_at = self.next_check(now, watch.get("interval"))
+        self.checks += 1
+        try:
+            result = await self.search(document)
+            if "error" in result or result.get("errors"):
+                raise RuntimeError("; ".join(result.get("errors") or [result.get("error", "")]))
+
+            previous = watch.get("snapshot")
+            listed = result.get("details", [])
+            todo = [process for process in listed if self.needs_details(process, previous, now)]
+            fetched: Dict[str, Dict[str, Any]] = {}
+            if todo:
+                # Stored details older than half the interval could hide new movements
+                max_age = min(self.detail_max_age, (watch.get("interval") or self.interval) / 2)
+                enriched, _ = await enrich_processes(
+                    todo, budget=self.detail_budget, max_age=max_age
+                )
+                fetched = {process_key(process.get("number", "")): process for process in enriched}
+            self.details_read += len(todo)
+            self.details_skipped += len(listed) - len(todo)
+            snapshot = build_snapshot(listed, previous, fetched, now)
+            changes = diff_snapshots(previous, snapshot) if previous is not None else []
+        except Exception as e:
+            self.failures += 1
+            logger.warning(f"Watchlist check failed for {document}: {e}")
+            await asyncio.to_thread(
+                save_watch_check, document, now, next_check_at, error=str(e) or repr(e)
+            )
+            return []
+
+        await asyncio.to_thread(
+            save_watch_check, document, now, next_check_at, _stored(snapshot), changes
+        )
+        self.changes += len(changes)
+        if changes:
+            logger.info(f"Watchlist: {len(changes)} changes for {document}")
+        return changes
+
+    async def run_due(self, now: Optional[datetime] = None) -> int:
+        """Checks every document that is due. Returns how many were checked."""
+        checked = 0
+        while True:
+            due = await asyncio.to_thread(
+                due_watches, now or datetime.utcnow(), self.concurrency * 4
+            )
+            if not due:
+                return checked
+            async for _ in run_bounded(due, self.check, self.concurrency):
+                checked += 1
+
+    async def _loop(self):
+        while True:
+            try:
+                await self.run_due()
+            except Exception as e:
+                logger.error(f"Watchlist scheduler error: {e}")
+            await asyncio.sleep(self.poll_interval)
+
+    def start(self):
+        if config.WATCHLIST_ENABLED and self._task is None:
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self._task is not None,
+            "checks": self.checks,
+            "failures": self.failures,
+            "changes": self.changes,
+            "details_read": self.details_read,
+            "details_skipped": self.details_skipped,
+        }
+
+
+# Shared instance scheduled by the app lifespan
+watchlist = WatchlistScheduler()